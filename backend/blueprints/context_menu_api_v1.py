@@ -1,9 +1,10 @@
-from flask import current_app
+from flask import g
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints import context_menu_model
 from blueprints.maintenance.login_api import require_tab_id
+from database.neo4j_connection import read_only
 
 blp = Blueprint(
     "Context menu actions",
@@ -25,14 +26,15 @@ class ContextMenuAction(MethodView):
         context_menu_model.ContextMenuPostResponseSchema,
         example=context_menu_model.actions_post_response_example,
     )
+    @read_only
     @require_tab_id()
     def post(self, node_ids, relation_ids):
         """Get context menu actions possible on the given nodes and
         relations."""
         # ignore other kinds of IDs for now
-        nodes = list(current_app.graph_db.get_nodes_by_ids(node_ids).values())
+        nodes = list(g.graph_db.get_nodes_by_ids(node_ids).values())
         relations = list(
-            current_app.graph_db.get_relations_by_ids(relation_ids).values()
+            g.graph_db.get_relations_by_ids(relation_ids).values()
         )
 
         actions = context_menu_model.select_actions(nodes, relations)
@@ -28,3 +28,7 @@ class SafeEvalRuntimeError(SafeEvalError):
         self.message = message
         self.element = element
         super().__init__(self.message, code)
+
+
+class StyleBudgetExceeded(Exception):
+    """The style evaluation budget of the current request is used up."""
@@ -1,11 +1,12 @@
-from flask import abort, current_app
+from flask import abort, g
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.display import perspective_model
 from blueprints.maintenance.login_api import require_tab_id
 from database.id_handling import get_base_id
-from database.mapper import GraphEditorNode, GraphEditorRelation
+from database.mapper import nodes_from_base_nodes, relations_from_base_relations
+from database.neo4j_connection import read_only
 
 blp = Blueprint(
     "Perspectives",
@@ -35,7 +36,7 @@ class Perspectives(MethodView):
             get_base_id(k): v
             for k, v in perspective_data['node_positions'].items()
         }
-        pid = current_app.graph_db.create_perspective(perspective_data)
+        pid = g.graph_db.create_perspective(perspective_data)
         if not pid:
             abort(400)
         return {"id": pid}
@@ -48,6 +49,7 @@ class Perspective(MethodView):
         perspective_model.PerspectiveSchema,
         example=perspective_model.perspective_get_example,
     )
+    @read_only
     @require_tab_id()
     def get(self, pid: str):
         """
@@ -56,15 +58,21 @@ class Perspective(MethodView):
         Returns an object containing nodes and their positions, as well
         relations.
         """
-        persp_data = current_app.graph_db.get_perspective_by_id(pid)
-        ge_nodes = {}
-        for nid, node in persp_data['nodes'].items():
-            ge_nodes[f"id::{nid}"] = GraphEditorNode.from_base_node(node)
-        persp_data['nodes'] = ge_nodes
-        ge_rels = {}
-        for rid, rel in persp_data['relations'].items():
-            ge_rels[f"id::{rid}"] = GraphEditorRelation.from_base_relation(rel)
-        persp_data['relations'] = ge_rels
+        persp_data = g.graph_db.get_perspective_by_id(pid)
+        persp_data['nodes'] = {
+            f"id::{nid}": node
+            for nid, node in zip(
+                persp_data['nodes'].keys(),
+                nodes_from_base_nodes(persp_data['nodes'].values()),
+            )
+        }
+        persp_data['relations'] = {
+            f"id::{rid}": rel
+            for rid, rel in zip(
+                persp_data['relations'].keys(),
+                relations_from_base_relations(persp_data['relations'].values()),
+            )
+        }
         return persp_data
 
     @blp.arguments(
@@ -79,7 +87,7 @@ class Perspective(MethodView):
 
         Returns the ID of the perspective.
         """
-        current_app.graph_db.get_perspective_by_id(pid)
+        g.graph_db.get_perspective_by_id(pid)
         json_node['node_positions'] = {
             get_base_id(k): v
             for k, v in json_node['node_positions'].items()
@@ -94,6 +102,6 @@ class Perspective(MethodView):
             for rid in json_node['relation_ids']
         ]
 
-        pid = current_app.graph_db.replace_perspective_by_id(
+        pid = g.graph_db.replace_perspective_by_id(
             pid, json_node)
         return {"id": pid}
@@ -12,6 +12,7 @@ from blueprints.display.style_support import (
     get_selected_style,
     read_style,
     select_style,
+    store_style,
 )
 
 blp = Blueprint(
@@ -23,13 +24,8 @@ def load_style_file(file):
     """Load a .grass file to the user's session."""
     try:
         if file:
-            if "style_files" not in session:
-                session["style_files"] = dict()
             rules, text = read_style(file)
-            session["style_files"][file.filename] = {
-                "rules": rules,
-                "text": text,
-            }
+            store_style(file.filename, rules, text)
             select_style(file.filename)
         else:
             current_app.logger.error(f"Can't upload file {file.filename}")
@@ -116,7 +112,7 @@ class StyleCurrent(MethodView):
             abort_with_json(
                 400, f"Unknown file: {filename}", always_send_message=True
             )
-        elif filename and filename not in session["style_files"]:
+        elif filename and filename not in get_style_filenames():
             abort_with_json(
                 400, f"Unknown file: {filename}", always_send_message=True
             )
@@ -125,6 +121,30 @@ class StyleCurrent(MethodView):
         return "Style file selected."
 
 
+@blp.route("/profile")
+class StyleProfile(MethodView):
+    @blp.response(200, style_model.StyleProfileSchema)
+    @require_tab_id()
+    def get(self):
+        """Get calls, matches and cumulative time (seconds) of the rules of
+        the style currently active, most expensive rules first.
+
+        memoHits counts elements styled from memoized results instead of
+        calling the rule. Rules are identified by the name of their style
+        file and their index in that file. Rules are only profiled if
+        GUI_STYLE_PROFILING is set.
+        """
+        neo4j_connect()
+        return {"rules": style_support.fetch_style_plan().profile()}
+
+    @require_tab_id()
+    def delete(self):
+        """Reset the rule profiles of the style currently active."""
+        neo4j_connect()
+        style_support.fetch_style_plan().reset_profile()
+        return "Style profile reset."
+
+
 @blp.route("/reset")
 class StyleReset(MethodView):
     def get(self):
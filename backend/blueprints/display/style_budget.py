@@ -0,0 +1,145 @@
+"""Per-request budget for evaluating style code.
+
+Style files uploaded by users may contain arbitrarily expensive code, which
+is evaluated for each element of a response. To keep one style file from
+stalling a worker, each request may spend at most
+config.style_budget_seconds and config.style_budget_operations on style
+code. Only time spent evaluating style rules counts, not e.g. database
+queries of the request. Operations are loop iterations and function calls
+of style code.
+Once the budget is used up, the remaining elements get the styles that
+need no code evaluation (see apply_style_rules), and the response is
+flagged with a header.
+
+Single expensive builtin calls (e.g. a regular expression on a huge
+string) can't be interrupted, but are noticed after they returned.
+"""
+
+import time
+
+from flask import g, has_request_context
+
+from blueprints.display.exceptions import StyleBudgetExceeded
+from database.settings import config
+
+
+BUDGET_EXCEEDED_HEADER = "X-Style-Budget-Exceeded"
+
+
+class StyleBudget:
+    """Time and operations style code may still use."""
+
+    # number of operations between checks of the clock
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, seconds: float, operations: int):
+        self.max_seconds = seconds if seconds > 0 else None
+        self.max_operations = operations if operations > 0 else None
+        self.seconds = 0.0
+        self.operations = 0
+        self.exceeded = False
+        # monotonic time the current evaluation started, see start()
+        self._started = None
+        # guards used by restricted code, see BudgetingTransformer
+        self.guards = {"_tick_": self.tick, "_getiter_": self.getiter}
+
+    def start(self):
+        """Start counting time of a style evaluation."""
+        self._started = time.monotonic()
+
+    def stop(self):
+        """Stop counting time of the current style evaluation."""
+        if self._started is not None:
+            self.seconds += time.monotonic() - self._started
+            self._started = None
+
+    def elapsed(self) -> float:
+        """Return seconds spent on style evaluation so far."""
+        if self._started is None:
+            return self.seconds
+        return self.seconds + time.monotonic() - self._started
+
+    def remaining(self) -> tuple[float, int]:
+        """Return (seconds, operations) left, as arguments for a budget of
+        e.g. a worker process. 0 means unlimited."""
+        seconds = 0
+        if self.max_seconds is not None:
+            seconds = max(self.max_seconds - self.elapsed(), 1e-6)
+        operations = 0
+        if self.max_operations is not None:
+            operations = max(self.max_operations - self.operations, 1)
+        return seconds, operations
+
+    def share(self, parts: int) -> tuple[float, int]:
+        """Split the remaining budget into `parts` equal budgets (e.g. for
+        chunks styled in parallel), returned as arguments of StyleBudget."""
+        seconds, operations = self.remaining()
+        return (
+            seconds / parts,
+            max(operations // parts, 1) if operations else 0,
+        )
+
+    def charge(self, seconds: float, operations: int):
+        """Account for time and operations used elsewhere, e.g. by a
+        worker process."""
+        self.seconds += seconds
+        self.operations += operations
+        if (
+            self.max_seconds is not None and self.seconds > self.max_seconds
+        ) or (
+            self.max_operations is not None
+            and self.operations > self.max_operations
+        ):
+            self.exceeded = True
+
+    def exceed(self):
+        self.exceeded = True
+        raise StyleBudgetExceeded()
+
+    def check(self):
+        """Raise StyleBudgetExceeded if the budget is used up."""
+        if self.exceeded or (
+            self.max_seconds is not None and self.elapsed() > self.max_seconds
+        ):
+            self.exceed()
+
+    def tick(self):
+        """Count an operation of style code."""
+        if (
+            self.max_operations is not None
+            and self.operations >= self.max_operations
+        ):
+            self.exceed()
+        self.operations += 1
+        if self.operations % self.CLOCK_INTERVAL == 0:
+            self.check()
+
+    def getiter(self, ob):
+        """Iterate ob, counting each item as an operation."""
+        for item in ob:
+            self.tick()
+            yield item
+
+
+def request_budget() -> StyleBudget | None:
+    """Return the style budget of the current request, or None if style
+    evaluation is unlimited."""
+    if not has_request_context():
+        return None
+    if "style_budget" not in g:
+        if config.style_budget_seconds > 0 or config.style_budget_operations > 0:
+            g.style_budget = StyleBudget(
+                config.style_budget_seconds, config.style_budget_operations
+            )
+        else:
+            g.style_budget = None
+    return g.style_budget
+
+
+def flag_exceeded_budget(response):
+    """Add BUDGET_EXCEEDED_HEADER to response if the budget of the current
+    request was used up."""
+    budget = g.get("style_budget")
+    if budget and budget.exceeded:
+        response.headers[BUDGET_EXCEEDED_HEADER] = "1"
+    return response
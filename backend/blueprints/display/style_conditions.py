@@ -0,0 +1,235 @@
+"""Fast path for simple style conditions.
+
+Most conditions in style files are simple checks, e.g.
+
+    p.name == 'Bob'
+    'Person' in o.labels and p.age >= 18
+    p.status.lower() in ['open', 'new']
+
+Such expressions are compiled into plain Python closures taking the styled
+element, so that no namespace has to be built and no restricted code has
+to be executed for them. Anything else (names defined by star rules,
+function calls, ...) is left to RestrictedPython.
+
+The closures must behave exactly like the restricted code would: missing
+properties and object fields are "", and exceptions are the same ones
+Python raises for the expression. Where that can't be guaranteed cheaply,
+a closure raises FastPathFallback and the code is executed the usual way.
+"""
+
+import ast
+import operator
+from typing import Callable
+
+from database.base_types import BaseElement
+
+
+OBJECT_NAMES = {"o", "object"}
+PROPERTIES_NAMES = {"p", "properties"}
+ELEMENT_NAMES = OBJECT_NAMES | PROPERTIES_NAMES
+
+# methods that may be called on values in fast conditions.
+METHODS = {
+    "lower",
+    "upper",
+    "casefold",
+    "strip",
+    "lstrip",
+    "rstrip",
+    "startswith",
+    "endswith",
+}
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+
+class FastPathFallback(Exception):
+    """Raised by fast conditions that can't evaluate an element exactly
+    like restricted code would."""
+
+
+class NotSupported(Exception):
+    """Raised while compiling code the fast path doesn't handle."""
+
+
+def binds_element_names(code: str) -> bool:
+    """Whether code may rebind o, object, p or properties.
+
+    If it does, fast conditions evaluated afterwards in the same context
+    would see other values than the restricted code, so they must not be
+    used.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            if node.id in ELEMENT_NAMES:
+                return True
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            if node.name in ELEMENT_NAMES:
+                return True
+        elif isinstance(node, ast.alias):
+            if (node.asname or node.name) in ELEMENT_NAMES:
+                return True
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            if ELEMENT_NAMES & set(node.names):
+                return True
+    return False
+
+
+def compile_fast_condition(code: str) -> Callable[[BaseElement], object] | None:
+    """Compile code into a function returning the value of the condition
+    for a given element, or return None if code isn't simple enough."""
+    try:
+        tree = ast.parse(code.strip(), mode="eval")
+        return _compile(tree.body)
+    except (SyntaxError, NotSupported):
+        return None
+
+
+def _compile(node):
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda obj: value
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return _compile_collection(node)
+    if isinstance(node, ast.Attribute):
+        return _compile_element_access(node.value, node.attr, subscript=False)
+    if isinstance(node, ast.Subscript):
+        if isinstance(node.slice, ast.Constant) and isinstance(
+            node.slice.value, str
+        ):
+            return _compile_element_access(
+                node.value, node.slice.value, subscript=True
+            )
+        raise NotSupported
+    if isinstance(node, ast.Compare):
+        return _compile_compare(node)
+    if isinstance(node, ast.BoolOp):
+        return _compile_bool_op(node)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand)
+        return lambda obj: not operand(obj)
+    if isinstance(node, ast.Call):
+        return _compile_method_call(node)
+    raise NotSupported
+
+
+def _compile_collection(node):
+    values = []
+    for elt in node.elts:
+        if not isinstance(elt, ast.Constant):
+            raise NotSupported
+        values.append(elt.value)
+    if isinstance(node, ast.List):
+        collection = list(values)
+    elif isinstance(node, ast.Tuple):
+        collection = tuple(values)
+    else:
+        collection = set(values)
+    # never handed out, so it can't be modified.
+    return lambda obj: collection
+
+
+def _compile_element_access(value_node, key, subscript):
+    """Compile p.key, p["key"], o.field or o["field"]."""
+    if not isinstance(value_node, ast.Name) or value_node.id not in ELEMENT_NAMES:
+        raise NotSupported
+    if key.startswith("_") or (not subscript and hasattr(dict, key)):
+        # rejected by RestrictedPython resp. a dict method
+        raise NotSupported
+
+    if value_node.id in PROPERTIES_NAMES:
+        def get_mapping(obj):
+            return obj.properties
+    else:
+        def get_mapping(obj):
+            return obj.__dict__
+
+    if subscript:
+        # p["key"] would insert "" into the namespace for missing keys,
+        # which later code may notice.
+        def access(obj):
+            mapping = get_mapping(obj)
+            if key not in mapping:
+                raise FastPathFallback
+            return mapping[key]
+    else:
+        def access(obj):
+            return get_mapping(obj).get(key, "")
+    return access
+
+
+def _compile_compare(node):
+    left = _compile(node.left)
+    steps = [
+        (COMPARISONS[type(op)], _compile(comparator))
+        for op, comparator in zip(node.ops, node.comparators)
+    ]
+    if len(steps) == 1:
+        compare, right = steps[0]
+        return lambda obj: compare(left(obj), right(obj))
+
+    def chained(obj):
+        left_value = left(obj)
+        result = True
+        for compare, right in steps:
+            right_value = right(obj)
+            result = compare(left_value, right_value)
+            if not result:
+                return result
+            left_value = right_value
+        return result
+    return chained
+
+
+def _compile_bool_op(node):
+    operands = [_compile(value) for value in node.values]
+    if isinstance(node.op, ast.And):
+        def conjunction(obj):
+            for operand in operands:
+                result = operand(obj)
+                if not result:
+                    return result
+            return result
+        return conjunction
+
+    def disjunction(obj):
+        for operand in operands:
+            result = operand(obj)
+            if result:
+                return result
+        return result
+    return disjunction
+
+
+def _compile_method_call(node):
+    func = node.func
+    if (
+        not isinstance(func, ast.Attribute)
+        or func.attr not in METHODS
+        or node.keywords
+        or not all(isinstance(arg, ast.Constant) for arg in node.args)
+    ):
+        raise NotSupported
+    target = _compile(func.value)
+    name = func.attr
+    args = tuple(arg.value for arg in node.args)
+
+    def call(obj):
+        # RestrictedPython's getattr returns None for missing attributes.
+        return getattr(target(obj), name, None)(*args)
+    return call
@@ -20,3 +20,17 @@ class StylesSchema(Schema):
 
 class StyleSchema(Schema):
     contents = fields.Str()
+
+
+class RuleProfileSchema(Schema):
+    style = fields.Str()
+    rule = fields.Int()
+    selector = fields.Str()
+    calls = fields.Int()
+    memoHits = fields.Int()
+    matches = fields.Int()
+    seconds = fields.Float()
+
+
+class StyleProfileSchema(Schema):
+    rules = fields.List(fields.Nested(RuleProfileSchema))
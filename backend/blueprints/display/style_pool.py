@@ -0,0 +1,67 @@
+"""Process pool for styling large batches of elements.
+
+Styling is pure Python and runs under the GIL, so a single request styling
+thousands of elements keeps one core busy while the others idle. If
+config.style_pool_workers is set, batches of at least
+config.style_pool_threshold elements are styled in chunks by a pool of
+worker processes instead (see style_support.apply_style_rules_batch).
+
+Workers are started by a fork server, so that they don't inherit locks or
+connections of the threads of the web server. The fork server imports the
+style modules once, so that workers are started quickly.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from database.settings import config
+
+
+style_pool = None
+style_pool_lock = Lock()
+
+
+def get_style_pool() -> ProcessPoolExecutor | None:
+    """Return the style pool, starting it if necessary. Return None if no
+    pool is configured."""
+    global style_pool  # pylint: disable=global-statement
+    if config.style_pool_workers <= 0:
+        return None
+    with style_pool_lock:
+        if style_pool is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["blueprints.display.style_support"])
+            style_pool = ProcessPoolExecutor(
+                max_workers=config.style_pool_workers, mp_context=context
+            )
+        return style_pool
+
+
+def start_style_pool():
+    """Start the style pool and its workers in the background, if one is
+    configured, so that the first large batch doesn't wait for them."""
+    if multiprocessing.parent_process() is not None:
+        # we are a worker importing the main module
+        return
+    pool = get_style_pool()
+    if pool:
+        for _ in range(config.style_pool_workers):
+            pool.submit(int)
+
+
+def discard_style_pool(pool: ProcessPoolExecutor):
+    """Shut down pool (e.g. after a worker died), so that the next call of
+    get_style_pool starts a new one."""
+    global style_pool  # pylint: disable=global-statement
+    with style_pool_lock:
+        if style_pool is pool:
+            style_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def chunked(items: list, chunks: int) -> list[list]:
+    """Split items into at most `chunks` lists of about equal size,
+    keeping their order."""
+    size = max(1, -(-len(items) // chunks))
+    return [items[i:i + size] for i in range(0, len(items), size)]
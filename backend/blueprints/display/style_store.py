@@ -0,0 +1,88 @@
+"""Content-addressed storage of uploaded style files.
+
+Sessions only map the file names of uploaded styles to the SHA-256 digest of
+their text. The text itself is stored once per server in
+config.style_store_dir, and parsed rules are kept in memory, so identical
+styles uploaded by many users are stored and parsed only once, and
+sessions stay small.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+from blueprints.display import exceptions
+from database.settings import config
+
+
+class StyleStore:
+    """Style texts on disk together with an LRU cache of parsed rules."""
+
+    # Bound for the number of parsed styles kept in memory.
+    MAX_PARSED_STYLES = 64
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._parsed = OrderedDict()
+        self._lock = Lock()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.grass")
+
+    def put(self, text: str, rules=None) -> str:
+        """Store text (with its parsed rules, if given) and return its
+        digest. Storing a text twice is cheap."""
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            # write atomically, other processes may read the file already
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(tmp_path, path)
+        if rules is not None:
+            self._remember(digest, tuple(rules))
+        return digest
+
+    def get_text(self, digest: str) -> str:
+        """Return the text stored under digest.
+
+        May raise a StyleNotFoundException."""
+        try:
+            with open(self._path(digest), encoding="utf-8") as file:
+                return file.read()
+        except (OSError, ValueError) as e:
+            raise exceptions.StyleNotFoundException from e
+
+    def get_rules(self, digest: str) -> tuple:
+        """Return the parsed rules of the text stored under digest. The
+        rules are shared, so they must not be modified.
+
+        May raise a StyleNotFoundException or a ParseException.
+        """
+        with self._lock:
+            rules = self._parsed.get(digest)
+            if rules is not None:
+                self._parsed.move_to_end(digest)
+                return rules
+        # avoid circular import
+        # pylint: disable=import-outside-toplevel
+        from blueprints.display.style_support import parse_style
+
+        text = self.get_text(digest)
+        rules = tuple(parse_style(text)) if text else ()
+        self._remember(digest, rules)
+        return rules
+
+    def _remember(self, digest: str, rules: tuple):
+        with self._lock:
+            self._parsed[digest] = rules
+            self._parsed.move_to_end(digest)
+            if len(self._parsed) > self.MAX_PARSED_STYLES:
+                self._parsed.popitem(last=False)
+
+
+style_store = StyleStore(config.style_store_dir)
@@ -4,9 +4,16 @@ import math
 import random
 import os
 import hashlib
+import pickle
 import re
 import ast
+import itertools
 import textwrap
+import time
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from threading import Lock
 import pyparsing as pp
 
 from RestrictedPython import (
@@ -19,12 +26,28 @@ from RestrictedPython.Eval import (
     default_guarded_getitem,
     default_guarded_getiter,
 )
+from RestrictedPython.transformer import RestrictingNodeTransformer
 from flask import current_app, session, g
 
 from blueprints.display import exceptions
+from blueprints.display.style_budget import StyleBudget, request_budget
+from blueprints.display.style_store import style_store
+from blueprints.display.style_pool import (
+    chunked,
+    discard_style_pool,
+    get_style_pool,
+)
+from blueprints.display.style_conditions import (
+    OBJECT_NAMES,
+    PROPERTIES_NAMES,
+    FastPathFallback,
+    binds_element_names,
+    compile_fast_condition,
+)
 from database.utils import remove_newlines
 from database.attr_dict import DefaultAttrDict
 from database.base_types import BaseNode, BaseRelation, BaseElement
+from database.settings import config
 
 from utils import get_customized_file_dir
 
@@ -97,6 +120,8 @@ globals_dict = dict(
     | utility_builtins,
     _getitem_=default_guarded_getitem,
     _getiter_=default_guarded_getiter,
+    # replaced by StyleBudget.tick if evaluation is budgeted
+    _tick_=lambda: None,
 )
 
 
@@ -118,11 +143,281 @@ def parse_code_with_result(code):
     return tree
 
 
+def _tick_call(location):
+    call = ast.Call(func=ast.Name(id="_tick_", ctx=ast.Load()), args=[], keywords=[])
+    return ast.fix_missing_locations(ast.copy_location(call, location))
+
+
+class BudgetingTransformer(RestrictingNodeTransformer):
+    """Restricting transformer that calls _tick_() in each iteration of
+    while loops and on each function call, so that the style budget can
+    stop unbounded loops and recursion. For loops and comprehensions are
+    counted by the _getiter_ guard."""
+
+    def visit_While(self, node):
+        node = super().visit_While(node)
+        node.body.insert(0, ast.copy_location(ast.Expr(_tick_call(node)), node))
+        return node
+
+    def visit_FunctionDef(self, node):
+        node = super().visit_FunctionDef(node)
+        node.body.insert(0, ast.copy_location(ast.Expr(_tick_call(node)), node))
+        return node
+
+    def visit_Lambda(self, node):
+        node = super().visit_Lambda(node)
+        # _tick_() returns None, so this evaluates to the original body
+        node.body = ast.copy_location(
+            ast.BoolOp(op=ast.Or(), values=[_tick_call(node), node.body]),
+            node.body,
+        )
+        return node
+
+
+def compile_style_code(code):
+    """Compile code of a star property or condition into restricted byte code.
+
+    May raise a SyntaxError or, for code RestrictedPython can't handle,
+    another Exception.
+    """
+    # parse/transform code and add missing line/column numbers
+    tree = ast.fix_missing_locations(parse_code_with_result(code))
+    return compile_restricted(
+        tree, filename="<style file>", mode="exec", policy=BudgetingTransformer
+    )
+
+
+# Context key set once code may have rebound o, p etc. Style code can't
+# access it, since RestrictedPython rejects names starting with "_".
+NAMES_REBOUND = "_element_names_rebound"
+
+
+def element_namespace(obj: BaseElement) -> dict:
+    """Return a new namespace for evaluating style code on obj.
+
+    The namespace is used both as globals and locals, so that functions
+    defined in user code can refer to 'o' and 'p' as well, and definitions
+    of a rule are visible to the following ones.
+    """
+    # https: // stackoverflow.com / q / 52229521
+    default_obj_dict = DefaultAttrDict(lambda: "", obj.__dict__.copy())
+    default_props_dict = DefaultAttrDict(lambda: "", obj.properties)
+    namespace = dict(globals_dict)
+    # add node fields and properties for evaluation context.
+    namespace.update(
+        {
+            "o": default_obj_dict,
+            # let's make everybody happy
+            "object": default_obj_dict,
+            "p": default_props_dict,
+            "properties": default_props_dict,
+        }
+    )
+    return namespace
+
+
+@dataclass(frozen=True)
+class StyleReads:
+    """What style code may read from the element it is applied to.
+
+    Used for memoizing style results: elements that agree on everything
+    read get the same style. If `memoizable` is False, the code uses
+    non-deterministic functions (e.g. random) or element data we don't
+    track, so its results must not be reused. `loads` and `binds` are the
+    names the code reads from and assigns in the namespace shared by the
+    rules applied to an element.
+    """
+    memoizable: bool = True
+    all_properties: bool = False
+    properties: frozenset = frozenset()
+    object_fields: frozenset = frozenset()
+    loads: frozenset = frozenset()
+    binds: frozenset = frozenset()
+
+    def merge(self, other):
+        return StyleReads(
+            memoizable=self.memoizable and other.memoizable,
+            all_properties=self.all_properties or other.all_properties,
+            properties=self.properties | other.properties,
+            object_fields=self.object_fields | other.object_fields,
+            loads=self.loads | other.loads,
+            binds=self.binds | other.binds,
+        )
+
+    @property
+    def element_specific(self) -> bool:
+        """Whether results depend on the identity of the element."""
+        return bool(self.object_fields & ELEMENT_ID_FIELDS)
+
+
+NONDETERMINISTIC_NAMES = {"random"}
+# fields of 'o' that may be part of a memo key, if style code reads them.
+MEMO_OBJECT_FIELDS = {"id", "element_id", "labels", "type"}
+# fields that differ for each element, so rules reading them aren't memoized.
+ELEMENT_ID_FIELDS = {"id", "element_id"}
+
+
+def _static_key(node, parents):
+    """If name `node` is used as `node.key` or `node["key"]`, return key.
+    Otherwise (e.g. `node.get(...)` or passing node around) return None."""
+    parent = parents.get(node)
+    if isinstance(parent, ast.Attribute) and parent.value is node:
+        if hasattr(dict, parent.attr):
+            return None
+        return parent.attr
+    if (
+        isinstance(parent, ast.Subscript)
+        and parent.value is node
+        and isinstance(parent.slice, ast.Constant)
+        and isinstance(parent.slice.value, str)
+    ):
+        return parent.slice.value
+    return None
+
+
+def code_reads(code: str) -> StyleReads:
+    """Statically determine what `code` reads from the styled element."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # evaluation fails anyway, and failures are not memoized.
+        return StyleReads()
+
+    parents = {
+        child: node
+        for node in ast.walk(tree)
+        for child in ast.iter_child_nodes(node)
+    }
+    memoizable = True
+    all_properties = False
+    properties = set()
+    object_fields = set()
+    loads = set()
+    binds = set()
+    for node in ast.walk(tree):
+        if isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        ):
+            binds.add(node.name)
+        elif isinstance(node, ast.arg):
+            binds.add(node.arg)
+        elif isinstance(node, ast.alias):
+            binds.add((node.asname or node.name).split(".")[0])
+        if not isinstance(node, ast.Name):
+            continue
+        if isinstance(node.ctx, ast.Load):
+            loads.add(node.id)
+        else:
+            binds.add(node.id)
+        if node.id in NONDETERMINISTIC_NAMES:
+            memoizable = False
+        elif node.id in PROPERTIES_NAMES:
+            key = _static_key(node, parents)
+            if key is None:
+                all_properties = True
+            else:
+                properties.add(key)
+        elif node.id in OBJECT_NAMES:
+            key = _static_key(node, parents)
+            if key == "properties":
+                all_properties = True
+            elif key in MEMO_OBJECT_FIELDS:
+                object_fields.add(key)
+            else:
+                memoizable = False
+    return StyleReads(
+        memoizable=memoizable,
+        all_properties=all_properties,
+        properties=frozenset(properties),
+        object_fields=frozenset(object_fields),
+        loads=frozenset(loads),
+        binds=frozenset(binds),
+    )
+
+
 class StyleRule:
     def __init__(self, object_type, label_or_type, props):
         self.object_type = object_type
         self.label_or_type = label_or_type
         self.props = props
+        self._compile()
+
+    def _compile(self):
+        """Compile code in conditions and star properties once, so that
+        applying the rule to many elements only executes it.
+
+        Compilation errors are kept and raised when the code is evaluated,
+        so that they show up in the caption of the styled element.
+        """
+        # pylint: disable=broad-exception-caught
+        self._compiled = {}
+        # conditions that can be evaluated without RestrictedPython
+        self._fast_conditions = {}
+        # code that may rebind o, p etc., see binds_element_names
+        self._rebinding = set()
+        for pname, pval in self.props.items():
+            if pname not in ("condition", "condition*") and not pname.endswith("*"):
+                continue
+            code = textwrap.dedent(pval)
+            try:
+                self._compiled[pname] = (code, compile_style_code(code), None)
+            except Exception as e:
+                self._compiled[pname] = (code, None, e)
+                continue
+            if pname in ("condition", "condition*"):
+                fast_condition = compile_fast_condition(code)
+                if fast_condition:
+                    self._fast_conditions[pname] = fast_condition
+            if binds_element_names(code):
+                self._rebinding.add(pname)
+        self._rule_dict = DefaultAttrDict(lambda: "", self.to_dict())
+        self.key_reads = self._compute_reads()
+        self.reads = StyleReads()
+        for reads in self.key_reads.values():
+            self.reads = self.reads.merge(reads)
+
+    @property
+    def has_code(self) -> bool:
+        """Whether applying this rule evaluates code."""
+        return bool(self._compiled)
+
+    def _compute_reads(self) -> dict:
+        """Return what code and caption placeholders of each property of
+        this rule read, keyed by the style property they set."""
+        key_reads = {}
+        for pname, (code, _, _) in self._compiled.items():
+            key = pname.rstrip("*")
+            key_reads[key] = key_reads.get(key, StyleReads()).merge(
+                code_reads(code)
+            )
+        for pname in ("caption", "defaultCaption"):
+            template = self.props.get(pname)
+            if template is None or pname + "*" in self.props:
+                continue
+            key_reads[pname] = StyleReads(
+                properties=frozenset(RE_VAR_REFERENCE.findall(template)),
+                object_fields=frozenset({"id"} if "<id>" in template else ()),
+            )
+        return key_reads
+
+    def condition_reads(self) -> StyleReads:
+        """Return what the condition of this rule reads."""
+        return self.key_reads.get("condition", StyleReads())
+
+    def __getstate__(self):
+        # code objects can't be pickled (e.g. into the session).
+        state = self.__dict__.copy()
+        state.pop("_compiled", None)
+        state.pop("_fast_conditions", None)
+        state.pop("_rebinding", None)
+        state.pop("_rule_dict", None)
+        state.pop("key_reads", None)
+        state.pop("reads", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
 
     def __str__(self):
         res = self.object_type
@@ -166,15 +461,13 @@ class StyleRule:
     def _satisfies_condition(self, obj: BaseElement, context: dict) -> bool:
         condition = None
         if "condition" in self.props:
-            condition = self.props["condition"]
+            condition = "condition"
         elif "condition*" in self.props:
-            condition = self.props["condition*"]
-        if not condition:
+            condition = "condition*"
+        if not condition or not self.props[condition]:
             return True
 
-        eval_result = self._safe_eval(
-            textwrap.dedent(condition), obj, context
-        )
+        eval_result = self._safe_eval(condition, obj, context)
         return eval_result
 
     def _replace_caption_vars(self, caption_template: str, obj: BaseElement) -> str:
@@ -200,8 +493,9 @@ class StyleRule:
 
         return caption
 
-    def _safe_eval(self, code: str, obj: BaseElement, context: dict):
-        """Evaluate code and return it's result.
+    def _safe_eval(self, pname: str, obj: BaseElement, context: dict):
+        """Evaluate the precompiled code of property pname and return its
+        result.
 
         If evaluation fails for some reason, raise a subclass of SafeEvalError.
 
@@ -209,48 +503,39 @@ class StyleRule:
 
         - context: a dictionary that may contain definitions already parsed
           in star rules from the GRASS file. It may be updated with definitions
-          found in `code`.
+          found in the code. If it has no namespace yet, it's initialized
+          with element_namespace(obj), keeping guards already in it.
         """
 
         # since this is in internal evaluator, we don't want its exceptions
         # to crash our backend.
         # pylint: disable=broad-exception-caught
 
+        code, byte_code, compile_error = self._compiled[pname]
         try:
-            # parse/transform code and add missing line/column numbers
-            tree = ast.fix_missing_locations(parse_code_with_result(code))
-            byte_code = compile_restricted(
-                tree, filename="<style file>", mode="exec"
-            )
-
-            if "result" in context:
-                context.pop("result")
-            # https: // stackoverflow.com / q / 52229521
-            default_obj_dict = DefaultAttrDict(lambda: "", obj.__dict__.copy())
-            default_props_dict = DefaultAttrDict(lambda: "", obj.properties)
-            # add node fields and properties for evaluation context.
-            context.update(
-                {
-                    "o": default_obj_dict,
-                    # let's make everybody happy
-                    "object": default_obj_dict,
-                    "p": default_props_dict,
-                    "properties": default_props_dict,
-                    "rule": DefaultAttrDict(lambda: "", self.to_dict()),
-                }
-            )
+            fast_condition = self._fast_conditions.get(pname)
+            if fast_condition and not context.get(NAMES_REBOUND):
+                try:
+                    return fast_condition(obj)
+                except FastPathFallback:
+                    pass
+
+            if compile_error:
+                raise compile_error.with_traceback(None)
+
+            if "o" not in context:
+                context.update(element_namespace(obj) | context)
+            context.pop("result", None)
+            context["rule"] = self._rule_dict
+            if pname in self._rebinding:
+                context[NAMES_REBOUND] = True
 
             # RestrictedPython allows us to safely use exec.
             # pylint: disable=exec-used
-            exec(
-                byte_code,
-                # we expand globals with locals so one can refer to
-                # 'o' and 'p' from within functions defined in user input.
-                # See https://stackoverflow.com/a/2749806
-                {**globals_dict, **context},
-                context,
-            )
+            exec(byte_code, context)
             return context["result"]
+        except exceptions.StyleBudgetExceeded:
+            raise
         except SyntaxError as e:
             raise exceptions.SafeEvalSyntaxError(repr(e), code)
         # Since we are evaluating restricted python code, we
@@ -258,18 +543,26 @@ class StyleRule:
         except Exception as e:
             raise exceptions.SafeEvalRuntimeError(repr(e), code, obj)
 
-    def apply(self, obj: BaseElement, context: dict) -> dict:
+    def apply(self, obj: BaseElement, context: dict, known: dict = None) -> dict:
         """Apply this rule to the obj, if possible.
         Return a new dictionary containing updated style properties.
         Update context with eventual definitions found when applying this rule.
+
+        If `known` holds some of the resulting style properties (e.g.
+        memoized ones), the rule is known to apply to obj and only the
+        other properties are computed.
         """
-        if self._is_applicable(obj, context):
+        if known is not None or self._is_applicable(obj, context):
             res_props = {}
 
             for pname, pval in self.props.items():
                 if pname + "*" in self.props:
                     # Star rules have higher precedence.
                     continue
+                key = pname.rstrip("*")
+                if known is not None and key in known:
+                    res_props[key] = known[key]
+                    continue
                 # defaultCaption has higher precedence.
                 # This is not run if caption* or defaultCaption* are present.
                 if pname == "caption" or (
@@ -280,9 +573,7 @@ class StyleRule:
                     )
                 # We want to give star rules a higher precedence than non-star.
                 elif pname.endswith("*"):
-                    res = self._safe_eval(
-                        textwrap.dedent(pval), obj, context
-                    )
+                    res = self._safe_eval(pname, obj, context)
                     res_props[pname.rstrip("*")] = str(res)
                 else:
                     res_props[pname] = pval
@@ -290,24 +581,76 @@ class StyleRule:
         return None
 
 
+@dataclass(frozen=True)
+class CachedStyle:
+    """Parsed style file together with the file state it was parsed from."""
+    rules: tuple
+    digest: str
+    mtime_ns: int
+    size: int
+
+
+# Parsed default style files, keyed by (customization dir, file path).
+style_cache = dict()
+style_cache_lock = Lock()
+
+
+def _load_cached_style(custom_dir: str, path: str) -> CachedStyle:
+    """Return parsed style rules of file at `path`.
+
+    The file is only parsed again if its mtime or size changed AND its
+    contents differ from the cached version. The resulting rules are
+    shared between all requests and threads, so they must not be modified.
+
+    May raise a ParseException or an OSError.
+    """
+    key = (custom_dir, path)
+    stat = os.stat(path)
+    with style_cache_lock:
+        cached = style_cache.get(key)
+    if cached and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+        return cached
+
+    with open(path, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if cached and cached.digest == digest:
+        # touched, but not changed
+        rules = cached.rules
+    else:
+        current_app.logger.info(f"Parsing style file {path}")
+        text = data.decode("utf-8-sig")
+        rules = tuple(parse_style(text)) if text else ()
+
+    cached = CachedStyle(
+        rules=rules, digest=digest, mtime_ns=stat.st_mtime_ns, size=stat.st_size
+    )
+    with style_cache_lock:
+        style_cache[key] = cached
+    return cached
+
+
 def load_default_style():
-    """Load default grass file."""
+    """Load default grass file.
 
-    default_style_file = os.path.join(get_customized_file_dir(),"style.grass")
+    Parsing is done only once per file version, see _load_cached_style.
+    """
+    custom_dir = get_customized_file_dir()
+    default_style_file = os.path.join(custom_dir, "style.grass")
 
     try:
-        with open(
+        cached = _load_cached_style(
+            custom_dir,
             os.path.join(os.environ["GRAPHEDITOR_BASEDIR"], default_style_file),
-            "rb",
-        ) as file:
-            if file:
-                g.DEFAULT_STYLE_RULES, _ = read_style(file)
-            else:
-                g.DEFAULT_STYLE_RULES = []
-    except (pp.ParseException, FileNotFoundError) as e:
+        )
+        g.DEFAULT_STYLE_RULES = cached.rules
+        g.DEFAULT_STYLE_DIGEST = cached.digest
+    except (pp.ParseException, OSError) as e:
         current_app.logger.error(
             f"error processing style file {default_style_file}: {e}"
         )
+        g.DEFAULT_STYLE_RULES = ()
+        g.DEFAULT_STYLE_DIGEST = ""
 
 
 def read_style(file):
@@ -352,67 +695,617 @@ def parse_style(style_text):
     return rules
 
 
+@dataclass
+class RuleProfile:
+    """Accumulated cost of applying a style rule."""
+    calls: int = 0
+    memo_hits: int = 0
+    matches: int = 0
+    seconds: float = 0.0
+
+
+@dataclass(frozen=True)
+class Candidates:
+    """Rules that may apply to elements with the same labels (or type).
+
+    Results of the rules are shared by all elements agreeing on `reads`,
+    and memoized, except for the style properties reading the ID of the
+    element (e.g. captions). Those are computed for each element, in their
+    own namespace: `own` maps rule indexes to the keys of such properties,
+    or to None if the whole rule is applied to each element (e.g. since
+    its condition reads the ID). See split_candidates.
+    """
+    rules: tuple
+    reads: StyleReads
+    own: dict = field(default_factory=dict)
+
+
+def split_candidates(indexed_rules: tuple) -> Candidates:
+    """Separate style properties reading element IDs from the others,
+    unless they use definitions of each other."""
+    own = {}
+    own_reads, shared_reads = StyleReads(), StyleReads()
+    for index, rule in indexed_rules:
+        condition_reads = rule.condition_reads()
+        own_keys = frozenset(
+            key for key, reads in rule.key_reads.items()
+            if reads.element_specific
+        )
+        if condition_reads.element_specific or (
+            own_keys and own_keys == rule.key_reads.keys()
+        ):
+            own[index] = None
+            own_reads = own_reads.merge(rule.reads)
+            continue
+        shared_reads = shared_reads.merge(condition_reads)
+        if own_keys:
+            own[index] = own_keys
+            own_reads = own_reads.merge(condition_reads)
+        for key, reads in rule.key_reads.items():
+            if key in own_keys:
+                own_reads = own_reads.merge(reads)
+            else:
+                shared_reads = shared_reads.merge(reads)
+    if (
+        own
+        and not own_reads.binds & shared_reads.loads
+        and not shared_reads.binds & own_reads.loads
+    ):
+        return Candidates(indexed_rules, shared_reads, own)
+    return Candidates(indexed_rules, own_reads.merge(shared_reads))
+
+
+class StylePlan:
+    """Style rules indexed by object type and label/relation type.
+
+    Applying rules to an element only visits the rules that may match it,
+    i.e. wildcard rules and rules for one of its labels (or its type),
+    keeping the order of the style files.
+
+    `origins` gives the style file name and the index in that file of each
+    rule, used for reporting rule profiles. `key` identifies the style
+    version of shared plans (see fetch_style_plan).
+    """
+
+    # Bound for the number of label combinations whose candidates we keep.
+    MAX_CANDIDATE_SETS = 1024
+
+    def __init__(self, rules, origins=None, key=None):
+        self.rules = tuple(rules)
+        self.key = key
+        self._pickled_rules = None
+        self.origins = tuple(origins or (("", i) for i in range(len(self.rules))))
+        self._profiles = [RuleProfile() for _ in self.rules]
+        self._profiles_lock = Lock()
+        self._wildcard_rules = {"node": [], "relation": []}
+        self._label_rules = {"node": {}, "relation": {}}
+        for index, rule in enumerate(self.rules):
+            if rule.object_type not in self._wildcard_rules:
+                # can never be applied
+                continue
+            if not rule.label_or_type or rule.label_or_type == "*":
+                self._wildcard_rules[rule.object_type].append(index)
+            else:
+                self._label_rules[rule.object_type].setdefault(
+                    rule.label_or_type, []
+                ).append(index)
+        self._candidates = {}
+        self._memo = OrderedDict()
+        self._memo_lock = Lock()
+
+    @staticmethod
+    def _candidates_key(obj: BaseElement):
+        if isinstance(obj, BaseNode):
+            return ("node", frozenset(obj.labels))
+        if isinstance(obj, BaseRelation):
+            return ("relation", frozenset((obj.type,)))
+        return ("relation", frozenset())
+
+    def _lookup_candidates(self, key) -> Candidates:
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            object_type, labels_or_types = key
+            indexes = set(self._wildcard_rules[object_type])
+            for label_or_type in labels_or_types:
+                indexes.update(
+                    self._label_rules[object_type].get(label_or_type, ())
+                )
+            candidates = split_candidates(
+                tuple((i, self.rules[i]) for i in sorted(indexes))
+            )
+            if len(self._candidates) >= self.MAX_CANDIDATE_SETS:
+                self._candidates.clear()
+            self._candidates[key] = candidates
+        return candidates
+
+    def candidates_for(self, obj: BaseElement) -> Candidates:
+        """Return the rules that may apply to obj."""
+        return self._lookup_candidates(self._candidates_key(obj))
+
+    def indexed_rules_for(self, obj: BaseElement) -> tuple:
+        """Return (index, rule) pairs of the rules that may apply to obj, in
+        order of definition."""
+        return self.candidates_for(obj).rules
+
+    def rules_for(self, obj: BaseElement) -> tuple:
+        """Return rules that may apply to obj, in order of definition."""
+        return tuple(rule for _, rule in self.indexed_rules_for(obj))
+
+    def memo_key(self, obj: BaseElement):
+        """Return key under which the results of the shared rules of obj
+        can be memoized, or None if they must be computed each time."""
+        if config.style_memo_size <= 0:
+            return None
+        candidates_key = self._candidates_key(obj)
+        reads = self._lookup_candidates(candidates_key).reads
+        if not reads.memoizable:
+            return None
+        if reads.all_properties:
+            props = tuple(
+                (k, _freeze(v)) for k, v in sorted(obj.properties.items())
+            )
+        else:
+            props = tuple(
+                (k, _freeze(obj.properties.get(k, MISSING)))
+                for k in sorted(reads.properties)
+            )
+        fields = tuple(
+            (f, _freeze(getattr(obj, f, MISSING)))
+            for f in sorted(reads.object_fields)
+        )
+        return (candidates_key, props, fields)
+
+    def memo_get(self, key) -> tuple | None:
+        """Return memoized (rule index, style properties or None) results
+        of shared rules."""
+        with self._memo_lock:
+            results = self._memo.get(key)
+            if results is not None:
+                self._memo.move_to_end(key)
+        return results
+
+    def memo_put(self, key, results: tuple):
+        with self._memo_lock:
+            self._memo[key] = results
+            if len(self._memo) > config.style_memo_size:
+                self._memo.popitem(last=False)
+
+    def pickled_rules(self) -> bytes:
+        """Return the rules pickled, e.g. for sending them to workers."""
+        if self._pickled_rules is None:
+            self._pickled_rules = pickle.dumps(self.rules)
+        return self._pickled_rules
+
+    def record_profile(self, timings):
+        """Add (rule index, seconds, matched) tuples of styling an element
+        to the rule profiles."""
+        with self._profiles_lock:
+            for index, seconds, matched in timings:
+                profile = self._profiles[index]
+                profile.calls += 1
+                profile.matches += matched
+                profile.seconds += seconds
+
+    def record_memo_hit(self, obj: BaseElement):
+        """Count a memo hit for the shared rules that may apply to obj."""
+        candidates = self.candidates_for(obj)
+        with self._profiles_lock:
+            for index, _ in candidates.rules:
+                if candidates.own.get(index, ()) is not None:
+                    self._profiles[index].memo_hits += 1
+
+    def profile(self) -> list[dict]:
+        """Return profiles of all rules, most expensive first."""
+        with self._profiles_lock:
+            profiles = [
+                {
+                    "style": style,
+                    "rule": index,
+                    "selector": _selector(rule),
+                    "calls": profile.calls,
+                    "memoHits": profile.memo_hits,
+                    "matches": profile.matches,
+                    "seconds": profile.seconds,
+                }
+                for rule, (style, index), profile in zip(
+                    self.rules, self.origins, self._profiles
+                )
+            ]
+        return sorted(profiles, key=lambda p: p["seconds"], reverse=True)
+
+    def reset_profile(self):
+        with self._profiles_lock:
+            self._profiles = [RuleProfile() for _ in self.rules]
+
+
+def _selector(rule: StyleRule) -> str:
+    what = "relationship" if rule.object_type == "relation" else "node"
+    if rule.label_or_type:
+        return f"{what}.{rule.label_or_type}"
+    return what
+
+
+# placeholder for missing values in memo keys
+MISSING = object()
+
+
+def _freeze(value):
+    """Return a hashable representation of a property value."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+# name of the default style file in rule profiles
+DEFAULT_STYLE_NAME = "style.grass"
+
+# StylePlan's of style versions, keyed by digests of default and user styles.
+style_plans = OrderedDict()
+style_plans_lock = Lock()
+MAX_STYLE_PLANS = 64
+
+
+def fetch_style_plan() -> StylePlan:
+    """Return the StylePlan for the style rules valid in the current session.
+
+    Plans are built once per style version and shared between requests.
+    """
+    if "style_plan" in g:
+        return g.style_plan
+
+    selected_style = get_selected_style()
+    user_digest = get_style_files().get(selected_style, "")
+    user_rules = _fetch_stored_rules(user_digest)
+
+    key = (getattr(g, "DEFAULT_STYLE_DIGEST", ""), user_digest)
+    with style_plans_lock:
+        plan = style_plans.get(key)
+        if plan:
+            style_plans.move_to_end(key)
+    if not plan:
+        default_rules = tuple(getattr(g, "DEFAULT_STYLE_RULES", ()))
+        user_rules = tuple(user_rules)
+        plan = StylePlan(
+            default_rules + user_rules,
+            origins=[(DEFAULT_STYLE_NAME, i) for i in range(len(default_rules))]
+            + [(selected_style, i) for i in range(len(user_rules))],
+            key=key,
+        )
+        with style_plans_lock:
+            style_plans[key] = plan
+            if len(style_plans) > MAX_STYLE_PLANS:
+                style_plans.popitem(last=False)
+
+    g.style_plan = plan
+    return plan
+
+
 def fetch_style_rules() -> list[StyleRule]:
     """Fetch all style rules valid in the current session.
 
     These consist of default rules followed by user-defined ones.
     """
-    res = list(g.DEFAULT_STYLE_RULES)
+    res = list(getattr(g, "DEFAULT_STYLE_RULES", ()))
+    res.extend(_fetch_stored_rules(get_style_files().get(get_selected_style(), "")))
+    return res
+
 
+def _fetch_stored_rules(digest: str) -> tuple:
+    """Return rules of the uploaded style with the given digest, or no rules
+    if it can't be loaded."""
+    if not digest:
+        return ()
     try:
-        selected_style = get_selected_style()
-        res.extend(session["style_files"][selected_style]["rules"])
-    except KeyError:
-        pass
+        return style_store.get_rules(digest)
+    except (exceptions.StyleNotFoundException, pp.ParseException) as e:
+        current_app.logger.error(f"Can't load stored style {digest}: {e!r}")
+        return ()
 
-    return res
 
+def _finish_style(style_props: dict) -> dict:
+    """Set the caption of computed style properties."""
+    # we keep the caption logic in the server, so there is no point in
+    # passing defaultCaption to the client.
+    if "caption" not in style_props:
+        if "defaultCaption" in style_props:
+            style_props["caption"] = style_props["defaultCaption"]
+        else:
+            style_props["caption"] = ""
 
-def apply_style_rules(obj: BaseElement, style_rules: list[StyleRule]=None) -> BaseElement:
-    """Apply style rules in effect on the given object."""
-    if not style_rules:
-        style_rules = fetch_style_rules()
+    style_props.pop("defaultCaption", None)
+    return style_props
 
-    if not style_rules:
-        return obj
 
+def _static_style(plan: StylePlan, obj: BaseElement) -> dict:
+    """Return style properties of obj set by rules without any code.
+
+    Used once the style budget of a request is exceeded."""
     style_props = {}
-    context = {}
-    try:
-        for rule in style_rules:
-            new_style_props = rule.apply(obj, context)
-            if new_style_props:
-                style_props.update(new_style_props)
-
-        # we keep the caption logic in the server, so there is no point in
-        # passing defaultCaption to the client.
-        if "caption" not in style_props:
-            if "defaultCaption" in style_props:
-                style_props["caption"] = style_props["defaultCaption"]
-            else:
-                style_props["caption"] = ""
+    for rule in plan.rules_for(obj):
+        if not rule.has_code:
+            style_props.update(rule.apply(obj, {}) or {})
+    return _finish_style(style_props)
+
 
-        style_props.pop("defaultCaption", None)
+def _merge_results(results: dict, before=None) -> dict:
+    """Merge style properties of the rules applied, by rule index, in order
+    of the rules (the ones before rule index `before` only, if set)."""
+    style_props = {}
+    for index in sorted(results):
+        if before is not None and index >= before:
+            break
+        if results[index]:
+            style_props.update(results[index])
+    return style_props
+
+
+def _shared_results(candidates: Candidates, results: dict) -> tuple:
+    """Return (rule index, style properties or None) results of rules,
+    without the properties computed for each element."""
+    shared = []
+    for index, _ in candidates.rules:
+        props = results[index]
+        if index in candidates.own:
+            own_keys = candidates.own[index]
+            if own_keys is None:
+                continue
+            if props is not None:
+                props = {k: v for k, v in props.items() if k not in own_keys}
+        shared.append((index, props))
+    return tuple(shared)
+
+
+def _compute_style(
+    plan: StylePlan, obj: BaseElement, budget, shared: tuple = None
+) -> tuple:
+    """Compute the style properties of obj.
+
+    `shared` are memoized results of the shared rules of obj (see
+    Candidates), if any; then only the other rules are applied.
+
+    Return the style properties together with the (rule index, seconds,
+    matched) timings of the rules applied and the results of the shared
+    rules to memoize (None if they must not be memoized).
+    """
+    candidates = plan.candidates_for(obj)
+    # rule index -> style properties set by the rule (None if not applied)
+    results = dict(shared or ())
+    # filled with element_namespace(obj) when code is evaluated first.
+    context = dict(budget.guards) if budget else {}
+    timings = []
+    to_memoize = None
+    index = None
+    try:
+        if budget:
+            budget.start()
+            budget.check()
+        for index, rule in candidates.rules:
+            known = None
+            if shared is not None:
+                # only the properties reading the element ID remain
+                if index not in candidates.own:
+                    continue
+                if candidates.own[index] is not None:
+                    known = results[index]
+                    if known is None:
+                        # the (shared) condition doesn't hold
+                        continue
+            new_style_props = None
+            start = time.perf_counter()
+            try:
+                new_style_props = rule.apply(obj, context, known)
+            finally:
+                timings.append((
+                    index,
+                    time.perf_counter() - start,
+                    new_style_props is not None,
+                ))
+            results[index] = new_style_props
+
+        style_props = _finish_style(_merge_results(results))
+        # errors are not memoized, since their captions describe the element.
+        if shared is None:
+            to_memoize = _shared_results(candidates, results)
+    except exceptions.StyleBudgetExceeded:
+        style_props = _static_style(plan, obj)
     except exceptions.SafeEvalSyntaxError as e:
+        style_props = _merge_results(results, before=index)
         style_props["caption"] = (
             f"ERROR: syntax error: {e.message}. " f'Code: "{e.code}".'
         )
     except exceptions.SafeEvalRuntimeError as e:
+        style_props = _merge_results(results, before=index)
         style_props["caption"] = (
             f"ERROR: runtime error: {e.message}. "
             f'Code: "{e.code}".'
             f"Object: {e.element}"
         )
-
+    finally:
+        if budget:
+            budget.stop()
+    return style_props, timings, to_memoize
+
+
+def _store_style(plan: StylePlan, obj: BaseElement, memo_key, result):
+    """Set the style computed by _compute_style on obj, and record it."""
+    style_props, timings, to_memoize = result
+    if to_memoize is not None and memo_key is not None:
+        plan.memo_put(memo_key, to_memoize)
+    if config.style_profiling:
+        plan.record_profile(timings)
     obj.style = style_props
+
+
+def _lookup_memo(plan: StylePlan, obj: BaseElement) -> tuple:
+    """Return the memo key of obj, the memoized results of its shared rules
+    (or None) and its style, if no rules remain to be applied (or None)."""
+    memo_key = plan.memo_key(obj)
+    shared = plan.memo_get(memo_key) if memo_key is not None else None
+    if shared is None:
+        return memo_key, None, None
+    if config.style_profiling:
+        plan.record_memo_hit(obj)
+    if plan.candidates_for(obj).own:
+        return memo_key, shared, None
+    return memo_key, shared, _finish_style(_merge_results(dict(shared)))
+
+
+def _log_exceeded_budget(budget):
+    current_app.logger.warning(
+        f"Style budget exceeded after {budget.operations} operations, "
+        "using static styles for the remaining elements"
+    )
+
+
+def apply_style_rules(obj: BaseElement, style_rules: list[StyleRule]=None) -> BaseElement:
+    """Apply style rules in effect on the given object."""
+    if not style_rules:
+        plan = fetch_style_plan()
+    else:
+        plan = StylePlan(style_rules)
+
+    if not plan.rules:
+        return obj
+
+    memo_key, shared, style_props = _lookup_memo(plan, obj)
+    if style_props is not None:
+        obj.style = style_props
+        return obj
+
+    budget = request_budget()
+    if budget and budget.exceeded:
+        obj.style = _static_style(plan, obj)
+        return obj
+
+    _store_style(
+        plan, obj, memo_key, _compute_style(plan, obj, budget, shared)
+    )
+    if budget and budget.exceeded:
+        _log_exceeded_budget(budget)
     return obj
 
 
+# StylePlan's known to a style pool worker, keyed by StylePlan.key.
+worker_plans = OrderedDict()
+
+
+def _style_chunk(plan_key, pickled_rules: bytes, objs: list, budget_args):
+    """Compute styles of objs in a style pool worker.
+
+    objs are (element, memoized results of its shared rules or None)
+    pairs. Return the results of _compute_style in order of objs, whether
+    the budget was exceeded and the (seconds, operations) used of it.
+    """
+    plan = worker_plans.get(plan_key)
+    if plan is None:
+        plan = StylePlan(pickle.loads(pickled_rules), key=plan_key)
+        worker_plans[plan_key] = plan
+        if len(worker_plans) > MAX_STYLE_PLANS:
+            worker_plans.popitem(last=False)
+    budget = StyleBudget(*budget_args) if any(budget_args) else None
+    results = []
+    for obj, shared in objs:
+        if budget and budget.exceeded:
+            results.append((_static_style(plan, obj), [], None))
+        else:
+            results.append(_compute_style(plan, obj, budget, shared))
+    if not budget:
+        return results, False, (0.0, 0)
+    return results, budget.exceeded, (budget.seconds, budget.operations)
+
+
+def apply_style_rules_batch(objs: list[BaseElement]) -> list[BaseElement]:
+    """Apply style rules in effect on the given objects.
+
+    Batches of at least config.style_pool_threshold elements are styled in
+    the style pool, if one is configured. Otherwise, or if the pool fails,
+    objects are styled one after the other.
+    """
+    plan = fetch_style_plan()
+    budget = request_budget()
+    pool = None
+    if (
+        plan.rules
+        and plan.key is not None
+        and len(objs) >= config.style_pool_threshold
+        and not (budget and budget.exceeded)
+    ):
+        pool = get_style_pool()
+    if not pool:
+        for obj in objs:
+            apply_style_rules(obj)
+        return objs
+
+    pending = []
+    for obj in objs:
+        memo_key, shared, style_props = _lookup_memo(plan, obj)
+        if style_props is None:
+            pending.append((obj, memo_key, shared))
+        else:
+            obj.style = style_props
+
+    chunks = chunked(pending, 4 * config.style_pool_workers)
+    # Chunks run in parallel, so each gets its share of the remaining
+    # budget, and the request is charged for what they used.
+    budget_args = budget.share(len(chunks)) if budget else (0, 0)
+    try:
+        chunk_results = list(pool.map(
+            _style_chunk,
+            itertools.repeat(plan.key),
+            itertools.repeat(plan.pickled_rules()),
+            [[(obj, shared) for obj, _, shared in chunk] for chunk in chunks],
+            itertools.repeat(budget_args),
+        ))
+    # whatever goes wrong in the pool, we can still style here.
+    # pylint: disable=broad-exception-caught
+    except Exception as e:
+        current_app.logger.error(f"Styling in process pool failed: {e!r}")
+        if isinstance(e, BrokenProcessPool):
+            discard_style_pool(pool)
+        for obj, _, _ in pending:
+            apply_style_rules(obj)
+        return objs
+
+    for chunk, (results, exceeded, used) in zip(chunks, chunk_results):
+        for (obj, memo_key, _), result in zip(chunk, results):
+            _store_style(plan, obj, memo_key, result)
+        if budget:
+            budget.charge(*used)
+            if exceeded:
+                budget.exceeded = True
+    if budget and budget.exceeded:
+        _log_exceeded_budget(budget)
+    return objs
+
+
+def get_style_files() -> dict:
+    """Return map of filenames of styles uploaded by the user to their
+    digests in the style store.
+
+    Entries of older sessions, containing parsed rules and text, are moved
+    to the style store.
+    """
+    style_files = session.get("style_files", {})
+    for filename, entry in list(style_files.items()):
+        if isinstance(entry, dict):
+            style_files[filename] = style_store.put(entry["text"], entry["rules"])
+    return style_files
+
+
+def store_style(filename: str, rules: list[StyleRule], text: str):
+    """Add an uploaded style to the session."""
+    if "style_files" not in session:
+        session["style_files"] = dict()
+    session["style_files"][filename] = style_store.put(text, rules)
+
+
 def get_style_filenames():
     """Return the filenames of styles uploaded by the user."""
-    if "style_files" in session:
-        return list(session["style_files"].keys())
-    return []
+    return list(get_style_files().keys())
 
 
 def get_selected_style(tab_id=None):
@@ -439,15 +1332,19 @@ def select_style(filename, tab_id=None):
 
 
 def get_stored_style(filename):
-    if "style_files" in session and filename in session["style_files"]:
-        style = session["style_files"][filename]
-        return style["rules"], style["text"]
+    """Return rules and text of uploaded style `filename`.
+
+    May raise a StyleNotFoundException."""
+    digest = get_style_files().get(filename)
+    if digest:
+        return style_store.get_rules(digest), style_store.get_text(digest)
     raise exceptions.StyleNotFoundException
 
 
 def delete_stored_style(filename):
-    if "style_files" in session and filename in session["style_files"]:
-        del session["style_files"][filename]
+    style_files = get_style_files()
+    if filename in style_files:
+        del style_files[filename]
         if get_selected_style() == filename:
             del session["selected_style"][g.tab_id]
     else:
@@ -1,9 +1,10 @@
-from flask import current_app
+from flask import current_app, g
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.graph import meta_model
 from blueprints.maintenance.login_api import require_tab_id
+from database.neo4j_connection import read_only
 from database.mapper import get_base_id, GraphEditorNode
 from database.id_handling import GraphEditorLabel, extract_id_metatype
 
@@ -21,7 +22,7 @@ class MetaForMeta(MethodView):
     ]
 
     def _fetch_metaproperties_for_metalabel(self, nid):
-        metaproperties = current_app.graph_db.get_node_relations(
+        metaproperties = g.graph_db.get_node_relations(
             nid, filters={"relation_type": "MetaProperty__tech_"}
         )
         return metaproperties
@@ -41,7 +42,7 @@ class MetaForMeta(MethodView):
                 # collect remaining IDs
                 db_ids.append(nid)
 
-        fetched_nodes = current_app.graph_db.get_nodes_by_ids(db_ids)
+        fetched_nodes = g.graph_db.get_nodes_by_ids(db_ids)
         db_ids_metatypes = {}
         for nid, node in fetched_nodes.items():
             for metatype in self._supported_metalabels:
@@ -58,7 +59,7 @@ class MetaForMeta(MethodView):
         MetaRelation.  Each ID is mapped to an array of metaproperties.
         """
 
-        nodes_to_neighbors_map = current_app.graph_db.get_nodes_neighbors(
+        nodes_to_neighbors_map = g.graph_db.get_nodes_neighbors(
             id_map, ["prop__tech_"], "incoming"
         )
 
@@ -77,7 +78,7 @@ class MetaForMeta(MethodView):
         is mapped to an array of metalabels or metaproperties.
         """
         result = {}
-        nodes_to_neighbors_map = current_app.graph_db.get_nodes_neighbors(
+        nodes_to_neighbors_map = g.graph_db.get_nodes_neighbors(
             id_map, ["prop__tech_"], "outgoing"
         )
         for nid, neighbors in nodes_to_neighbors_map.items():
@@ -94,6 +95,7 @@ class MetaForMeta(MethodView):
         example=meta_model.meta_for_meta_example,
     )
     @blp.response(200, meta_model.MetaForMetaResponse)
+    @read_only
     @require_tab_id()
     def post(self, ids, result_type):
         """Given a list of IDs of MetaLabels and a result_type, return a Map
@@ -117,7 +119,7 @@ class MetaForMeta(MethodView):
         the returned object maps the ID to an array of MetaProperties
         belonging to that MetaLabel.
         """
-        id_map = current_app.graph_db.ids_to_raw_db_ids(ids)
+        id_map = g.graph_db.ids_to_raw_db_ids(ids)
 
         if not id_map:
             return {"nodes": {}}
@@ -131,7 +133,7 @@ class MetaForMeta(MethodView):
         # check of metatype consistency in the future.
         # Get first MetaLabel found.
         for nid in ids:
-            sample_node = current_app.graph_db.get_node_by_id(nid)
+            sample_node = g.graph_db.get_node_by_id(nid)
             if sample_node is None:
                 continue
             for label in sample_node.labels:
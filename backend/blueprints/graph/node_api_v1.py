@@ -1,14 +1,17 @@
-from flask import abort, current_app, g, session
+from flask import abort, g, session
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.maintenance.login_api import require_tab_id
 from blueprints.graph import node_model
 from blueprints.graph import relation_model
-from database.mapper import GraphEditorNode, GraphEditorRelation, prepare_node_patch
+from database.mapper import (
+    GraphEditorNode, GraphEditorRelation, nodes_from_base_nodes, prepare_node_patch
+)
 from database.id_handling import (
     compute_semantic_id, get_base_id, GraphEditorLabel, parse_semantic_id, id_is_valid
 )
+from database.neo4j_connection import read_only
 from database.utils import abort_with_json
 
 
@@ -28,7 +31,7 @@ class Nodes(MethodView):
 
         Returns the newly created node
         """
-        new_nodes = current_app.graph_db.create_nodes(
+        new_nodes = g.graph_db.create_nodes(
             [prepare_node_patch(node_data)])
         if not new_nodes:
             abort_with_json(500, "Couldn't create node.")
@@ -40,6 +43,7 @@ class Nodes(MethodView):
         node_model.NodeSchema(many=True),
         example=[node_model.node_example],
     )
+    @read_only
     @require_tab_id()
     def get(self, text="", labels=None, pseudo=None):
         """
@@ -50,14 +54,12 @@ class Nodes(MethodView):
         if labels is None:
             labels = []
         # TODO should we return a map as in other endpoints?
-        nodes = [
-            GraphEditorNode.from_base_node(base_node)
-            for base_node in
-            current_app.graph_db.query_nodes(
+        nodes = nodes_from_base_nodes(
+            g.graph_db.query_nodes(
                 text,
                 [get_base_id(l) for l in labels],
                 pseudo)
-        ]
+        )
         return nodes
 
 
@@ -67,6 +69,7 @@ class NodesBulkFetch(MethodView):
         node_model.NodeBulkFetchSchema, as_kwargs=True, location="json"
     )
     @blp.response(200, node_model.NodeBulkFetchResponseSchema)
+    @read_only
     @require_tab_id()
     def post(self, ids):
         """
@@ -77,13 +80,12 @@ class NodesBulkFetch(MethodView):
 
         Return a dictionary mapping node IDs to the corresponding nodes.
         """
-        base_nodes_map = current_app.graph_db.get_nodes_by_ids(ids)
+        base_nodes_map = g.graph_db.get_nodes_by_ids(ids)
 
-        nodes = {
-            k: GraphEditorNode.from_base_node(base_node)
-            for k, base_node in
-            base_nodes_map.items()
-        }
+        nodes = dict(zip(
+            base_nodes_map.keys(),
+            nodes_from_base_nodes(base_nodes_map.values()),
+        ))
         for nid, node in nodes.items():
             if parse_semantic_id(nid):
                 node.id = nid
@@ -110,7 +112,7 @@ class NodesBulkDelete(MethodView):
 
         Return a dictionary containing the number of nodes deleted.
         """
-        num_deleted = current_app.graph_db.delete_nodes_by_ids(ids)
+        num_deleted = g.graph_db.delete_nodes_by_ids(ids)
         return dict(
             num_deleted=num_deleted, message=f"Deleted {num_deleted} nodes"
         )
@@ -130,7 +132,7 @@ class NodesBulkPatch(MethodView):
         Each patch must contain the corresponding ID.
         Return a map of the given node IDs to the new node objects.
         """
-        id_map = current_app.graph_db.ids_to_raw_db_ids([p["id"] for p in patches])
+        id_map = g.graph_db.ids_to_raw_db_ids([p["id"] for p in patches])
         result = {}
         for patch in patches:
             if "id" not in patch:
@@ -139,7 +141,7 @@ class NodesBulkPatch(MethodView):
             raw_db_id = id_map[orig_id]
             if not raw_db_id:
                 abort_with_json(400, f"Can't patch an unexisting node: {orig_id}")
-            new_node = current_app.graph_db.update_node_by_id(
+            new_node = g.graph_db.update_node_by_id(
                 f"id::{raw_db_id}", prepare_node_patch(patch)
             )
             new_node.id = orig_id
@@ -161,7 +163,7 @@ class NodesBulkPost(MethodView):
             "nodes": {
                 k: GraphEditorNode.from_base_node(base_node)
                 for k, base_node in
-                current_app.graph_db.create_nodes(
+                g.graph_db.create_nodes(
                     [prepare_node_patch(node_data) for node_data in nodes]
                 ).items()
             }
@@ -171,6 +173,7 @@ class NodesBulkPost(MethodView):
 @blp.route("/<nid>")
 class Node(MethodView):
     @blp.response(200, node_model.NodeSchema, example=node_model.node_example)
+    @read_only
     @require_tab_id()
     def get(self, nid: str):
         """
@@ -180,7 +183,7 @@ class Node(MethodView):
         """
         if not id_is_valid(nid):
             abort(400, "invalid id")
-        base_node = current_app.graph_db.get_node_by_id(nid)
+        base_node = g.graph_db.get_node_by_id(nid)
         if not base_node:
             grapheditor_node = GraphEditorNode.create_pseudo_node(nid)
         else:
@@ -199,11 +202,11 @@ class Node(MethodView):
 
         Returns the updated node
         """
-        existing_node = current_app.graph_db.get_node_by_id(nid)
+        existing_node = g.graph_db.get_node_by_id(nid)
         if not existing_node:
             abort_with_json(405, f"Node {nid} doesn't exist in the database")
 
-        base_node = current_app.graph_db.replace_node_by_id(
+        base_node = g.graph_db.replace_node_by_id(
             nid, prepare_node_patch(json_node), existing_node
         )
 
@@ -222,14 +225,14 @@ class Node(MethodView):
         Returns the updated node.
         """
         # TODO check and update node in same query
-        base_node = current_app.graph_db.get_node_by_id(nid)
+        base_node = g.graph_db.get_node_by_id(nid)
         # pseudo node
         if not base_node and GraphEditorNode.create_pseudo_node(nid):
             abort_with_json(405, f"Can't patch a pseudo node: {nid}")
         elif not base_node:
             abort_with_json(404, f"Node ID doesn't exist: {nid}")
 
-        updated_node = current_app.graph_db.update_node_by_id(
+        updated_node = g.graph_db.update_node_by_id(
             nid, prepare_node_patch(json_node), base_node)
         updated_node.id = nid
 
@@ -244,7 +247,7 @@ class Node(MethodView):
         Returns 200
         """
 
-        num_relations = current_app.graph_db.delete_nodes_by_ids([nid])
+        num_relations = g.graph_db.delete_nodes_by_ids([nid])
         return dict(
             num_deleted=num_relations, message=f"Deleted {num_relations} nodes"
         )
@@ -262,6 +265,7 @@ class NodeRelations(MethodView):
         relation_model.NodeRelationsSchema,
         example=relation_model.node_relations_response_example,
     )
+    @read_only
     @require_tab_id()
     def post(self, filters, nid: str):
         """
@@ -272,7 +276,7 @@ class NodeRelations(MethodView):
         return 200.
         """
 
-        rel_map = current_app.graph_db.get_node_relations(nid, filters=filters)
+        rel_map = g.graph_db.get_node_relations(nid, filters=filters)
         if filters["direction"] not in ["both", "outgoing", "incoming"]:
             abort_with_json(
                 400, "direction must be either 'both', 'outgoing' or 'incoming'"
@@ -295,12 +299,13 @@ class NodeLabels(MethodView):
     @blp.response(
         200, node_model.NodeLabelsSchema, example=node_model.node_labels_example
     )
+    @read_only
     @require_tab_id()
     def get(self):
         """Return all labels available in the database."""
         labels = [
             compute_semantic_id(label, GraphEditorLabel.MetaLabel)
-            for label in current_app.graph_db.get_all_labels()
+            for label in g.graph_db.get_all_labels()
         ]
         return dict(labels=labels)
 
@@ -308,6 +313,7 @@ class NodeLabels(MethodView):
 @blp.route("/labels/default")
 class NodeDefaultLabels(MethodView):
     @blp.response(200, node_model.NodeDefaultLabelsGetResponseSchema)
+    @read_only
     @require_tab_id()
     def get(self):
         """Get the list of default labels.
@@ -317,7 +323,7 @@ class NodeDefaultLabels(MethodView):
             label_ids = session["default_labels"][g.tab_id]
         except KeyError:
             return {"nodes": []}
-        label_nodes_map = current_app.graph_db.get_nodes_by_ids(label_ids)
+        label_nodes_map = g.graph_db.get_nodes_by_ids(label_ids)
         result = []
         for label_id in label_ids:
             if label_id not in label_nodes_map:
@@ -354,11 +360,12 @@ class NodeProperties(MethodView):
         node_model.NodePropertiesSchema,
         example=node_model.node_properties_example,
     )
+    @read_only
     @require_tab_id()
     def get(self):
         """Return all node properties available in the database."""
         properties = [
             compute_semantic_id(pname, GraphEditorLabel.MetaProperty)
-            for pname in current_app.graph_db.get_all_node_properties()
+            for pname in g.graph_db.get_all_node_properties()
         ]
         return dict(properties=properties)
@@ -1,10 +1,12 @@
-from flask import current_app
+from flask import g
 from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.maintenance.login_api import require_tab_id
 from blueprints.graph import parallax_model
-from database.mapper import GraphEditorNode, get_grapheditor_nodes_by_ids
+from database.mapper import get_grapheditor_nodes_by_ids, nodes_from_base_nodes
+from database.neo4j_connection import read_only
+from database.settings import config
 from database.utils import abort_with_json
 from database.id_handling import get_base_id, compute_semantic_id, GraphEditorLabel
 
@@ -34,90 +36,37 @@ def _normalize_filters(filters):
 
 @blp.route("")
 class Parallax(MethodView):
-    def _next_types(self, node_ids: list[str]) -> set[str]:
-        """Return a set of all relation types of incoming and outgoing
-        relations that have any of the given nodes as source/target.
-        node_ids is a list of node IDs (string).
-        """
-        raw_db_ids = [get_base_id(nid) for nid in node_ids]
-        in_rel_types = current_app.graph_db.incoming_relation_types(raw_db_ids)
-        out_rel_types = current_app.graph_db.outgoing_relation_types(raw_db_ids)
-
+    @staticmethod
+    def _relation_types_info(counts: dict[str, int]) -> dict[str, dict]:
+        """Map semantic IDs of relation types to their counts."""
         return {
-            'incoming': {
-                compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation): {
-                    'count': count
-                }
-                for rel_type, count in in_rel_types.items()
-            },
-            'outgoing': {
-                compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation): {
-                    'count': count
-                }
-                for rel_type, count in out_rel_types.items()
+            compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation): {
+                'count': count
             }
+            for rel_type, count in counts.items()
         }
 
-    def _next_set(self,
-                  nodes: dict[str, dict],
-                  in_rel_types: list[str],
-                  out_rel_types: list[str],
-                  filters: dict
-        ) -> dict[str, dict]:
-        # needed for get_nodes_neighbors
-        id_map = {nid: get_base_id(nid) for nid in nodes.keys()}
-
-        # get_nodes_neighbors maps IDs of provided nodes to a map containing neighbors
-        # (where keys are IDs, values are nodes).
-        # We merge the maps into a single map of node ID -> neighbor node.
-        neighbors_map = {}
-        normalized_filters = _normalize_filters(filters)
-
-        if out_rel_types:
-            nodes_with_neighbors = current_app.graph_db.get_nodes_neighbors(
-                id_map,
-                out_rel_types,
-                "outgoing",
-                normalized_filters
-            )
-            for neighbors in nodes_with_neighbors.values():
-                for neighbor_id, neighbor in neighbors.items():
-                    neighbors_map[f"id::{neighbor_id}"] = neighbor
-
-        if in_rel_types:
-            nodes_with_neighbors = current_app.graph_db.get_nodes_neighbors(
-                id_map,
-                in_rel_types,
-                "incoming",
-                normalized_filters
-            )
-
-            for neighbors in nodes_with_neighbors.values():
-                for neighbor_id, neighbor in neighbors.items():
-                    neighbors_map[f"id::{neighbor_id}"] = neighbor
-
-        return neighbors_map
-
-    def _apply_steps(self, initial_set: dict[str, dict], steps: list):
-        result_set = initial_set
+    @staticmethod
+    def _normalize_steps(steps: list) -> list[dict]:
+        """Return steps as expected by GraphDatabase.parallax."""
+        normalized_steps = []
         for step in steps:
             in_rel_types = [
                 get_base_id(rel_type)
-                for rel_type in step['incomingRelationTypes']
-            ] if 'incomingRelationTypes' in step else []
+                for rel_type in step.get('incomingRelationTypes', [])
+            ]
             out_rel_types = [
                 get_base_id(rel_type)
-                for rel_type in step['outgoingRelationTypes']
-            ] if 'outgoingRelationTypes' in step else []
+                for rel_type in step.get('outgoingRelationTypes', [])
+            ]
             if not in_rel_types and not out_rel_types:
                 abort_with_json(400, "A parallax step must include at least on relation type.")
-            result_set = self._next_set(
-                result_set,
-                in_rel_types,
-                out_rel_types,
-                step.get('filters', None)
-            )
-        return result_set
+            normalized_steps.append({
+                'incoming': in_rel_types,
+                'outgoing': out_rel_types,
+                'filters': _normalize_filters(step.get('filters', None)),
+            })
+        return normalized_steps
 
     def _apply_filters(self, nodes_map: dict[str, dict], filters: dict):
         """Apply filters and return resulting nodes_map.
@@ -153,38 +102,56 @@ class Parallax(MethodView):
 
     @blp.arguments(parallax_model.ParallaxPostSchema, as_kwargs=True)
     @blp.response(200, parallax_model.ParallaxPostResponseSchema)
+    @read_only
     @require_tab_id()
     # Method name corresponds to json names, which use camelCase.
     # pylint: disable=invalid-name
-    def post(self, node_ids, filters=None, steps=None):
-        nodes = {}
-        nodes = current_app.graph_db.get_nodes_by_ids(node_ids, filters=_normalize_filters(filters))
-
-        result_nodes = self._apply_steps(nodes, steps or [])
-        result_nids = [get_base_id(nid) for nid in result_nodes]
-        next_steps = self._next_types(result_nids)
-
+    def post(self, node_ids, filters=None, steps=None, counts_only=False,
+             limit=None, cursor=None):
+        """Return the nodes reached by steps with their relation types,
+        properties and labels.
+
+        Nodes are returned in pages of at most `limit` nodes (default
+        GUI_PARALLAX_PAGE_SIZE), pass `nextCursor` as `cursor` to get the
+        next one. With `countsOnly`, no nodes are returned.
+        """
+        if counts_only:
+            limit = 0
+        elif limit is None:
+            limit = config.parallax_page_size or None
+        result = g.graph_db.parallax(
+            node_ids,
+            _normalize_filters(filters),
+            self._normalize_steps(steps or []),
+            after=cursor,
+            limit=limit,
+        )
+        result_nodes = result['nodes']
+
+        # fetch MetaProperty and MetaLabel nodes at once
         prop_sem_ids = [
             compute_semantic_id(prop_name, GraphEditorLabel.MetaProperty)
-            for prop_name in
-            current_app.graph_db.get_all_node_properties(result_nids)
+            for prop_name in result['properties']
         ]
-        prop_nodes = get_grapheditor_nodes_by_ids(prop_sem_ids)
-
         label_sem_ids = [
             compute_semantic_id(label, GraphEditorLabel.MetaLabel)
-                for label in
-                current_app.graph_db.get_all_labels(result_nids)
+            for label in result['labels']
         ]
-        label_nodes = get_grapheditor_nodes_by_ids(label_sem_ids)
+        meta_nodes = get_grapheditor_nodes_by_ids(prop_sem_ids + label_sem_ids)
 
         return {
-            'nodes': {
-                k: GraphEditorNode.from_base_node(node)
-                for k, node in result_nodes.items()
+            'nodes': dict(zip(
+                result_nodes.keys(),
+                nodes_from_base_nodes(result_nodes.values()),
+            )),
+            'nextCursor': result['next_cursor'],
+            'nodeCount': result['node_count'],
+            'labelCounts': {
+                compute_semantic_id(label, GraphEditorLabel.MetaLabel): count
+                for label, count in result['label_counts'].items()
             },
-            'properties': prop_nodes,
-            'labels': label_nodes,
-            'incomingRelationTypes': next_steps['incoming'],
-            'outgoingRelationTypes': next_steps['outgoing'],
+            'properties': meta_nodes[:len(prop_sem_ids)],
+            'labels': meta_nodes[len(prop_sem_ids):],
+            'incomingRelationTypes': self._relation_types_info(result['incoming']),
+            'outgoingRelationTypes': self._relation_types_info(result['outgoing']),
         }
@@ -1,5 +1,5 @@
 from enum import Enum
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 from blueprints.graph import node_model
 
 class DirectionEnum(Enum):
@@ -39,6 +39,20 @@ class ParallaxPostSchema(Schema):
     )
     filters = fields.Nested(ParallaxFilterSchema(), required=False)
     steps = fields.List(fields.Nested(ParallaxStepSchema()), required=False)
+    counts_only = fields.Bool(
+        load_default=False,
+        data_key="countsOnly",
+        metadata={"description": "Only return counts, no nodes."},
+    )
+    limit = fields.Int(
+        required=False,
+        validate=validate.Range(min=1),
+        metadata={"description": "Maximum number of nodes to return."},
+    )
+    cursor = fields.Str(
+        required=False,
+        metadata={"description": "nextCursor of the previous page."},
+    )
 
 
 class RelationTypeInfo(Schema):
@@ -50,6 +64,15 @@ class ParallaxPostResponseSchema(Schema):
         keys = fields.Str(),
         values = fields.Nested(node_model.NodeSchema)
     )
+    nextCursor = fields.Str(
+        allow_none=True,
+        metadata={"description": "Cursor of the next page, null on the last page."},
+    )
+    nodeCount = fields.Int(metadata={"description": "Number of all resulting nodes."})
+    labelCounts = fields.Dict(
+        keys=fields.Str(metadata={"description": "semantic ID of label"}),
+        values=fields.Int(),
+    )
     properties = fields.List(fields.Nested(node_model.NodeSchema()))
     labels = fields.List(fields.Nested(node_model.NodeSchema()))
     incomingRelationTypes = fields.Dict(
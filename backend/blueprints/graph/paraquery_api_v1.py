@@ -1,10 +1,11 @@
-from flask import current_app
+from flask import g
 from flask.views import MethodView
 from flask_smorest import Blueprint
 from blueprints.graph import query_model
 from blueprints.graph import paraquery_model
 from blueprints.maintenance.login_api import require_tab_id
 from blueprints.graph.query_api_v1 import execute_query
+from database.neo4j_connection import read_only
 from database.utils import abort_with_json
 
 blp = Blueprint(
@@ -14,10 +15,11 @@ blp = Blueprint(
 @blp.route("")
 class ParaQuery(MethodView):
     @blp.response(200, paraquery_model.ParaqueryResponseSchema)
+    @read_only
     @require_tab_id()
     def get(self):
         "Return a map of paraquery ID's to their contents."
-        paraqueries = current_app.graph_db.get_paraqueries()
+        paraqueries = g.graph_db.get_paraqueries()
         return {
             "paraqueries": paraqueries
         }
@@ -44,13 +46,13 @@ class ParaQuery(MethodView):
         """
         paraquery_node = None
         if uuid:
-            nodes = current_app.graph_db.get_nodes_by_uuids([uuid])
+            nodes = g.graph_db.get_nodes_by_uuids([uuid])
             if nodes:
                 paraquery_node = nodes[uuid]
         elif db_id:
-            paraquery_node = current_app.graph_db.get_node_by_id(db_id)
+            paraquery_node = g.graph_db.get_node_by_id(db_id)
         elif name:
-            nodes = current_app.graph_db.get_nodes_by_names(
+            nodes = g.graph_db.get_nodes_by_names(
                 [name],
                 filters={"labels": ["MetaLabel::Paraquery__tech_"]}
             )
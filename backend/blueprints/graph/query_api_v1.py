@@ -7,6 +7,7 @@ import neo4j.exceptions
 from blueprints.graph import query_model
 from blueprints.maintenance.login_api import require_tab_id
 from database import mapper
+from database.generations import mark_written
 from database.id_handling import get_base_id
 from database.utils import abort_with_json
 
@@ -23,18 +24,29 @@ def execute_query(query_text:str, parameters:dict=None):
     } if parameters else {}
     try:
         neo_result = g.conn.run(query_text, **raw_parameters)
-        result = []
+        records = []
+        # nodes and relations of all records are styled in one batch
+        unstyled = []
         for record in neo_result:
+            records.append([
+                (key, mapper.neoobject2grapheditor(record.get(key), unstyled))
+                for key in record.keys()
+            ])
+        mapper.style_grapheditor_elements(unstyled)
+        result = []
+        for record in records:
             api_record = {}
-            for key in record.keys():
-                val = record.get(key)
-                obj = mapper.neoobject2grapheditor(val)
+            for key, obj in record:
                 if isinstance(obj, (mapper.GraphEditorNode, mapper.GraphEditorRelation)):
                     # https: // stackoverflow.com / q / 52229521
                     api_record[key] = obj.__dict__.copy()
                 else:
                     api_record[key] = obj
             result.append(api_record.items())
+        # arbitrary cypher may change anything, including the metamodel.
+        counters = neo_result.consume().counters
+        if counters.contains_updates or counters.contains_system_updates:
+            mark_written(meta=True)
         return {"result": list(result)}
     except neo4j.exceptions.ClientError as e:
         message = f"{repr(e)}\n{repr(e.__cause__)}"
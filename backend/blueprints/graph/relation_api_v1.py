@@ -6,9 +6,15 @@ from blueprints.graph import relation_model
 from blueprints.maintenance.login_api import require_tab_id
 from database import mapper, id_handling
 from database.id_handling import parse_db_id
+from database.neo4j_connection import read_only
 from database.utils import abort_with_json
 from database.id_handling import compute_semantic_id, GraphEditorLabel
-from database.mapper import GraphEditorNode, GraphEditorRelation, prepare_relation_patch
+from database.mapper import (
+    GraphEditorNode,
+    GraphEditorRelation,
+    prepare_relation_patch,
+    relations_from_base_relations,
+)
 
 blp = Blueprint(
     "Neo4j relations", __name__, description="Works with every neo4j database"
@@ -33,7 +39,7 @@ class Relations(MethodView):
 
         Returns the newly created relation
         """
-        new_rels = current_app.graph_db.create_relations([
+        new_rels = g.graph_db.create_relations([
             prepare_relation_patch(relation_data)
         ])
         if not new_rels:
@@ -48,6 +54,7 @@ class Relations(MethodView):
         relation_model.RelationSchema(many=True),
         example=[relation_model.relation_example],
     )
+    @read_only
     @require_tab_id()
     def get(self, text=""):
         """
@@ -55,10 +62,9 @@ class Relations(MethodView):
 
         Returns a list of relations
         """
-        return [
-            GraphEditorRelation.from_base_relation(base_rel)
-            for base_rel in current_app.graph_db.query_relations(text)
-        ]
+        return relations_from_base_relations(
+            g.graph_db.query_relations(text)
+        )
 
 
 @blp.route("/bulk_fetch")
@@ -67,6 +73,7 @@ class RelationsBulkFetch(MethodView):
         relation_model.RelationBulkFetchSchema, as_kwargs=True, location="json"
     )
     @blp.response(200, relation_model.RelationBulkFetchResponseSchema)
+    @read_only
     @require_tab_id()
     def post(self, ids):
         """
@@ -77,11 +84,11 @@ class RelationsBulkFetch(MethodView):
 
         Return a dictionary mapping node IDs to the corresponding nodes.
         """
-        base_rels = current_app.graph_db.get_relations_by_ids(ids)
-        relations = {
-            k: GraphEditorRelation.from_base_relation(base_rel)
-            for k, base_rel in base_rels.items()
-        }
+        base_rels = g.graph_db.get_relations_by_ids(ids)
+        relations = dict(zip(
+            base_rels.keys(),
+            relations_from_base_relations(base_rels.values()),
+        ))
 
         return dict(relations=relations)
 
@@ -100,7 +107,7 @@ class RelationsBulkDelete(MethodView):
 
         Return a dictionary containing the number of relations deleted.
         """
-        num_deleted = current_app.graph_db.delete_relations_by_ids(ids)
+        num_deleted = g.graph_db.delete_relations_by_ids(ids)
 
         return dict(
             num_deleted=num_deleted, message=f"Deleted {num_deleted} relations"
@@ -129,12 +136,12 @@ class RelationsBulkPatch(MethodView):
             if "id" not in patch:
                 abort_with_json(400, f"missing ID in patch: {id}")
             rid = patch["id"]
-            neo_rel = current_app.graph_db.get_relation_by_id(rid)
+            neo_rel = g.graph_db.get_relation_by_id(rid)
             if not neo_rel:
                 abort_with_json(
                     400, f"Can't patch an unexisting relation: {rid}"
                 )
-            new_rel = current_app.graph_db.update_relation_by_id(
+            new_rel = g.graph_db.update_relation_by_id(
                 rid, prepare_relation_patch(patch))
             result[rid] = GraphEditorRelation.from_base_relation(new_rel)
 
@@ -155,7 +162,7 @@ class RelationsBulkPost(MethodView):
             "relations": {
                 k: GraphEditorRelation.from_base_relation(base_rel)
                 for k, base_rel in
-                current_app.graph_db.create_relations(
+                g.graph_db.create_relations(
                     [prepare_relation_patch(rel_data) for rel_data in relations]
                 ).items()
             }
@@ -169,6 +176,7 @@ class Relation(MethodView):
         relation_model.RelationSchema,
         example=relation_model.relation_example,
     )
+    @read_only
     @require_tab_id()
     def get(self, rid: str):
         """
@@ -176,7 +184,7 @@ class Relation(MethodView):
 
         Returns a relation
         """
-        base_relation = current_app.graph_db.get_relation_by_id(rid)
+        base_relation = g.graph_db.get_relation_by_id(rid)
         if not base_relation:
             abort(404)
 
@@ -199,11 +207,11 @@ class Relation(MethodView):
 
         Return the updated relation.
         """
-        existing_relation = current_app.graph_db.get_relation_by_id(rid)
+        existing_relation = g.graph_db.get_relation_by_id(rid)
         if existing_relation is None:
             abort(404)
 
-        base_relation = current_app.graph_db.update_relation_by_id(
+        base_relation = g.graph_db.update_relation_by_id(
             rid, prepare_relation_patch(json_relation), existing_relation
         )
 
@@ -229,10 +237,10 @@ class Relation(MethodView):
 
         Returns the updated relation
         """
-        existing_relation = current_app.graph_db.get_relation_by_id(rid)
+        existing_relation = g.graph_db.get_relation_by_id(rid)
         if existing_relation is None:
             abort(404)
-        base_relation = current_app.graph_db.update_relation_by_id(
+        base_relation = g.graph_db.update_relation_by_id(
             rid, prepare_relation_patch(json_relation), existing_relation
         )
 
@@ -250,7 +258,7 @@ class Relation(MethodView):
 
         Returns 200
         """
-        num_deleted = current_app.graph_db.delete_relations_by_ids([rid])
+        num_deleted = g.graph_db.delete_relations_by_ids([rid])
         return dict(
             num_deleted=num_deleted, message=f"Deleted {num_deleted} relations"
         )
@@ -268,6 +276,7 @@ class RelationsByNodeIds(MethodView):
         relation_model.RelationSchema(many=True),
         example=[relation_model.relation_example],
     )
+    @read_only
     @require_tab_id()
     def post(self, node_ids: str|None = None, exclude_relation_types=None):
         """
@@ -281,13 +290,11 @@ class RelationsByNodeIds(MethodView):
             exclude_relation_types = []
 
         raw_db_ids = list(map(parse_db_id, node_ids))
-        relations = [
-            GraphEditorRelation.from_base_relation(base_rel)
-            for base_rel in
-            current_app.graph_db.get_relations_by_node_ids(
+        relations = relations_from_base_relations(
+            g.graph_db.get_relations_by_node_ids(
                 raw_db_ids, exclude_relation_types
             )
-        ]
+        )
         return relations
 
 
@@ -298,12 +305,13 @@ class RelationProperties(MethodView):
         relation_model.RelationProperties,
         example=relation_model.relation_properties_example,
     )
+    @read_only
     @require_tab_id()
     def get(self):
         """Return all relation properties available in the database."""
         properties = [
             compute_semantic_id(pname, GraphEditorLabel.MetaProperty)
-            for pname in current_app.graph_db.get_all_relation_properties()
+            for pname in g.graph_db.get_all_relation_properties()
         ]
         return dict(properties=properties)
 
@@ -315,12 +323,13 @@ class RelationTypes(MethodView):
         relation_model.RelationTypes,
         example=relation_model.relation_types_example,
     )
+    @read_only
     @require_tab_id()
     def get(self):
         """Return all relation types from the database."""
         types = [
             compute_semantic_id(rel_type, GraphEditorLabel.MetaRelation)
-            for rel_type in current_app.graph_db.get_all_types()
+            for rel_type in g.graph_db.get_all_types()
         ]
         return dict(types=types)
 
@@ -328,6 +337,7 @@ class RelationTypes(MethodView):
 @blp.route("/types/default")
 class RelationDefaultType(MethodView):
     @blp.response(200, relation_model.RelationDefaultTypeGetResponseSchema)
+    @read_only
     @require_tab_id()
     def get(self):
         """Get the default relation type.
@@ -340,7 +350,7 @@ class RelationDefaultType(MethodView):
         except KeyError:
             default_type_id = mapper.DEFAULT_RELATION_TYPE
 
-        base_node = current_app.graph_db.get_node_by_id(default_type_id)
+        base_node = g.graph_db.get_node_by_id(default_type_id)
         if base_node:
             node = GraphEditorNode.from_base_node(base_node)
         else:
@@ -7,17 +7,21 @@ from flask.views import MethodView
 from flask_smorest import Blueprint
 
 from blueprints.maintenance.login_api import require_tab_id
+from database.generations import database_key, mark_written
+from database.registry import get_registry
 from database.utils import abort_with_json
 
 blp = Blueprint("Dev tools", __name__, description="For development only")
 TIMEOUT_LIMIT = 200
 
 def _reset_graph():
+    mark_written(meta=True)
     g.conn.run("MATCH (n) DETACH DELETE n;")
     # without a commit we sometimes get an error that one can't update
     # data and change the schema in a single transaction. So we force
     # it here.
     g.conn.commit()
+    get_registry().capabilities.invalidate(database_key(g.conn))
 
 
 def _run_file(filename):
@@ -30,9 +34,12 @@ def _run_file(filename):
                 g.conn.commit()
 
             if statement:
+                mark_written(meta=True)
                 g.conn.run(statement)
                 # time.sleep(0.5)
     g.conn.commit()
+    # the file may have installed indexes, procedures or triggers
+    get_registry().capabilities.invalidate(database_key(g.conn))
 
 
 @blp.route("/transaction_test")
@@ -42,6 +49,7 @@ class Test(MethodView):
         """
         Quick test if transactions work
         """
+        mark_written()
         r = g.conn.run('Create (n:TransactionTest {name: "test"}) return n')
         n = r.single()["n"]
         print(n)
@@ -133,6 +141,7 @@ class ResetWithOSMData(MethodView):
                 print(f"line {i}")
                 sys.stdout.flush()
                 if statement:
+                    mark_written(meta=True)
                     g.conn.run(statement)
                     g.conn.commit()
 
@@ -4,6 +4,8 @@ from flask_smorest import Blueprint
 from flask.views import MethodView
 from flask import current_app
 from blueprints.maintenance import info_model
+from blueprints.maintenance.login_api import require_tab_id
+from database.registry import get_registry
 from database.utils import abort_with_json
 
 blp = Blueprint("Info", __name__, description="General system information")
@@ -53,3 +55,31 @@ class Version(MethodView):
             return "UNKNOWN"
 
         return f"{timestamp} {commit[:8]}"
+
+
+# Statistics are only available to logged in users (see
+# route_requires_connection in main.py).
+@blp.route("/drivers")
+class Drivers(MethodView):
+    @blp.response(200, info_model.DriverStatsSchema(many=True))
+    @require_tab_id()
+    def get(self):
+        """Return connection pool statistics of the Neo4j drivers of this
+        process, e.g. to detect pool saturation."""
+        return get_registry().drivers.stats()
+
+
+@blp.route("/queries")
+class Queries(MethodView):
+    @blp.response(200, info_model.QueryStatsSchema(many=True))
+    @require_tab_id()
+    def get(self):
+        """Return calls, rows and time spent on each query template of
+        this process, most expensive first."""
+        return get_registry().queries.stats()
+
+    @blp.response(204)
+    @require_tab_id()
+    def delete(self):
+        """Reset query template statistics."""
+        get_registry().queries.reset_stats()
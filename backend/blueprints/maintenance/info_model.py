@@ -4,3 +4,22 @@ from marshmallow import Schema, fields
 class BuildInfoSchema(Schema):
     commit = fields.Str()
     timestamp = fields.Str()
+
+
+class DriverStatsSchema(Schema):
+    host = fields.Str()
+    pool_size = fields.Int()
+    in_use = fields.Int()
+    max_pool_size = fields.Int()
+    acquisitions = fields.Int()
+    mean_acquisition_seconds = fields.Float()
+    max_acquisition_seconds = fields.Float()
+    failures = fields.Int()
+
+
+class QueryStatsSchema(Schema):
+    name = fields.Str()
+    calls = fields.Int()
+    rows = fields.Int()
+    server_seconds = fields.Float()
+    client_seconds = fields.Float()
@@ -0,0 +1,40 @@
+"""Bookmarks for causal consistency across requests.
+
+Read transactions may be routed to cluster members that are behind the
+leader. To let a tab see its own writes, sessions of a request get the
+bookmark manager of their scope (the tab, or all tabs of a user, see
+config.bookmark_scope). The driver updates the manager with the bookmark
+of each committed transaction and passes the bookmarks to new sessions,
+which then wait until the member caught up with them.
+
+The managers live in memory, since the teardown committing a transaction
+runs after the Flask session was saved. With several worker processes,
+requests of a tab handled by another process don't wait for its writes.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+import neo4j
+
+
+class BookmarkManagers:
+    """Thread-safe LRU map of scopes to bookmark managers."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = Lock()
+        self._managers = OrderedDict()
+
+    def get(self, scope) -> neo4j.api.BookmarkManager:
+        """Return the bookmark manager of scope, creating it if needed."""
+        with self._lock:
+            manager = self._managers.get(scope)
+            if manager is None:
+                manager = neo4j.GraphDatabase.bookmark_manager()
+                self._managers[scope] = manager
+                if len(self._managers) > self.size:
+                    self._managers.popitem(last=False)
+            else:
+                self._managers.move_to_end(scope)
+            return manager
@@ -0,0 +1,52 @@
+"""Process-wide cache of capability probes of each database.
+
+Probes like Neo4jConnection.has_nft_index() need additional queries (some
+even an additional session), although their results rarely change. So we
+remember them per database for config.capability_ttl seconds. Operations
+changing capabilities (e.g. /dev/reset) must call invalidate().
+"""
+
+import time
+from threading import Lock
+from typing import Callable
+
+from database.settings import config
+
+
+class CapabilityCache:
+    """Thread-safe map of (database key, capability) to probe results."""
+
+    def __init__(self):
+        self._lock = Lock()
+        # (database key, capability) -> (value, monotonic time of probe)
+        self._values = {}
+
+    def get(self, key, capability: str, probe: Callable[[], bool]) -> bool:
+        """Return the cached value of `capability` of database `key`, or
+        call probe and cache its result if there is no fresh value."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get((key, capability))
+        if cached and now - cached[1] < config.capability_ttl:
+            return cached[0]
+
+        # Probing happens outside the lock, like loading metamodels.
+        value = bool(probe())
+        with self._lock:
+            self._values[(key, capability)] = (value, now)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop values of database `key`, or all values if not given."""
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values = {
+                    cache_key: value
+                    for cache_key, value in self._values.items()
+                    if cache_key[0] != key
+                }
+
+
+capability_cache = CapabilityCache()
@@ -12,6 +12,7 @@ import neo4j.exceptions
 from database import mapper, id_handling
 from database.graph_database import GraphDatabase
 from database.id_handling import (
+    compute_semantic_id,
     extract_id_metatype,
     get_base_id,
     parse_db_id,
@@ -19,7 +20,11 @@ from database.id_handling import (
     parse_unknown_id,
 )
 from database.base_types import BaseNode, BaseRelation
-from database.mapper import python_value_to_cypher
+from database.generations import database_key, mark_written
+from database.parallax_cache import prefix_digest
+from database.query_templates import QueryTemplate, query_templates
+from database.registry import Registry
+from database.settings import config
 from database.utils import abort_with_json, map_dict_keys, dict_to_array
 
 
@@ -32,10 +37,229 @@ from database.utils import abort_with_json, map_dict_keys, dict_to_array
 FT_QUERY_MIN_SCORE = 0.1
 FT_SEARCH_MAX_RESULTS = 5000
 
+# labels of nodes whose changes affect the metamodel
+METAMODEL_LABELS = {
+    id_handling.GraphEditorLabel.MetaLabel.value,
+    id_handling.GraphEditorLabel.MetaProperty.value,
+    id_handling.GraphEditorLabel.MetaRelation.value,
+}
+
+# GraphEditor labels, which can be used in queries without escaping.
+GRAPHEDITOR_LABELS = {metatype.value for metatype in id_handling.GraphEditorLabel}
+
+# properties identifying nodes, see _get_nodes_by_unique_property
+UNIQUE_PROPERTIES = {"name__tech_", "_uuid__tech_"}
+
+# ======================= Query templates =================================
+# Hot queries are registered as fixed templates, see
+# database.query_templates.
+
+DELETE_NODES = query_templates.register(
+    "delete_nodes",
+    """MATCH (n) WHERE elementid(n) IN $raw_db_ids
+    CALL (n) { DETACH DELETE n }
+    RETURN COUNT(n) AS c""",
+)
+
+DELETE_RELATIONS = query_templates.register(
+    "delete_relations",
+    """MATCH ()-[r]->() WHERE elementid(r) IN $raw_db_ids
+    CALL (r) { DELETE r }
+    RETURN COUNT(r) AS c""",
+)
+
+# Filters of node relations. Empty maps and lists match everything.
+NODE_RELATIONS_FILTER = """all(key IN keys($relation_properties)
+            WHERE r[key] = $relation_properties[key])
+        AND all(key IN keys($neighbor_properties)
+                WHERE neighbor[key] = $neighbor_properties[key])
+        AND ($relation_type IS NULL OR type(r) = $relation_type)
+        AND all(label IN $neighbor_labels WHERE label IN labels(neighbor))"""
+
+
+def _parallax_filters(filters: dict | None) -> dict:
+    """Return parallax filters with defaults matching any node."""
+    filters = filters or {}
+    return {
+        "labels": filters.get("labels") or [],
+        "properties": filters.get("properties") or {},
+    }
+
+
+# Filters of parallax nodes in {nodes}; labels are ORed, properties ANDed.
+PARALLAX_FILTER = """(size({filters}.labels) = 0
+         OR any(label IN {filters}.labels WHERE label IN labels(n)))
+        AND all(key IN keys({filters}.properties)
+                WHERE {value} CONTAINS {expected})"""
+
+
+def _parallax_template(num_steps: int) -> QueryTemplate:
+    """Return the template of a parallax query with num_steps steps.
+
+    The nodes of each step ("frontier") stay on the server, neighbors are
+    deduplicated and filtered there. The result is a single row, which
+    also holds the element IDs of the initial nodes and of each step's
+    frontier ("frontiers") for memoization. Only the page of at most
+    $limit resulting nodes with element IDs greater than $after is
+    returned, ordered by element ID.
+    """
+    initial_filter = PARALLAX_FILTER.format(
+        filters="$filters",
+        value="toLower(n[key])",
+        expected="toLower($filters.properties[key])",
+    )
+    query = f"""
+    MATCH (n) WHERE elementid(n) IN $raw_db_ids AND {initial_filter}
+    WITH collect(n) AS frontier
+    WITH frontier, [[n IN frontier | elementid(n)]] AS frontiers"""
+    for step in range(num_steps):
+        step_param = f"$steps[{step}]"
+        step_filter = PARALLAX_FILTER.format(
+            filters=f"{step_param}.filters",
+            value="n[key]",
+            expected=f"{step_param}.filters.properties[key]",
+        )
+        query += f"""
+    CALL (frontier) {{
+        UNWIND frontier AS m
+        CALL (m) {{
+            MATCH (m)-[r]->(n) WHERE type(r) IN {step_param}.outgoing
+            RETURN n
+            UNION
+            MATCH (m)<-[r]-(n) WHERE type(r) IN {step_param}.incoming
+            RETURN n
+        }}
+        WITH DISTINCT n
+        WHERE {step_filter}
+        RETURN collect(n) AS next_frontier
+    }}
+    WITH next_frontier AS frontier,
+         frontiers + [[n IN next_frontier | elementid(n)]] AS frontiers"""
+    query += """
+    CALL (frontier) {
+        UNWIND frontier AS n
+        MATCH (n)<-[r]-()
+        WITH type(r) AS rel_type, count(*) AS num_relations
+        RETURN collect([rel_type, num_relations]) AS incoming
+    }
+    CALL (frontier) {
+        UNWIND frontier AS n
+        MATCH (n)-[r]->()
+        WITH type(r) AS rel_type, count(*) AS num_relations
+        RETURN collect([rel_type, num_relations]) AS outgoing
+    }
+    CALL (frontier) {
+        UNWIND frontier AS n
+        UNWIND keys(n) AS key
+        RETURN collect(DISTINCT key) AS properties
+    }
+    CALL (frontier) {
+        UNWIND frontier AS n
+        UNWIND labels(n) AS label
+        WITH label, count(*) AS num_nodes
+        RETURN collect([label, num_nodes]) AS label_counts
+    }
+    CALL (frontier) {
+        UNWIND frontier AS n
+        WITH n WHERE coalesce($limit, 1) > 0
+                     AND ($after IS NULL OR elementid(n) > $after)
+        ORDER BY elementid(n)
+        RETURN collect(n) AS page
+    }
+    RETURN page[..coalesce($limit, size(page))] AS nodes,
+           size(page) > coalesce($limit, size(page)) AS has_more,
+           size(frontier) AS node_count, frontiers, incoming, outgoing,
+           properties, label_counts"""
+    return query_templates.register(f"parallax.{num_steps}", query)
+
+
+def _node_relations_query(match_node: str) -> str:
+    """Return a query for relations of the nodes n matched by match_node,
+    in the directions enabled by $incoming and $outgoing. Each matched
+    node additionally yields a row with null direction, so that existing
+    nodes without relations can be told apart from missing nodes.
+    """
+    return f"""{match_node}
+    CALL (n) {{
+        WITH n WHERE $incoming
+        MATCH (neighbor)-[r]->(n)
+        WHERE {NODE_RELATIONS_FILTER}
+        RETURN r, neighbor, "incoming" AS direction
+        UNION ALL
+        WITH n WHERE $outgoing
+        MATCH (n)-[r]->(neighbor)
+        WHERE {NODE_RELATIONS_FILTER}
+        RETURN r, neighbor, "outgoing" AS direction
+        UNION ALL
+        RETURN null AS r, null AS neighbor, null AS direction
+    }}
+    RETURN r, neighbor, direction"""
+
+
+NODE_RELATIONS_BY_ID = query_templates.register(
+    "node_relations_by_id",
+    _node_relations_query("MATCH (n) WHERE elementid(n) = $nid"),
+)
+
+# Nodes with semantic IDs are matched by label and name, one template per
+# label (a finite set), so that label indexes can be used.
+NODE_RELATIONS_BY_NAME = {
+    metatype: query_templates.register(
+        f"node_relations_by_name.{metatype.value}",
+        _node_relations_query(
+            f"MATCH (n:{metatype.value}) WHERE n.name__tech_ = $name"
+        ),
+    )
+    for metatype in id_handling.GraphEditorLabel
+}
+
+# Map semantic IDs to element IDs. Each label has its own branch, so that
+# the indexes of database.schema can be used. As before, only meta nodes
+# (MetaLabel etc.) are found.
+SEMANTIC_IDS_TO_RAW_DB_IDS = query_templates.register(
+    "semantic_ids_to_raw_db_ids",
+    "\n    UNION ALL\n".join(
+        f"""MATCH (n:{metatype.value})
+    WHERE n.name__tech_ IN $names_{metatype.name}
+          AND n:MetaRelation__tech_|MetaLabel__tech_|MetaProperty__tech_
+    RETURN "{metatype.value}" AS label, n.name__tech_ AS name,
+           elementid(n) AS raw_db_id"""
+        for metatype in id_handling.GraphEditorLabel
+    ),
+)
+
+
 class CypherDatabase(GraphDatabase):
+    """Per-request facade of the graph database, stored in g.graph_db.
+
+    Shared state is only accessed via `registry`.
+    """
+
+    def __init__(self, registry: Registry):
+        self.registry = registry
+
     def _run(self, *args, **kwargs):
         return g.conn.run(*args, **kwargs)
 
+    def _run_template(self, template: QueryTemplate, **params) -> list:
+        """Run a registered query template and return all its records."""
+        return self.registry.queries.run(g.conn, template, **params)
+
+    def has_capability(self, probe: str) -> bool:
+        """Return the cached result of probe (e.g. "has_nft_index") of
+        the current connection, see database.capabilities."""
+        return self.registry.capabilities.get(
+            database_key(g.conn), probe, getattr(g.conn, probe)
+        )
+
+    def ensure_schema(self):
+        """Create indexes of the current database if needed, see
+        database.schema."""
+        if config.ensure_indexes:
+            self.registry.schema.ensure(
+                database_key(g.conn), g.conn.run_schema, g.conn.username
+            )
+
     # ======================= Node related ====================================
     def create_nodes(self, node_data_list: list[dict]) -> dict[str, BaseNode]:
         """Create multiple nodes at once.
@@ -58,6 +282,10 @@ class CypherDatabase(GraphDatabase):
             updated_properties.update({'_uuid__tech_': str(uuid4())})
             node_data['properties'] = updated_properties
 
+        mark_written(meta=any(
+            METAMODEL_LABELS.intersection(node_data.get("labels", []))
+            for node_data in node_data_list
+        ))
         query_text = """
         UNWIND $node_data_list AS node_data
         CALL apoc.create.node(node_data['labels'], node_data['properties'])
@@ -233,27 +461,44 @@ class CypherDatabase(GraphDatabase):
             WHERE n[pname] CONTAINS $property_filters[pname])
         """ if property_filters else ""
 
-        query_text = f"""
-        MATCH (n)
-        WHERE n[$prop_name] IN $prop_values
-        {label_filters_expression}
-        {property_filter_expr}
-        RETURN n, n[$prop_name] as result
-        """
-
-        query_result = self._run(
-            query_text,
-            prop_name=prop_name,
-            prop_values=prop_values,
-            label_filters=label_filters,
-            property_filters=property_filters
-        )
-        fetched_nodes = dict()
-        for row in query_result:
-            n = BaseNode.from_neo_node(row["n"])
-            if n:
-                fetched_nodes[row["result"]] = n
-
+        # Static labels and property keys let the planner use the indexes
+        # of database.schema.
+        if prop_name not in UNIQUE_PROPERTIES:
+            raise ValueError(f"{prop_name} is not a unique property.")
+        if prop_name == "_uuid__tech_":
+            match_labels = ":___tech_"
+        elif label_filters and set(label_filters) <= GRAPHEDITOR_LABELS:
+            match_labels = ":" + "|".join(label_filters)
+        else:
+            match_labels = ""
+
+        def fetch(match_labels, prop_values):
+            query_text = f"""
+            MATCH (n{match_labels})
+            WHERE n.{prop_name} IN $prop_values
+            {label_filters_expression}
+            {property_filter_expr}
+            RETURN n, n.{prop_name} as result
+            """
+            query_result = self._run(
+                query_text,
+                prop_values=prop_values,
+                label_filters=label_filters,
+                property_filters=property_filters
+            )
+            fetched_nodes = dict()
+            for row in query_result:
+                n = BaseNode.from_neo_node(row["n"])
+                if n:
+                    fetched_nodes[row["result"]] = n
+            return fetched_nodes
+
+        fetched_nodes = fetch(match_labels, prop_values)
+        # Nodes get ___tech_ from a trigger, which may not be installed,
+        # so nodes without it are looked up without the index.
+        missing = [value for value in prop_values if value not in fetched_nodes]
+        if prop_name == "_uuid__tech_" and missing:
+            fetched_nodes.update(fetch("", missing))
         return fetched_nodes
 
 
@@ -262,27 +507,43 @@ class CypherDatabase(GraphDatabase):
 
         If the ID is not in the database (e.g. it's a system::... ID),
         the entry is simply omitted from the resulting map.
+
+        In read-only requests, IDs of meta nodes are taken from the
+        metamodel snapshot of the request, only unknown IDs are looked up
+        in the database. Requests that may write use the IDs for
+        mutations, so they always look them up: the snapshot may be older
+        than writes of other processes or of the request itself.
         """
-        ids_parts_map = {id: id_handling.semantic_id_parts(id) for id in ids}
-        parts_list = []
-        for semantic_id, parts in ids_parts_map.items():
-            parts["original_id"] = semantic_id
-            parts["label"] = parts["label"].value
-            parts_list.append(parts)
-
-        query_str = """UNWIND $parts_list AS map
-        WITH map, map['label'] AS label,
-             map['name'] AS name,
-             map['original_id'] AS original_id
-        MATCH (n:MetaRelation__tech_|MetaLabel__tech_|MetaProperty__tech_)
-        WHERE n.name__tech_=name AND label in labels(n)
-        RETURN original_id, elementid(n) AS raw_db_id
-        """
-        current_app.logger.debug(query_str)
-        query_result = self._run(query_str, parts_list=parts_list)
-        result = {}
-        for row in query_result:
-            result[row["original_id"]] = row["raw_db_id"]
+        known = {}
+        if (
+            "metamodel" in g
+            and g.get("read_only")
+            and not g.get("graph_written")
+        ):
+            known = g.metamodel.raw_db_ids
+        result = {
+            semantic_id: known[semantic_id]
+            for semantic_id in ids if semantic_id in known
+        }
+        ids = [semantic_id for semantic_id in ids if semantic_id not in known]
+        if not ids:
+            return result
+        names = {metatype: [] for metatype in id_handling.GraphEditorLabel}
+        for semantic_id in ids:
+            parts = id_handling.semantic_id_parts(semantic_id)
+            names[parts["label"]].append(parts["name"])
+        query_result = self._run_template(
+            SEMANTIC_IDS_TO_RAW_DB_IDS,
+            **{f"names_{metatype.name}": names[metatype] for metatype in names},
+        )
+        raw_db_ids = {
+            (row["label"], row["name"]): row["raw_db_id"] for row in query_result
+        }
+        for semantic_id in ids:
+            parts = id_handling.semantic_id_parts(semantic_id)
+            raw_db_id = raw_db_ids.get((parts["label"].value, parts["name"]))
+            if raw_db_id:
+                result[semantic_id] = raw_db_id
         return result
 
     def ids_to_raw_db_ids(self, ids):
@@ -326,6 +587,10 @@ class CypherDatabase(GraphDatabase):
             node_data["properties"]
         )
 
+        mark_written(meta=bool(
+            METAMODEL_LABELS.intersection(old_labels)
+            or METAMODEL_LABELS.intersection(new_labels)
+        ))
         result = self._run(
             f"""MATCH (n) WHERE elementid(n)=$nid
                 SET n=$properties
@@ -379,6 +644,10 @@ class CypherDatabase(GraphDatabase):
                 if get_base_id(k) != "_uuid__tech_"
             }
 
+        mark_written(meta=bool(
+            METAMODEL_LABELS.intersection(existing_node.labels)
+            or METAMODEL_LABELS.intersection(node_data.get("labels", []))
+        ))
         if properties:
             result = self._run(
                 f"""MATCH (n) WHERE elementid(n)=$nid
@@ -409,151 +678,80 @@ class CypherDatabase(GraphDatabase):
         if not raw_db_ids:
             return None
 
-        result = self._run(
-            f"""MATCH (n) WHERE elementid(n) IN {raw_db_ids}
-            CALL (n) {{ DETACH DELETE n }}
-            RETURN COUNT(n) AS c"""
-        )
-        return result.single()["c"]
+        # we don't know the labels of deleted nodes, so assume the worst.
+        mark_written(meta=True)
+        records = self._run_template(DELETE_NODES, raw_db_ids=raw_db_ids)
+        return records[0]["c"]
 
     @staticmethod
-    def _get_node_relations_filter_expressions(filters):
-        rel_props_expr = ""
-        neighbor_props_expr = ""
-        where_clauses = ""
-
-        if rel_props := filters.get("relation_properties"):
-            rel_props_expr = " " + python_value_to_cypher(
-                map_dict_keys(rel_props, get_base_id)
-            )
-
-        if n_props := filters.get("neighbor_properties"):
-            neighbor_props_expr = " " + python_value_to_cypher(
-                map_dict_keys(n_props, get_base_id)
-            )
-
-        if rel_type := filters.get("relation_type", ""):
-            where_clauses += (
-                " AND " + f" type(r) = '{id_handling.get_base_id(rel_type)}' "
-            )
-
-        if n_labels := filters.get("neighbor_labels", ""):
-            where_clauses += (
-                " AND "
-                + f""" ALL(label IN {[id_handling.get_base_id(l)
-                                          for l in n_labels]}
-                       WHERE label IN labels(neighbor))"""
-            )
-
+    def _node_relations_filter_params(filters: dict) -> dict:
+        """Return parameters of the node relations templates for filters."""
         return {
-            "relation_properties": rel_props_expr,
-            "neighbor_properties": neighbor_props_expr,
-            "where_clauses": where_clauses,
+            "relation_properties": map_dict_keys(
+                filters.get("relation_properties") or {}, get_base_id
+            ),
+            "neighbor_properties": map_dict_keys(
+                filters.get("neighbor_properties") or {}, get_base_id
+            ),
+            "relation_type": (
+                get_base_id(filters["relation_type"])
+                if filters.get("relation_type")
+                else None
+            ),
+            "neighbor_labels": [
+                get_base_id(label)
+                for label in filters.get("neighbor_labels") or []
+            ],
         }
 
-    def _get_node_relations_by_raw_db_id(self, raw_db_id, filters):
-        """Get node relations from node with internal db_id."""
-
-        incoming_with_source = []
-        outgoing_with_target = []
+    def _get_node_relations(self, template: QueryTemplate, filters: dict,
+                            **params) -> tuple[bool, list[dict]]:
+        """Run a node relations template and return if the node exists,
+        and its relations with neighbors in the directions requested by
+        filters (incoming first)."""
         direction = filters["direction"]
-        exprs = self._get_node_relations_filter_expressions(filters)
-
-        if direction in {"both", "incoming"}:
-            neighbor_props = exprs.get("neighbor_properties")
-            rel_props = exprs.get("relation_properties")
-            where_clauses = exprs.get("where_clauses")
-            incoming_res = self._run(
-                f"MATCH (neighbor{neighbor_props})-[r{rel_props}]->(n)"
-                f" WHERE elementid(n)=$nid {where_clauses} "
-                "RETURN r, neighbor",
-                nid=raw_db_id,
-            )
-            incoming_with_source = [
-                {
-                    "relation": BaseRelation.from_neo_relation(row["r"]),
-                    "neighbor": BaseNode.from_neo_node(row["neighbor"]),
-                    "direction": "incoming",
-                }
-                for row in incoming_res
-            ]
-
-        if direction in {"both", "outgoing"}:
-            neighbor_props = exprs.get("neighbor_properties")
-            rel_props = exprs.get("relation_properties")
-            where_clauses = exprs.get("where_clauses")
-            outgoing_res = self._run(
-                f"MATCH (n)-[r{rel_props}]->(neighbor{neighbor_props}) "
-                f"WHERE elementid(n)=$nid {where_clauses} "
-                "RETURN r, neighbor",
-                nid=raw_db_id,
-            )
-            outgoing_with_target = [
-                {
-                    "relation": BaseRelation.from_neo_relation(row["r"]),
-                    "neighbor": BaseNode.from_neo_node(row["neighbor"]),
-                    "direction": "outgoing",
-                }
-                for row in outgoing_res
-            ]
-        return incoming_with_source + outgoing_with_target
+        params.update(self._node_relations_filter_params(filters))
+        records = self._run_template(
+            template,
+            incoming=direction in {"both", "incoming"},
+            outgoing=direction in {"both", "outgoing"},
+            **params,
+        )
+        relations_with_neighbors = {"incoming": [], "outgoing": []}
+        for row in records:
+            if row["direction"] is None:
+                continue
+            relations_with_neighbors[row["direction"]].append({
+                "relation": BaseRelation.from_neo_relation(row["r"]),
+                "neighbor": BaseNode.from_neo_node(row["neighbor"]),
+                "direction": row["direction"],
+            })
+        return bool(records), (
+            relations_with_neighbors["incoming"]
+            + relations_with_neighbors["outgoing"]
+        )
+
+    def _get_node_relations_by_raw_db_id(self, raw_db_id, filters):
+        """Get node relations from node with internal db_id, or None if the
+        node doesn't exist."""
+        exists, rels = self._get_node_relations(
+            NODE_RELATIONS_BY_ID, filters, nid=raw_db_id
+        )
+        return rels if exists else None
 
     def _get_node_relations_by_semantic_id(self, semantic_id:str, filters:dict) -> list[dict]:
         """Get node relations from node with semantic_id.
         Return None if invalid."""
-        incoming_with_source = []
-        outgoing_with_target = []
-        direction = filters["direction"]
         metatype = extract_id_metatype(semantic_id)
         base_id = id_handling.get_base_id(semantic_id)
 
         if not metatype or not base_id:
             return None
 
-        node_filter = ":" + metatype.value
-
-        exprs = self._get_node_relations_filter_expressions(filters)
-
-        if direction in {"both", "incoming"}:
-            neighbor_props = exprs.get("neighbor_properties")
-            rel_props = exprs.get("relation_properties")
-            where_clauses = exprs.get("where_clauses")
-            incoming_res = self._run(
-                # pylint: disable=line-too-long
-                f"""
-                MATCH (neighbor{neighbor_props})-[r{rel_props}]->(n{node_filter})
-                WHERE n.name__tech_=$name {where_clauses}
-                RETURN r, neighbor""",
-                name=base_id,
-            )
-            incoming_with_source = [
-                {
-                    "relation": BaseRelation.from_neo_relation(row["r"]),
-                    "neighbor": BaseNode.from_neo_node(row["neighbor"]),
-                    "direction": "incoming",
-                }
-                for row in incoming_res
-            ]
-
-        if direction in {"both", "outgoing"}:
-            neighbor_props = exprs.get("neighbor_properties")
-            rel_props = exprs.get("relation_properties")
-            # pylint: disable=line-too-long
-            outgoing_res = self._run(
-                f"""MATCH (n{node_filter})-[r{rel_props}]->(neighbor{neighbor_props})
-                WHERE n.name__tech_=$name {exprs.get('where_clauses')}
-                RETURN r, neighbor""",
-                name=base_id,
-            )
-            outgoing_with_target = [
-                {
-                    "relation": BaseRelation.from_neo_relation(row["r"]),
-                    "neighbor": BaseNode.from_neo_node(row["neighbor"]),
-                    "direction": "outgoing",
-                }
-                for row in outgoing_res
-            ]
-        return incoming_with_source + outgoing_with_target
+        _, rels = self._get_node_relations(
+            NODE_RELATIONS_BY_NAME[metatype], filters, name=base_id
+        )
+        return rels
 
     def get_node_relations(self, nid: str, filters: dict) -> list[dict]:
         """Return all relations that have node with ID 'nid' as source
@@ -566,15 +764,7 @@ class CypherDatabase(GraphDatabase):
         raw_db_id = parse_db_id(nid)
 
         if raw_db_id:
-            rels = self._get_node_relations_by_raw_db_id(raw_db_id, filters)
-            if not rels:
-                # We have to distinguish if nothing was returned
-                # because there are no relations (which should end in
-                # a 200 response) or the db_id doesn't exist in the
-                # database (404).
-                if not self._get_node_by_raw_db_id(raw_db_id):
-                    return None
-            return rels
+            return self._get_node_relations_by_raw_db_id(raw_db_id, filters)
 
         # if nid was not of kind id::, treat it as an semantic id
         return self._get_node_relations_by_semantic_id(nid, filters)
@@ -669,23 +859,12 @@ class CypherDatabase(GraphDatabase):
         property_filters = neighbors_filters.get('properties', None) if neighbors_filters else None
         label_filters = neighbors_filters.get('labels', None) if neighbors_filters else None
 
-        if direction in ["both", "outgoing"]:
-            query_str = self._neighbors_query_string(relation_types, "outgoing", neighbors_filters)
-            res = g.conn.run(query_str,
-                             id_pairs=id_pairs,
-                             relation_types=relation_types,
-                             label_filters=label_filters,
-                             property_filters=property_filters)
-
-            for row in res:
-                node = BaseNode.from_neo_node(row["n"])
-                oid = row["original_id"]
-                if oid in result:
-                    result[oid][node.id] = node
-                else:
-                    result[oid] = {node.id: node}
-        else:
-            query_str = self._neighbors_query_string(relation_types, "incoming", neighbors_filters)
+        for query_direction in ("outgoing", "incoming"):
+            if direction not in ("both", query_direction):
+                continue
+            query_str = self._neighbors_query_string(
+                relation_types, query_direction, neighbors_filters
+            )
             res = g.conn.run(query_str,
                              id_pairs=id_pairs,
                              relation_types=relation_types,
@@ -701,28 +880,112 @@ class CypherDatabase(GraphDatabase):
                     result[oid] = {node.id: node}
         return result
 
-    def incoming_relation_types(self, node_ids):
-        query_text = """
-        MATCH (a)-[r]->(b)
-        WHERE elementid(b) IN $node_ids
-        RETURN type(r) AS rel_type, count(a) AS num_neighbors
+    def parallax(self, ids: list[str], filters: dict | None,
+                 steps: list[dict], after: str | None = None,
+                 limit: int | None = None) -> dict:
+        """Run a whole parallax query in a single database query.
+
+        Start with the nodes with the given IDs matching filters (see
+        get_nodes_by_ids), then follow each step. A step is a dict with
+        lists of relation types to follow ("incoming", "outgoing") and
+        optional "filters" for the neighbors found, which become the
+        next step's nodes (case sensitive property filters, see
+        get_nodes_neighbors).
+
+        Frontiers of step prefixes are memoized (see
+        database.parallax_cache), so extending a parallax chain only runs
+        the new steps.
+
+        The resulting nodes are paged by element ID: only nodes after the
+        cursor `after` are returned, at most `limit` of them (all if None,
+        none if 0).
+
+        Return a dict with
+        - "nodes": map of IDs to the resulting nodes of the page. Without
+          steps, the given IDs are kept, otherwise they are
+          "id::<element ID>".
+        - "next_cursor": cursor of the next page, None for the last page,
+        - "node_count": number of all resulting nodes,
+        - "label_counts": map of labels to the number of resulting nodes
+          having them,
+        - "incoming"/"outgoing": map of relation types of the resulting
+          nodes to the number of such relations,
+        - "properties"/"labels": sorted property names/labels of the
+          resulting nodes.
         """
-        result = self._run(query_text, node_ids=node_ids)
-        return {
-            row['rel_type']: row['num_neighbors']
-            for row in result
-        }
+        filters = _parallax_filters(filters)
+        steps = [
+            {
+                "incoming": step.get("incoming", []),
+                "outgoing": step.get("outgoing", []),
+                "filters": _parallax_filters(step.get("filters")),
+            }
+            for step in steps
+        ]
+        db_key = database_key(g.conn)
+        generation = self.registry.write_generations.get(db_key)
+
+        def cache_key(num_steps):
+            # users may be denied to traverse some relations, so they
+            # never share frontiers.
+            return (
+                db_key,
+                g.conn.username,
+                generation,
+                prefix_digest(ids, filters, steps[:num_steps]),
+            )
 
-    def outgoing_relation_types(self, node_ids):
-        query_text = """
-        MATCH (a)-[r]->(b)
-        WHERE elementid(a) IN $node_ids
-        RETURN type(r) AS rel_type, count(b) AS num_neighbors
-        """
-        result = self._run(query_text, node_ids=node_ids)
+        # Start from the longest memoized prefix. Without steps, we need
+        # the mapping of the given IDs anyway, so there's nothing to gain.
+        cached_steps, frontier = 0, None
+        if steps:
+            for num_steps in range(len(steps), -1, -1):
+                frontier = self.registry.parallax.get(cache_key(num_steps))
+                if frontier is not None:
+                    cached_steps = num_steps
+                    break
+        if frontier is None:
+            raw_db_id_to_input_id = {
+                raw_db_id: nid
+                for nid, raw_db_id in self.ids_to_raw_db_ids(ids).items()
+            }
+            start_ids, start_filters = list(raw_db_id_to_input_id), filters
+        else:
+            start_ids, start_filters = list(frontier), _parallax_filters(None)
+        record = self._run_template(
+            _parallax_template(len(steps) - cached_steps),
+            raw_db_ids=start_ids,
+            filters=start_filters,
+            steps=steps[cached_steps:],
+            after=after,
+            limit=limit,
+        )[0]
+        for offset, step_frontier in enumerate(record["frontiers"]):
+            if frontier is None or offset > 0:
+                self.registry.parallax.put(
+                    cache_key(cached_steps + offset), step_frontier
+                )
+        nodes = {}
+        for neo_node in record["nodes"]:
+            node = BaseNode.from_neo_node(neo_node)
+            if steps:
+                nodes[f"id::{node.id}"] = node
+            else:
+                nodes[raw_db_id_to_input_id[node.id]] = node
+        label_counts = dict(record["label_counts"])
         return {
-            row['rel_type']: row['num_neighbors']
-            for row in result
+            "nodes": nodes,
+            "next_cursor": (
+                record["nodes"][-1].element_id
+                if record["has_more"] and record["nodes"]
+                else None
+            ),
+            "node_count": record["node_count"],
+            "label_counts": label_counts,
+            "incoming": dict(record["incoming"]),
+            "outgoing": dict(record["outgoing"]),
+            "properties": sorted(record["properties"]),
+            "labels": sorted(label_counts),
         }
 
     def _property_search_query_str(self, var_name:str="n"):
@@ -804,7 +1067,7 @@ class CypherDatabase(GraphDatabase):
         # We only execute an nft search when text is provided. Otherwise we
         # still allow empty queries to return everything and filter them with
         # labels.
-        if g.conn.has_nft_index() and text:
+        if text and self.has_capability("has_nft_index"):
             # For simple queries (e.g. without boolean operators) we want to
             # have the same search results, regardless of the database having
             # nft or not. So we append an wildcard to text.  Unfortunately
@@ -913,6 +1176,7 @@ class CypherDatabase(GraphDatabase):
         else:
             properties = existing_relation.properties
 
+        mark_written()
         if (
             "type" in relation_data
             and relation_data["type"] != existing_relation.type
@@ -988,6 +1252,7 @@ class CypherDatabase(GraphDatabase):
         RETURN r, elementid(r) as rid
         """
         new_rels = {}
+        mark_written()
         try:
             query_result = self._run(
                 query_text,
@@ -1018,14 +1283,9 @@ class CypherDatabase(GraphDatabase):
         if not raw_db_ids:
             return None
 
-        result = self._run(
-            f"""MATCH ()-[r]->() WHERE elementid(r) IN {raw_db_ids}
-                CALL (r) {{
-                  DELETE r
-                }}
-                RETURN COUNT(r) AS c"""
-        )
-        return result.single()["c"]
+        mark_written()
+        records = self._run_template(DELETE_RELATIONS, raw_db_ids=raw_db_ids)
+        return records[0]["c"]
 
     def query_relations(self, text: str) -> list[BaseRelation]:
         """Return relations which contain text.
@@ -1104,6 +1364,7 @@ class CypherDatabase(GraphDatabase):
         corresponding positions.
         """
 
+        mark_written()
         create_query = """CREATE (p: Perspective__tech_)
                           SET p.name__tech_ = $name,
                               p.description__tech_ = $description
@@ -1195,6 +1456,7 @@ class CypherDatabase(GraphDatabase):
         ones.
         """
         raw_db_id = parse_db_id(pid)
+        mark_written()
         query = """
         MATCH (p)-[pos:pos__tech_]->()
         WHERE elementid(p) = $raw_db_id
@@ -1270,35 +1532,48 @@ class CypherDatabase(GraphDatabase):
 
 
     # ---------------------- General information ------------------------------
-    def _get_metaobjects(self, metalabel):
-        """Get all elements with the given 'metalabel' (MetaLabel, MetaProperty
-        etc.)"""
-        query = f"""MATCH (def: {metalabel})
-                    RETURN def.name__tech_ AS def_name"""
-        query_result = self._run(query)
-        result = {r["def_name"] for r in query_result}
-        return result
-
-    def _get_metalabels(self):
-        g.modelled_labels = self._get_metaobjects("MetaLabel__tech_")
-        return g.modelled_labels
-
-    def _get_metaproperties(self):
-        g.modelled_properties = self._get_metaobjects("MetaProperty__tech_")
-        return g.modelled_properties
-
-    def _get_metarelations(self):
-        g.modelled_relation_types = self._get_metaobjects("MetaRelation__tech_")
-        return g.modelled_relation_types
+    def _fetch_metamodel(self):
+        """Get names and element IDs of all MetaLabel, MetaProperty and
+        MetaRelation nodes in a single query."""
+        query = """MATCH (def:MetaLabel__tech_|MetaProperty__tech_|MetaRelation__tech_)
+                   RETURN labels(def) AS def_labels, def.name__tech_ AS def_name,
+                          elementid(def) AS raw_db_id"""
+        metamodel = {
+            "labels": set(),
+            "properties": set(),
+            "relation_types": set(),
+            "raw_db_ids": {},
+        }
+        kinds = {
+            id_handling.GraphEditorLabel.MetaLabel: "labels",
+            id_handling.GraphEditorLabel.MetaProperty: "properties",
+            id_handling.GraphEditorLabel.MetaRelation: "relation_types",
+        }
+        for row in self._run(query):
+            for metatype, kind in kinds.items():
+                if metatype.value in row["def_labels"]:
+                    metamodel[kind].add(row["def_name"])
+                    semantic_id = compute_semantic_id(row["def_name"], metatype)
+                    metamodel["raw_db_ids"][semantic_id] = row["raw_db_id"]
+        return metamodel
 
     def load_metamodels(self):
         """Load metamodels and set corresponding "globals".
 
-        This is needed in order to correctly build semantic ids.
+        This is needed in order to correctly build semantic ids. The
+        metamodel is shared between requests (see database.metamodel_cache)
+        and only fetched from the database if it may have changed.
         """
-        self._get_metalabels()
-        self._get_metaproperties()
-        self._get_metarelations()
+        key = database_key(g.conn)
+        snapshot = self.registry.metamodel_cache.get(
+            key,
+            self.registry.write_generations.get_meta(key),
+            self._fetch_metamodel,
+        )
+        g.metamodel = snapshot
+        g.modelled_labels = snapshot.labels
+        g.modelled_properties = snapshot.properties
+        g.modelled_relation_types = snapshot.relation_types
 
     def get_all_labels(self, nids: list[str] | None = None) -> list[str]:
         """Return all labels available in graph.
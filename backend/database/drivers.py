@@ -0,0 +1,196 @@
+"""Bounded registry of Neo4j drivers.
+
+Each driver holds a connection pool, so there is one driver per host and
+credentials, shared by all requests using them. The registry keeps at most
+config.driver_cache_size drivers and closes the least recently used one
+when it is full. A driver failing config.driver_failure_threshold times in
+a row (e.g. SessionExpired) is replaced as well, so that the next request
+gets a new one. Requests lease the drivers they use (see acquire()), and
+a replaced driver is only closed once no request uses it anymore.
+
+For observability, the registry records how long requests waited for a
+connection of each driver, see /api/v1/info/drivers.
+"""
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+
+import neo4j
+
+from database.settings import config
+
+
+def driver_key(host: str, username: str, password: str) -> tuple:
+    """Key of the driver for the given credentials. The password is only
+    kept as a digest."""
+    return (host, username, hashlib.sha256(password.encode()).hexdigest())
+
+
+@dataclass
+class DriverEntry:
+    driver: neo4j.Driver
+    leases: int = 0
+    failures: int = 0
+    acquisitions: int = 0
+    acquisition_seconds: float = 0.0
+    max_acquisition_seconds: float = 0.0
+
+
+class DriverRegistry:
+    """Thread-safe LRU map of driver keys to drivers."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        # id of driver -> leased entries no longer in _entries
+        self._retired = {}
+
+    def get(self, host: str, username: str, password: str) -> neo4j.Driver:
+        """Return the driver for the given credentials, creating it if
+        needed. The driver may be closed any time, use acquire() for
+        running queries."""
+        return self._get(host, username, password, lease=False)
+
+    def acquire(self, host: str, username: str, password: str) -> neo4j.Driver:
+        """Like get(), but lease the driver until release() is called, so
+        that it isn't closed while in use."""
+        return self._get(host, username, password, lease=True)
+
+    def _get(self, host, username, password, lease) -> neo4j.Driver:
+        key = driver_key(host, username, password)
+        unused = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = DriverEntry(
+                    neo4j.GraphDatabase.driver(
+                        host,
+                        auth=(username, password),
+                        max_connection_pool_size=config.max_connection_pool_size,
+                        connection_acquisition_timeout=(
+                            config.connection_acquisition_timeout
+                        ),
+                    )
+                )
+                self._entries[key] = entry
+                if len(self._entries) > self.size:
+                    _, evicted = self._entries.popitem(last=False)
+                    unused = self._retire(evicted)
+            else:
+                self._entries.move_to_end(key)
+            if lease:
+                entry.leases += 1
+        for driver in unused:
+            driver.close()
+        return entry.driver
+
+    def _retire(self, entry: DriverEntry) -> list[neo4j.Driver]:
+        """Handle an entry removed from _entries. Return its driver if it
+        can be closed now. Must be called with the lock held."""
+        if entry.leases:
+            self._retired[id(entry.driver)] = entry
+            return []
+        return [entry.driver]
+
+    def release(self, driver: neo4j.Driver):
+        """End a lease of driver, see acquire(). A replaced driver is
+        closed with its last lease."""
+        unused = None
+        with self._lock:
+            entry = self._retired.get(id(driver))
+            if entry is None:
+                entry = next(
+                    (e for e in self._entries.values() if e.driver is driver),
+                    None,
+                )
+                if entry:
+                    entry.leases -= 1
+            else:
+                entry.leases -= 1
+                if not entry.leases:
+                    del self._retired[id(driver)]
+                    unused = driver
+        if unused:
+            unused.close()
+
+    def record_acquisition(self, key: tuple, seconds: float):
+        """Record that a request waited `seconds` for a connection."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.acquisitions += 1
+                entry.acquisition_seconds += seconds
+                entry.max_acquisition_seconds = max(
+                    entry.max_acquisition_seconds, seconds
+                )
+
+    def record_success(self, key: tuple):
+        """Reset the failure count of the driver of key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.failures = 0
+
+    def record_failure(self, key: tuple):
+        """Count a connectivity failure of the driver of key. After too
+        many failures in a row, the driver is replaced by a new one."""
+        unused = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.failures += 1
+                if entry.failures >= config.driver_failure_threshold:
+                    unused = self._retire(self._entries.pop(key))
+        for driver in unused:
+            driver.close()
+
+    def stats(self) -> list[dict]:
+        """Return pool statistics of each driver."""
+        with self._lock:
+            entries = [(key[0], entry) for key, entry in self._entries.items()]
+        stats = []
+        for host, entry in entries:
+            pool_size, in_use = _pool_usage(entry.driver)
+            stats.append({
+                "host": host,
+                "pool_size": pool_size,
+                "in_use": in_use,
+                "max_pool_size": config.max_connection_pool_size,
+                "acquisitions": entry.acquisitions,
+                "mean_acquisition_seconds": (
+                    entry.acquisition_seconds / entry.acquisitions
+                    if entry.acquisitions
+                    else 0.0
+                ),
+                "max_acquisition_seconds": entry.max_acquisition_seconds,
+                "failures": entry.failures,
+            })
+        return stats
+
+
+def _pool_usage(driver: neo4j.Driver) -> tuple[int, int]:
+    """Return number of open and used connections of driver.
+
+    The driver has no public API for this, so we look into its pool
+    (driver._pool.connections, mapping addresses to connections with an
+    in_use flag, as of neo4j 5.28, see requirements.txt). If these
+    internals change, zeros are reported instead of failing.
+    """
+    try:
+        pool_connections = getattr(getattr(driver, "_pool", None), "connections", None)
+        if not pool_connections:
+            return 0, 0
+        connections = [
+            connection
+            for address_connections in list(pool_connections.values())
+            for connection in list(address_connections)
+        ]
+        in_use = sum(
+            bool(getattr(connection, "in_use", False)) for connection in connections
+        )
+    except (AttributeError, TypeError, RuntimeError):
+        return 0, 0
+    return len(connections), in_use
@@ -0,0 +1,73 @@
+"""Write generations of the databases we are connected to.
+
+Caches holding data derived from the graph (e.g. the metamodel) remember
+the generation they were computed in. Our own write paths mark the
+request as "written" via mark_written(), and once the corresponding
+transaction is committed, the generation of that database is bumped. Any
+cache computed in an older generation is then considered stale.
+
+Writes done outside of this process (Neo4j browser, other workers) are
+not seen here, so caches should additionally expire after some time.
+"""
+
+from threading import Lock
+from flask import g
+
+
+class WriteGenerations:
+    """Thread-safe counters of committed writes, keyed by database."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._data_generations = {}
+        self._meta_generations = {}
+
+    def get(self, key) -> int:
+        """Return generation of any write done to database `key`."""
+        with self._lock:
+            return self._data_generations.get(key, 0)
+
+    def get_meta(self, key) -> int:
+        """Return generation of writes to the metamodel of database `key`."""
+        with self._lock:
+            return self._meta_generations.get(key, 0)
+
+    def bump(self, key, meta=False):
+        """Record a committed write. If `meta` is set, the write may
+        have changed the metamodel (MetaLabel, MetaProperty etc.)."""
+        with self._lock:
+            self._data_generations[key] = self._data_generations.get(key, 0) + 1
+            if meta:
+                self._meta_generations[key] = (
+                    self._meta_generations.get(key, 0) + 1
+                )
+
+
+write_generations = WriteGenerations()
+
+
+def database_key(conn) -> tuple[str, str]:
+    """Key identifying the database a connection works on."""
+    return (conn.host, conn.database or "")
+
+
+def mark_written(meta=False):
+    """Mark the current transaction as modifying the graph.
+
+    Set `meta` if the metamodel may have been changed. When in doubt, set
+    it, since a spurious reload is cheaper than a stale metamodel.
+    """
+    g.graph_written = True
+    if meta:
+        g.metamodel_written = True
+
+
+def commit_written(conn):
+    """Bump the generation of conn's database if the transaction just
+    committed was marked as written."""
+    if getattr(g, "graph_written", False):
+        write_generations.bump(
+            database_key(conn), meta=getattr(g, "metamodel_written", False)
+        )
+    g.graph_written = False
+    g.metamodel_written = False
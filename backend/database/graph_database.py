@@ -104,6 +104,15 @@ class GraphDatabase(ABC):
         """
         pass
 
+    @abstractmethod
+    def parallax(self, ids, filters, steps, after=None, limit=None):
+        """Return the nodes reached from the nodes with the given IDs
+        (matching filters) by following steps, with the relation types,
+        properties and labels of the resulting nodes. Nodes are paged
+        with the cursor `after` and `limit`.
+        """
+        pass
+
     @abstractmethod
     def get_nodes_neighbors(self, id_map, relation_types, direction, neighbors_filters=None):
         """Return all neighbors from nodes in id_map.
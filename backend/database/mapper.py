@@ -5,10 +5,13 @@ GraphEditor and vice-versa
 import copy
 from dataclasses import dataclass
 from typing import Optional
-from flask import current_app
+from flask import g
 import neo4j
 
-from blueprints.display.style_support import apply_style_rules
+from blueprints.display.style_support import (
+    apply_style_rules,
+    apply_style_rules_batch,
+)
 from database.utils import find_a_value
 from database.settings import config
 from database.id_handling import (
@@ -89,12 +92,11 @@ class GraphEditorNode(GraphEditorElement):
     _grapheditor_type: str = "node" # TODO remove this from datatype
 
     @classmethod
-    def from_base_node(cls, base_node: BaseNode):
-        # base_node may contain style information like x, y position
-        # from perspectives.
-        prev_style = copy.copy(base_node.style)
-        apply_style_rules(base_node)
-        base_node.style.update(prev_style)
+    def from_base_node(cls, base_node: BaseNode, apply_style: bool = True):
+        """Convert base_node. If apply_style is False, base_node isn't
+        styled, see style_grapheditor_elements."""
+        if apply_style:
+            style_base_elements([base_node], batch=False)
         grapheditor_dict = neoproperties2grapheditor(base_node)
         title = get_node_title(base_node)
         sem_id = get_semantic_id_from_neonode(base_node)
@@ -162,12 +164,16 @@ class GraphEditorRelation(GraphEditorElement):
     _grapheditor_type: str = "relation" # TODO remove this from datatype
 
     @classmethod
-    def from_base_relation(cls, base_relation: BaseRelation, semantic_id: str | None = None):
-        # base_relation may contain style information like x, y position
-        # from perspectives.
-        prev_style = copy.copy(base_relation.style)
-        apply_style_rules(base_relation)
-        base_relation.style.update(prev_style)
+    def from_base_relation(
+        cls,
+        base_relation: BaseRelation,
+        semantic_id: str | None = None,
+        apply_style: bool = True,
+    ):
+        """Convert base_relation. If apply_style is False, base_relation
+        isn't styled, see style_grapheditor_elements."""
+        if apply_style:
+            style_base_elements([base_relation], batch=False)
         title = get_relation_title(base_relation)
         grapheditor_dict = neoproperties2grapheditor(base_relation, semantic_id)
         source_id = f"id::{base_relation.source.element_id}"
@@ -214,6 +220,53 @@ class GraphEditorRelation(GraphEditorElement):
 
 # ------------------------------- Functions -----------------------------------
 
+def style_base_elements(elements: list[BaseElement], batch: bool = True):
+    """Apply style rules to elements, keeping style information they
+    already have (like x, y positions from perspectives)."""
+    prev_styles = [copy.copy(element.style) for element in elements]
+    if batch:
+        apply_style_rules_batch(elements)
+    else:
+        for element in elements:
+            apply_style_rules(element)
+    for element, prev_style in zip(elements, prev_styles):
+        element.style.update(prev_style)
+
+
+def style_grapheditor_elements(pairs):
+    """Style base elements of (base element, GraphEditor element) pairs in a
+    batch, and pass the styles on to the GraphEditor elements.
+
+    The GraphEditor elements must have been created with apply_style=False.
+    """
+    pairs = list(pairs)
+    style_base_elements([base for base, _ in pairs])
+    for base, element in pairs:
+        element.style = base.style
+
+
+def nodes_from_base_nodes(base_nodes) -> list[GraphEditorNode]:
+    """Convert base nodes, styling them in a batch."""
+    base_nodes = list(base_nodes)
+    nodes = [
+        GraphEditorNode.from_base_node(base_node, apply_style=False)
+        for base_node in base_nodes
+    ]
+    style_grapheditor_elements(zip(base_nodes, nodes))
+    return nodes
+
+
+def relations_from_base_relations(base_relations) -> list[GraphEditorRelation]:
+    """Convert base relations, styling them in a batch."""
+    base_relations = list(base_relations)
+    relations = [
+        GraphEditorRelation.from_base_relation(base_relation, apply_style=False)
+        for base_relation in base_relations
+    ]
+    style_grapheditor_elements(zip(base_relations, relations))
+    return relations
+
+
 def get_node_title(node: BaseNode):
     """Determine the title of a node by trying keys. Defaults to label: id"""
 
@@ -241,18 +294,36 @@ def get_relation_title(relation):
     return f"{relation.type}"
 
 
-def neoobject2grapheditor(obj):
+def _neo_element2grapheditor(obj, unstyled: list | None):
+    if isinstance(obj, neo4j.graph.Node):
+        base = BaseNode.from_neo_node(obj)
+        result = GraphEditorNode.from_base_node(
+            base, apply_style=unstyled is None
+        )
+    else:
+        base = BaseRelation.from_neo_relation(obj)
+        result = GraphEditorRelation.from_base_relation(
+            base, apply_style=unstyled is None
+        )
+    if unstyled is not None:
+        unstyled.append((base, result))
+    return result
+
+
+def neoobject2grapheditor(obj, unstyled: list | None = None):
     """Converts arbitrary neo4j data to a dictionary where 'type'
     is the grapheditor typo, and 'contents' the corresponding grapheditor
-    data structure"""
+    data structure.
+
+    If the list `unstyled` is given, nodes and relations are not styled, but
+    (base element, GraphEditor element) pairs are appended to it instead,
+    for styling them later by style_grapheditor_elements."""
     result = None
-    if isinstance(obj, neo4j.graph.Node):
-        result = GraphEditorNode.from_neo_node(obj)
-    elif isinstance(obj, neo4j.graph.Relationship):
-        result = GraphEditorRelation.from_neo_relation(obj)
+    if isinstance(obj, (neo4j.graph.Node, neo4j.graph.Relationship)):
+        result = _neo_element2grapheditor(obj, unstyled)
     elif isinstance(obj, neo4j.graph.Path):
         result: list[GraphEditorElement] = [
-            GraphEditorNode.from_neo_node(obj.start_node)
+            _neo_element2grapheditor(obj.start_node, unstyled)
         ]
 
         # We need to consider that paths might not be directed. E.g. a path can
@@ -262,21 +333,23 @@ def neoobject2grapheditor(obj):
         current_node_id = obj.start_node.id
 
         for rel in obj:
-            result.append(GraphEditorRelation.from_neo_relation(rel))
+            result.append(_neo_element2grapheditor(rel, unstyled))
 
             if rel.start_node.id == current_node_id:
                 current_node = rel.end_node
             else:
                 current_node = rel.start_node
 
-            result.append(GraphEditorNode.from_neo_node(current_node))
+            result.append(_neo_element2grapheditor(current_node, unstyled))
             current_node_id = current_node.id
     elif isinstance(obj, (neo4j.time.DateTime, neo4j.time.Time, neo4j.time.DateTime)):
         result = obj.to_native()
     elif isinstance(obj, list):
-        result = list(map(neoobject2grapheditor, obj))
+        result = [neoobject2grapheditor(v, unstyled) for v in obj]
     elif isinstance(obj, dict):
-        result = {k: neoobject2grapheditor(v) for (k, v) in obj.items()}
+        result = {
+            k: neoobject2grapheditor(v, unstyled) for (k, v) in obj.items()
+        }
     else:
         result = obj
 
@@ -508,11 +581,12 @@ def get_grapheditor_nodes_by_ids(ids: list[str]) -> list[GraphEditorNode]:
     If an ID is missing, put a pseudo node into the list.
     The resulting list should keep the order of the IDs.
     """
-    nodes = current_app.graph_db.get_nodes_by_ids(ids=ids)
-    result = []
-    for nid in ids:
-        if node := nodes.get(nid, None):
-            result.append(GraphEditorNode.from_base_node(node))
-        else:
-            result.append(GraphEditorNode.create_pseudo_node(nid))
-    return result
+    nodes = g.graph_db.get_nodes_by_ids(ids=ids)
+    found_ids = [nid for nid in ids if nid in nodes]
+    found = dict(zip(
+        found_ids, nodes_from_base_nodes(nodes[nid] for nid in found_ids)
+    ))
+    return [
+        found[nid] if nid in found else GraphEditorNode.create_pseudo_node(nid)
+        for nid in ids
+    ]
@@ -0,0 +1,86 @@
+"""Process-wide cache of the metamodels of each database.
+
+Loading the metamodel (names of all MetaLabel, MetaProperty and
+MetaRelation nodes) on every request costs database round trips, even
+though the metamodel rarely changes. So we keep an immutable snapshot per
+database and reload it only if
+
+- one of our own write paths committed a possible metamodel change (see
+  database.generations), or
+- the snapshot is older than config.metamodel_refresh_interval, covering
+  changes done outside of this process.
+
+Snapshots also map the semantic IDs of meta nodes to their element IDs,
+so that resolving them needs no query in the common case.
+"""
+
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from threading import Lock
+from typing import Callable, Mapping
+
+from database.settings import config
+
+
+@dataclass(frozen=True)
+class MetamodelSnapshot:
+    labels: frozenset
+    properties: frozenset
+    relation_types: frozenset
+    raw_db_ids: Mapping[str, str]
+    generation: int
+    loaded_at: float
+
+
+class MetamodelCache:
+    """Thread-safe map of database keys to MetamodelSnapshot's."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshots = {}
+
+    def get(self, key, generation: int,
+            loader: Callable[[], dict]) -> MetamodelSnapshot:
+        """Return the snapshot for database `key`.
+
+        If there is no valid snapshot for the given (meta) generation, call
+        loader, which must return a dict with the keys "labels",
+        "properties", "relation_types" and "raw_db_ids" (semantic IDs of
+        meta nodes to element IDs), and cache the result.
+        """
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        if (
+            snapshot
+            and snapshot.generation == generation
+            and now - snapshot.loaded_at < config.metamodel_refresh_interval
+        ):
+            return snapshot
+
+        # Loading happens outside the lock. Concurrent requests may load
+        # the metamodel twice, which is harmless.
+        metamodel = loader()
+        snapshot = MetamodelSnapshot(
+            labels=frozenset(metamodel["labels"]),
+            properties=frozenset(metamodel["properties"]),
+            relation_types=frozenset(metamodel["relation_types"]),
+            raw_db_ids=MappingProxyType(dict(metamodel["raw_db_ids"])),
+            generation=generation,
+            loaded_at=now,
+        )
+        with self._lock:
+            self._snapshots[key] = snapshot
+        return snapshot
+
+    def invalidate(self, key=None):
+        """Drop snapshot of database `key`, or all snapshots if not given."""
+        with self._lock:
+            if key is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(key, None)
+
+
+metamodel_cache = MetamodelCache()
@@ -1,17 +1,19 @@
+import time
 from threading import Lock
 import neo4j
 from flask import current_app, g, request, session
 
 from blueprints.display.style_support import select_style, get_selected_style
+from database.drivers import driver_key
+from database.generations import commit_written
+from database.registry import get_registry
 from database.settings import config
+from database.tab_state import touch_tab
 from database.utils import abort_with_json
 
 MAX_RETRIES = 3
-drivers_lock = Lock()
 db_versions_lock = Lock()
 
-connections = dict()
-drivers = dict()
 db_versions = dict()
 
 # We use abort and abort_with_json to break out from a function, so
@@ -26,7 +28,32 @@ class Neo4jConnection:
         self.username = username
         self.database = database
         self.password = password
-        self._driver = self._setup_driver(host, username, password)
+        # With a service account, sessions of all users share its driver
+        # and impersonate the user (see config.service_user).
+        if config.service_user and host == config.neo4j:
+            self.impersonated_user = username
+            self._credentials = (
+                host, config.service_user, config.service_password
+            )
+        else:
+            self.impersonated_user = None
+            self._credentials = (host, username, password)
+        self._driver_key = driver_key(*self._credentials)
+        # get the driver now, so that invalid hosts fail early
+        get_registry().drivers.get(*self._credentials)
+
+    @property
+    def _driver(self) -> neo4j.Driver:
+        """The shared driver for our credentials. It may be replaced after
+        connectivity failures, so it is looked up for each session. The
+        request leases it until its teardown (see release_drivers)."""
+        driver = get_registry().drivers.acquire(*self._credentials)
+        leased = g.setdefault("neo4j_drivers", [])
+        if any(leased_driver is driver for leased_driver in leased):
+            get_registry().drivers.release(driver)
+        else:
+            leased.append(driver)
+        return driver
 
     def has_ft(self):
         """Return if grapheditor functions/procedures are installed and running.
@@ -94,9 +121,25 @@ class Neo4jConnection:
         )
         return result.single().value()
 
+    def run_schema(self, query):
+        """Run a schema command (e.g. CREATE INDEX) in its own auto-commit
+        transaction, since schema and data changes can't be mixed in a
+        transaction."""
+        with self._driver.session(
+            database=self.database,
+            impersonated_user=self.impersonated_user,
+        ) as session:
+            session.run(query).consume()
+
     def is_valid(self):
         """Test if connection of Neo4j database works."""
         try:
+            # the service account's driver doesn't check the user's
+            # credentials by itself
+            if self.impersonated_user and not self._driver.verify_authentication(
+                (self.username, self.password)
+            ):
+                return False
             result = self.run("CALL db.ping()").single()
             if result and result.value():
                 return True
@@ -108,18 +151,69 @@ class Neo4jConnection:
 
     @property
     def _tx(self):
-        """We work transaction based"""
+        """We work transaction based.
+
+        Requests handled by views marked as read_only use read
+        transactions, so that routing drivers (neo4j://) can send them to
+        any member of a cluster instead of the leader.
+        """
         if not hasattr(g, "neo4j_transaction"):
-            g.neo4j_session = self._driver.session(database=self.database)
+            access_mode = (
+                neo4j.READ_ACCESS if g.get("read_only") else neo4j.WRITE_ACCESS
+            )
+            g.neo4j_session = self._driver.session(
+                database=self.database,
+                default_access_mode=access_mode,
+                bookmark_manager=self._bookmark_manager(),
+                fetch_size=config.fetch_size,
+                impersonated_user=self.impersonated_user,
+            )
+            # beginning the transaction waits for a pooled connection
+            start = time.perf_counter()
             g.neo4j_transaction = g.neo4j_session.begin_transaction()
+            get_registry().drivers.record_acquisition(
+                self._driver_key, time.perf_counter() - start
+            )
+            # results of the transaction, see _results_in_use
+            g.neo4j_results = []
         return g.neo4j_transaction
 
+    def _bookmark_manager(self):
+        """Return the bookmark manager of the current request, or None if
+        bookmarks aren't used (see database.bookmarks)."""
+        if config.bookmark_scope == "tab" and g.get("tab_id"):
+            scope = (self.host, g.tab_id)
+        elif config.bookmark_scope == "user":
+            scope = (self.host, self.username)
+        else:
+            return None
+        return get_registry().bookmarks.get(scope)
+
+    @staticmethod
+    def _results_in_use() -> bool:
+        """Whether results of the transaction of this request may still be
+        read. Those are lazy, and closing the transaction invalidates
+        them."""
+        return any(
+            not result.closed() for result in g.get("neo4j_results", ())
+        )
+
+    def _discard_transaction(self):
+        """Forget the (failed) transaction of this request, so that the
+        next query starts a new one."""
+        g.neo4j_transaction.close()
+        g.neo4j_session.close()
+        del g.neo4j_transaction
+        g.pop("neo4j_results", None)
+
     @property
     def _admin_tx(self):
         """This transaction is NOT comitted"""
         if not hasattr(g, "neo4j_admin_transaction"):
             g.neo4j_admin_session = self._driver.session(
-                database=self.database
+                database=self.database,
+                fetch_size=config.fetch_size,
+                impersonated_user=self.impersonated_user,
             )
             g.neo4j_admin_transaction = (
                 g.neo4j_admin_session.begin_transaction()
@@ -149,7 +243,10 @@ class Neo4jConnection:
         retry_count = 0
         while retry_count < MAX_RETRIES:
             try:
-                return tx.run(query, **params)
+                result = tx.run(query, **params)
+                if not _as_admin:
+                    g.setdefault("neo4j_results", []).append(result)
+                return result
             except neo4j.exceptions.ClientError as e:
                 if e.code == "Neo.ClientError.Database.DatabaseNotFound":
                     current_app.logger.error(
@@ -160,12 +257,30 @@ class Neo4jConnection:
                         self.database = None
                     raise
                 raise
-            except neo4j.exceptions.SessionExpired:
+            except (neo4j.exceptions.Neo4jError, neo4j.exceptions.DriverError) as e:
+                # e.g. SessionExpired: the transaction is gone, and the
+                # driver may have to be replaced.
+                if isinstance(e, neo4j.exceptions.DriverError):
+                    get_registry().drivers.record_failure(self._driver_key)
+                # Read transactions did nothing that could be lost, so we
+                # can retry them in a new transaction (possibly on another
+                # cluster member), like managed transactions do. Not if
+                # the request may still read results of the transaction,
+                # though.
+                if (
+                    _as_admin
+                    or not g.get("read_only")
+                    or not e.is_retryable()
+                    or self._results_in_use()
+                ):
+                    raise
                 retry_count += 1
-                current_app.logger.warn(f"""
-                Connection to {self.host} as {self.username} expired, retrying ({retry_count}).
-                """)
-                self._setup_driver(self.host, self.username, self.password)
+                current_app.logger.warning(
+                    f"Connection to {self.host} as {self.username} failed, "
+                    f"retrying read transaction ({retry_count}): {e}"
+                )
+                self._discard_transaction()
+                tx = self._tx
         abort_with_json(400, "Max connection retries limit reached")
 
 
@@ -175,13 +290,15 @@ class Neo4jConnection:
         """
         self._tx.commit()
         del g.neo4j_transaction
+        g.neo4j_session.close()
+        commit_written(self)
 
     @staticmethod
     def doom():
         """
         If this is called, the transaction will roll back at the end.
         """
-        current_app.doom_transaction = True
+        g.doom_transaction = True
 
     @staticmethod
     def close(exception):
@@ -196,6 +313,7 @@ class Neo4jConnection:
             current_app.logger.info("Rolling back admin transaction")
             g.neo4j_admin_transaction.rollback()
             del g.neo4j_admin_transaction
+            g.neo4j_admin_session.close()
 
         if hasattr(g, "neo4j_transaction"):
             if getattr(g, "doom_transaction", False) or exception:
@@ -204,26 +322,26 @@ class Neo4jConnection:
             else:
                 try:
                     g.neo4j_transaction.commit()
+                    if hasattr(g, "conn"):
+                        commit_written(g.conn)
+                        get_registry().drivers.record_success(
+                            g.conn._driver_key
+                        )
                 # we want to use a rollback on any crash
                 # pylint: disable=broad-exception-caught
                 except Exception:
                     g.neo4j_transaction.rollback()
             del g.neo4j_transaction
+            # the bookmark manager of the session already got the
+            # bookmark of the commit, see database.bookmarks
+            g.neo4j_session.close()
+        Neo4jConnection.release_drivers()
 
-    def _hash(self):
-        return hash((self.host, self.username))
-
-    def _setup_driver(self, host: str, username: str, password: str) -> neo4j.Driver:
-        # Setting up a driver is expensive, and they should be reused.
-        # Let's cache those.
-        key = self._hash()
-        with drivers_lock:
-            if key not in drivers:
-                current_app.logger.debug(f"connecting to {host} as {username}")
-                drivers[key] = neo4j.GraphDatabase.driver(
-                    host, auth=(username, password)
-                )
-            return drivers[key]
+    @staticmethod
+    def release_drivers():
+        """End the leases of the drivers used by this request."""
+        for driver in g.pop("neo4j_drivers", []):
+            get_registry().drivers.release(driver)
 
     def get_databases(self):
         """Return all databases available."""
@@ -270,34 +388,36 @@ class Neo4jConnection:
         return False
 
 
-def hash_connection_data(login_data, db):
-    return hash(
-        login_data["host"]
-        + login_data["username"]
-        + login_data["password"]
-        + str(db)
+def fetch_connection(login_data, db):
+    """Return a Neo4jConnection for login_data and database db. Drivers,
+    which are expensive, are shared (see database.drivers)."""
+    return Neo4jConnection(
+        host=login_data["host"],
+        username=login_data["username"],
+        password=login_data["password"],
+        database=db,
     )
 
 
-def fetch_connection(login_data, db):
-    hash_val = hash_connection_data(login_data, db)
-    if hash_val in connections:
-        conn = connections[hash_val]
-        current_app.logger.debug("reusing existing connection")
-    else:
-        conn = Neo4jConnection(
-            host=login_data["host"],
-            username=login_data["username"],
-            password=login_data["password"],
-            database=db,
-        )
-        connections[hash_connection_data(login_data, db)] = conn
-        current_app.logger.debug("creating new connection")
-    return conn
+def read_only(func):
+    """Decorator marking a view method as not writing to the graph, so that
+    its requests use read transactions (see Neo4jConnection._tx)."""
+    func.read_only = True
+    return func
+
+
+def view_is_read_only() -> bool:
+    """Return if the view handling the current request is read_only."""
+    view = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view, "view_class", None)
+    if view_class is not None:
+        view = getattr(view_class, request.method.lower(), None)
+    return getattr(view, "read_only", False)
 
 
 def neo4j_connect():
     """Establish connection to the Neo4j server."""
+    g.read_only = view_is_read_only()
     tab_id = None
     if "x-tab-id" in request.headers:
         tab_id = request.headers.get("x-tab-id")
@@ -323,7 +443,7 @@ def fetch_connection_by_id(tab_id):
             if last_tab_id not in session["login_data"]:
                 abort_with_json(401, "No connection data for last_tab_id in session.")
             # for now we don't persist connections per se, only login info.
-            # Connections are reused anyway (see _setup_driver).
+            # Drivers are reused anyway (see database.drivers).
             if "login_data" not in session:
                 session["login_data"] = dict()
             session["login_data"][tab_id] = dict(session["login_data"][last_tab_id])
@@ -331,6 +451,7 @@ def fetch_connection_by_id(tab_id):
         else:
             abort_with_json(401, "missing last_tab_id in session")
     session["last_tab_id"] = tab_id
+    touch_tab(tab_id)
     login_data = session["login_data"][tab_id]
     g.login_data = login_data
     cur_db = get_current_datatabase_name()
@@ -0,0 +1,84 @@
+"""Process-wide cache of intermediate parallax results.
+
+Users build parallax chains step by step, so consecutive requests share
+the initial nodes, filters and leading steps. For each such prefix we
+keep the element IDs of the resulting nodes ("frontier"), so that only
+the remaining steps have to be computed.
+
+Keys include the user, since privileges of users may differ (e.g. DENY
+TRAVERSE), and the write generation of the database (see
+database.generations), so our own writes invalidate all entries. Writes
+done elsewhere are covered by config.parallax_cache_ttl. The cache is
+bounded by the estimated memory of the IDs (config.parallax_cache_bytes).
+"""
+
+import hashlib
+import json
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from database.settings import config
+
+
+def prefix_digest(ids: list[str], filters, steps: list) -> str:
+    """Return a digest of the initial IDs, filters and steps of a
+    parallax prefix."""
+    data = json.dumps([ids, filters, steps], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _frontier_size(frontier: tuple) -> int:
+    return sys.getsizeof(frontier) + sum(sys.getsizeof(i) for i in frontier)
+
+
+class ParallaxCache:
+    """Thread-safe LRU map of (database key, user, generation, prefix
+    digest) to frontiers, i.e. tuples of element IDs."""
+
+    def __init__(self):
+        self._lock = Lock()
+        # key -> (frontier, size, monotonic time of creation)
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key) -> tuple | None:
+        """Return the frontier stored under key, if still valid."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry[2] > config.parallax_cache_ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, frontier: list[str]):
+        """Store frontier under key, evicting least recently used entries
+        if the cache gets too big."""
+        frontier = tuple(frontier)
+        size = _frontier_size(frontier)
+        if size > config.parallax_cache_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (frontier, size, time.monotonic())
+            self._size += size
+            while self._size > config.parallax_cache_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+parallax_cache = ParallaxCache()
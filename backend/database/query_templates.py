@@ -0,0 +1,87 @@
+"""Registry of parameterized Cypher queries with statistics.
+
+Query texts are fixed when registered, and all values are passed as
+parameters. So Neo4j plans each template once and reuses the plan, and
+values can't inject Cypher. For each template, we record calls, returned
+rows and time spent on the server and in total (including transfer and
+decoding), see /api/v1/info/queries.
+"""
+
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+
+@dataclass(frozen=True)
+class QueryTemplate:
+    name: str
+    text: str
+
+
+@dataclass
+class TemplateStats:
+    calls: int = 0
+    rows: int = 0
+    server_seconds: float = 0.0
+    client_seconds: float = 0.0
+
+
+class QueryTemplates:
+    """Thread-safe registry of named query templates."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._templates = {}
+        self._stats = {}
+
+    def register(self, name: str, text: str) -> QueryTemplate:
+        """Register and return the template `name`.
+
+        Registering a name twice with different texts raises a ValueError.
+        """
+        template = QueryTemplate(name, text)
+        with self._lock:
+            existing = self._templates.setdefault(name, template)
+        if existing != template:
+            raise ValueError(f"Query template {name} is already registered.")
+        return template
+
+    def run(self, conn, template: QueryTemplate, **params) -> list:
+        """Run template with params on conn and return all records."""
+        start = time.perf_counter()
+        result = conn.run(template.text, **params)
+        records = list(result)
+        summary = result.consume()
+        client_seconds = time.perf_counter() - start
+        server_ms = (summary.result_available_after or 0) + (
+            summary.result_consumed_after or 0
+        )
+        with self._lock:
+            stats = self._stats.setdefault(template.name, TemplateStats())
+            stats.calls += 1
+            stats.rows += len(records)
+            stats.server_seconds += server_ms / 1000
+            stats.client_seconds += client_seconds
+        return records
+
+    def stats(self) -> list[dict]:
+        """Return statistics of all templates, most expensive first."""
+        with self._lock:
+            stats = [
+                {
+                    "name": name,
+                    "calls": template_stats.calls,
+                    "rows": template_stats.rows,
+                    "server_seconds": template_stats.server_seconds,
+                    "client_seconds": template_stats.client_seconds,
+                }
+                for name, template_stats in self._stats.items()
+            ]
+        return sorted(stats, key=lambda s: s["client_seconds"], reverse=True)
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_templates = QueryTemplates()
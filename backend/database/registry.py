@@ -0,0 +1,57 @@
+"""Long-lived state shared by all requests.
+
+The registry is created once at startup and stored in app.extensions.
+It is immutable, i.e. its attributes are never rebound while serving;
+each of them is thread-safe itself. State belonging to a single request
+lives in flask.g instead (e.g. g.graph_db, g.conn).
+"""
+
+from dataclasses import dataclass
+
+from flask import current_app
+
+from database.bookmarks import BookmarkManagers
+from database.capabilities import CapabilityCache, capability_cache
+from database.drivers import DriverRegistry
+from database.generations import WriteGenerations, write_generations
+from database.metamodel_cache import MetamodelCache, metamodel_cache
+from database.parallax_cache import ParallaxCache, parallax_cache
+from database.query_templates import QueryTemplates, query_templates
+from database.schema import SchemaManager, schema_manager
+from database.settings import config
+
+
+EXTENSION_NAME = "grapheditor"
+
+
+@dataclass(frozen=True)
+class Registry:
+    """Caches shared between requests and threads."""
+
+    metamodel_cache: MetamodelCache
+    write_generations: WriteGenerations
+    capabilities: CapabilityCache
+    bookmarks: BookmarkManagers
+    drivers: DriverRegistry
+    queries: QueryTemplates
+    parallax: ParallaxCache
+    schema: SchemaManager
+
+
+def create_registry() -> Registry:
+    """Return a registry of the process wide caches."""
+    return Registry(
+        metamodel_cache=metamodel_cache,
+        write_generations=write_generations,
+        capabilities=capability_cache,
+        bookmarks=BookmarkManagers(config.bookmark_scopes),
+        drivers=DriverRegistry(config.driver_cache_size),
+        queries=query_templates,
+        parallax=parallax_cache,
+        schema=schema_manager,
+    )
+
+
+def get_registry() -> Registry:
+    """Return the registry of the current app."""
+    return current_app.extensions[EXTENSION_NAME]
@@ -0,0 +1,114 @@
+"""Indexes needed by lookups of GraphEditor nodes.
+
+Nodes are looked up by name__tech_ within a GraphEditor label (semantic
+IDs like MetaLabel::Person) and by _uuid__tech_ (paraqueries). These
+lookups use static labels and property keys, so that the planner can use
+the range indexes below instead of scanning all nodes.
+
+The indexes are created once per database and process, when the first
+request uses it. Failures are logged. Missing privileges (usual with
+RBAC) are remembered per database and user, so creation isn't tried
+again for them. After other failures it is tried again once
+config.capability_ttl seconds have passed.
+Relationships can't be indexed independently of their type, so lookups
+of relationships by _uuid__tech_ still scan.
+"""
+
+import time
+from threading import Lock
+from typing import Callable
+
+import neo4j.exceptions
+from flask import current_app
+
+from database.id_handling import GraphEditorLabel
+from database.settings import config
+
+
+def _index_statement(name: str, label: str, prop: str) -> str:
+    return (
+        f"CREATE RANGE INDEX {name} IF NOT EXISTS "
+        f"FOR (n:`{label}`) ON (n.`{prop}`)"
+    )
+
+
+INDEXES = {
+    f"grapheditor_name_{metatype.name}": _index_statement(
+        f"grapheditor_name_{metatype.name}", metatype.value, "name__tech_"
+    )
+    for metatype in GraphEditorLabel
+} | {
+    "grapheditor_uuid": _index_statement(
+        "grapheditor_uuid", "___tech_", "_uuid__tech_"
+    ),
+}
+
+
+def _lacks_privileges(error) -> bool:
+    """Whether error is due to missing privileges of the user."""
+    return isinstance(
+        error, (neo4j.exceptions.Forbidden, neo4j.exceptions.AuthError)
+    ) or (getattr(error, "code", None) or "").startswith(
+        "Neo.ClientError.Security."
+    )
+
+
+class SchemaManager:
+    """Thread-safe record of the indexes created in each database."""
+
+    def __init__(self):
+        self._lock = Lock()
+        # database key -> names of indexes known to exist
+        self._ensured = {}
+        # (database key, user) -> index name -> monotonic time before which
+        # creating it isn't tried again
+        self._failed = {}
+
+    def ensure(self, key, run_schema: Callable[[str], None], user=None):
+        """Create missing indexes of database `key` with run_schema (as
+        `user`), unless this was done or failed before."""
+        now = time.monotonic()
+        with self._lock:
+            ensured = set(self._ensured.get(key, ()))
+            failed = dict(self._failed.get((key, user), {}))
+        names = [
+            name for name in INDEXES
+            if name not in ensured and failed.get(name, now) <= now
+        ]
+        if not names:
+            return
+        # Statements run outside the lock; they are idempotent anyway.
+        for name in names:
+            try:
+                run_schema(INDEXES[name])
+            except (
+                neo4j.exceptions.Neo4jError, neo4j.exceptions.DriverError
+            ) as e:
+                current_app.logger.warning(
+                    f"Could not create index {name} on {key}: {e}"
+                )
+                failed[name] = (
+                    float("inf") if _lacks_privileges(e)
+                    else now + config.capability_ttl
+                )
+                continue
+            ensured.add(name)
+            failed.pop(name, None)
+        with self._lock:
+            self._ensured[key] = ensured | self._ensured.get(key, set())
+            self._failed[(key, user)] = failed
+
+    def invalidate(self, key=None):
+        """Ensure indexes of database `key` (or all databases) again on
+        next use."""
+        with self._lock:
+            if key is None:
+                self._ensured.clear()
+                self._failed.clear()
+            else:
+                self._ensured.pop(key, None)
+                for failed_key in [k for k in self._failed if k[0] == key]:
+                    del self._failed[failed_key]
+
+
+schema_manager = SchemaManager()
@@ -0,0 +1,291 @@
+"""Server side sessions stored in SQLite, one row per top-level key.
+
+Compared to pickling the whole session into a file on each request
+(flask_session's filesystem backend), this
+
+- keeps pickled session items of recently used sessions in memory, so that
+  only the versions of the items have to be read from disk,
+- writes back only the items that changed, i.e. whose pickle differs from
+  the one loaded, and only if they were accessed at all,
+- uses SQLite in WAL mode, so that readers and writers (also of other
+  worker processes) don't block each other.
+
+Values are unpickled for each request, so that concurrent requests of one
+session never share mutable objects.
+"""
+
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+
+
+class ItemSession(dict, SessionMixin):
+    """Session remembering which items were accessed (and thus may have
+    been modified in place)."""
+
+    def __init__(self, sid, items, new=False):
+        super().__init__(items)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed_keys = set()
+        # pickled items and expiration time as loaded from the database
+        self.loaded_items = {}
+        self.loaded_expires = 0.0
+
+    def __getitem__(self, key):
+        self.accessed_keys.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed_keys.add(key)
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed_keys.add(key)
+        self.modified = True
+        return super().setdefault(key, default)
+
+    def __setitem__(self, key, value):
+        self.accessed_keys.add(key)
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        self.modified = True
+        return super().pop(key, *args)
+
+    def clear(self):
+        self.modified = True
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        for key in dict(*args, **kwargs):
+            self.accessed_keys.add(key)
+        super().update(*args, **kwargs)
+
+    def values(self):
+        self.accessed_keys.update(self.keys())
+        return super().values()
+
+    def items(self):
+        self.accessed_keys.update(self.keys())
+        return super().items()
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Flask session interface storing sessions in an SQLite database."""
+
+    # Minimum seconds between deletions of expired sessions.
+    PURGE_INTERVAL = 3600
+    # Minimum seconds the expiration of an unchanged session must move
+    # before it is written.
+    EXPIRATION_GRANULARITY = 3600
+
+    def __init__(self, path: str, cache_size: int = 1000):
+        self.path = path
+        self.cache_size = cache_size
+        # sid -> {key: (version, pickled value)}
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY, expires REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_items ("
+                " sid TEXT NOT NULL, key TEXT NOT NULL,"
+                " version INTEGER NOT NULL, value BLOB NOT NULL,"
+                " PRIMARY KEY (sid, key)) WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _cached_items(self, sid) -> dict:
+        with self._cache_lock:
+            items = self._cache.get(sid)
+            if items is not None:
+                self._cache.move_to_end(sid)
+                return dict(items)
+        return {}
+
+    def _cache_items(self, sid, items: dict):
+        with self._cache_lock:
+            if items:
+                self._cache[sid] = items
+                self._cache.move_to_end(sid)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.pop(sid, None)
+
+    def _load_items(self, sid) -> tuple[dict, float] | None:
+        """Return {key: (version, pickled value)} and expiration time of
+        session sid, or None if it doesn't exist or expired."""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT expires FROM sessions WHERE sid = ?", (sid,)
+        ).fetchone()
+        if not row or row[0] < time.time():
+            return None
+        expires = row[0]
+
+        cached = self._cached_items(sid)
+        versions = dict(conn.execute(
+            "SELECT key, version FROM session_items WHERE sid = ?", (sid,)
+        ))
+        items = {
+            key: cached[key]
+            for key, version in versions.items()
+            if key in cached and cached[key][0] == version
+        }
+        stale = [key for key in versions if key not in items]
+        if stale:
+            placeholders = ", ".join("?" * len(stale))
+            for key, version, value in conn.execute(
+                "SELECT key, version, value FROM session_items"
+                f" WHERE sid = ? AND key IN ({placeholders})",
+                (sid, *stale),
+            ):
+                items[key] = (version, value)
+        self._cache_items(sid, items)
+        return items, expires
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        loaded = self._load_items(sid) if sid else None
+        if loaded is None:
+            return ItemSession(secrets.token_urlsafe(32), {}, new=True)
+        items, expires = loaded
+        session = ItemSession(
+            sid, {key: pickle.loads(value) for key, (_, value) in items.items()}
+        )
+        session.loaded_items = items
+        session.loaded_expires = expires
+        return session
+
+    def _write_items(self, session: ItemSession, expires: float) -> dict:
+        """Write changed items of session and return the new items.
+
+        The expiration time is only written if items changed or it moved
+        by at least EXPIRATION_GRANULARITY, so that requests only reading
+        the session don't write at all.
+        """
+        old_items = session.loaded_items
+        new_items = {}
+        changed = {}
+        for key in dict.keys(session):
+            if key in old_items and key not in session.accessed_keys:
+                new_items[key] = old_items[key]
+                continue
+            value = pickle.dumps(dict.__getitem__(session, key))
+            if key in old_items and old_items[key][1] == value:
+                new_items[key] = old_items[key]
+            else:
+                changed[key] = value
+        deleted = [key for key in old_items if key not in session]
+        if (
+            not changed
+            and not deleted
+            and expires - session.loaded_expires < self.EXPIRATION_GRANULARITY
+        ):
+            return new_items
+
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions (sid, expires) VALUES (?, ?)"
+                " ON CONFLICT (sid) DO UPDATE SET expires = excluded.expires",
+                (session.sid, expires),
+            )
+            for key, value in changed.items():
+                (version,) = conn.execute(
+                    "INSERT INTO session_items (sid, key, version, value)"
+                    " VALUES (?, ?, 1, ?)"
+                    " ON CONFLICT (sid, key) DO UPDATE"
+                    " SET value = excluded.value, version = version + 1"
+                    " RETURNING version",
+                    (session.sid, key, value),
+                ).fetchone()
+                new_items[key] = (version, value)
+            conn.executemany(
+                "DELETE FROM session_items WHERE sid = ? AND key = ?",
+                [(session.sid, key) for key in deleted],
+            )
+        return new_items
+
+    def _delete(self, sid):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM session_items WHERE sid = ?", (sid,))
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        self._cache_items(sid, {})
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM session_items WHERE sid IN"
+                " (SELECT sid FROM sessions WHERE expires < ?)",
+                (now,),
+            )
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.new and not session.modified:
+            return
+
+        expires = self.get_expiration_time(app, session)
+        if expires is not None:
+            expires_at = expires.timestamp()
+        else:
+            expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        items = self._write_items(session, expires_at)
+        self._cache_items(session.sid, items)
+        self._purge_expired()
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=expires,
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
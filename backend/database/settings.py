@@ -33,5 +33,87 @@ config = AttrDict(
     log_level=os.environ.get("GUI_LOGLEVEL", "INFO"),
     dev_mode=os.environ.get("GUI_DEV_MODE", "1") == "1",
     send_error_messages=os.environ.get("GUI_SEND_ERROR_MESSAGES", "1") == "1",
-    gui_custom_files_dir=os.getenv("GUI_CUSTOM_FILES_DIR","static/custom")
+    gui_custom_files_dir=os.getenv("GUI_CUSTOM_FILES_DIR","static/custom"),
+    # Seconds after which cached metamodels are reloaded, even if no write
+    # was done through this process.
+    metamodel_refresh_interval=float(
+        os.environ.get("GUI_METAMODEL_REFRESH_INTERVAL", "10")
+    ),
+    # Seconds for which capabilities of a database (fulltext index,
+    # custom procedures, triggers) are cached.
+    capability_ttl=float(os.environ.get("GUI_CAPABILITY_TTL", "60")),
+    # Create indexes needed by lookups of GraphEditor nodes (see
+    # database.schema) on first use of a database.
+    ensure_indexes=os.environ.get("GUI_ENSURE_INDEXES", "1") == "1",
+    # Optional service account for the Neo4j server at GUI_NEO4J. If set,
+    # all users of that server share its driver, and sessions impersonate
+    # the logged in user (requires Neo4j Enterprise and the IMPERSONATE
+    # privilege). Logins are still checked with the user's credentials.
+    service_user=os.environ.get("GUI_SERVICE_USER", ""),
+    service_password=os.environ.get("GUI_SERVICE_PASSWORD", ""),
+    # Number of Neo4j drivers (one per host and credentials, each with its
+    # own connection pool) kept open, see database.drivers.
+    driver_cache_size=int(os.environ.get("GUI_DRIVER_CACHE_SIZE", "100")),
+    # Connectivity failures in a row after which a driver is replaced.
+    driver_failure_threshold=int(
+        os.environ.get("GUI_DRIVER_FAILURE_THRESHOLD", "3")
+    ),
+    max_connection_pool_size=int(
+        os.environ.get("GUI_MAX_CONNECTION_POOL_SIZE", "100")
+    ),
+    # Seconds a request waits for a pooled connection.
+    connection_acquisition_timeout=float(
+        os.environ.get("GUI_CONNECTION_ACQUISITION_TIMEOUT", "60")
+    ),
+    # Number of records fetched from the server at once.
+    fetch_size=int(os.environ.get("GUI_FETCH_SIZE", "1000")),
+    # Whose writes a request waits for when reading from a cluster member
+    # (see database.bookmarks): "tab", "user" (all tabs of a user) or
+    # "none".
+    bookmark_scope=os.environ.get("GUI_BOOKMARK_SCOPE", "tab"),
+    # Number of scopes whose bookmarks are kept.
+    bookmark_scopes=int(os.environ.get("GUI_BOOKMARK_SCOPES", "10000")),
+    # Estimated bytes of node IDs of memoized parallax step prefixes, and
+    # seconds for which they are reused (writes of other clients aren't
+    # noticed before). A size of 0 disables memoization.
+    parallax_cache_bytes=int(
+        os.environ.get("GUI_PARALLAX_CACHE_BYTES", str(64 * 1024 * 1024))
+    ),
+    parallax_cache_ttl=float(os.environ.get("GUI_PARALLAX_CACHE_TTL", "300")),
+    # Number of nodes per page of parallax results if the request sets
+    # no limit. 0 returns all nodes at once.
+    parallax_page_size=int(os.environ.get("GUI_PARALLAX_PAGE_SIZE", "0")),
+    # Maximum number of memoized style results per style version.
+    # 0 disables memoization.
+    style_memo_size=int(os.environ.get("GUI_STYLE_MEMO_SIZE", "10000")),
+    # Time (seconds spent evaluating style rules) and operations (loop
+    # iterations, function calls) style code may use per request. 0 means
+    # unlimited. Time is measured, so it depends on the load of the
+    # server; only the deterministic operation budget is on by default.
+    style_budget_seconds=float(os.environ.get("GUI_STYLE_BUDGET_SECONDS", "0")),
+    style_budget_operations=int(
+        os.environ.get("GUI_STYLE_BUDGET_OPERATIONS", "5000000")
+    ),
+    # Record calls, memo hits, matches and time of each style rule, see
+    # /api/v1/styles/profile. Off by default, since it costs some time per
+    # styled element.
+    style_profiling=os.environ.get("GUI_STYLE_PROFILING", "0") == "1",
+    # Number of worker processes styling large batches of elements, and
+    # the minimum batch size for using them. 0 workers disables the pool.
+    style_pool_workers=int(os.environ.get("GUI_STYLE_POOL_WORKERS", "0")),
+    style_pool_threshold=int(
+        os.environ.get("GUI_STYLE_POOL_THRESHOLD", "1000")
+    ),
+    # Directory of uploaded style files, stored by their SHA-256 digest.
+    style_store_dir=os.environ.get("GUI_STYLE_STORE_DIR", "styles"),
+    # "filesystem" (flask_session) or "sqlite" (see database.session_store).
+    # Sessions aren't migrated when switching, so users must log in again.
+    session_backend=os.environ.get("GUI_SESSION_BACKEND", "filesystem"),
+    session_db=os.environ.get("GUI_SESSION_DB", "sessions.sqlite3"),
+    # Number of sessions whose pickled items are kept in memory.
+    session_cache_size=int(os.environ.get("GUI_SESSION_CACHE_SIZE", "1000")),
+    # Seconds after which the state of an unused tab is removed from its
+    # session (see database.tab_state), and number of tabs kept at most.
+    tab_state_ttl=float(os.environ.get("GUI_TAB_STATE_TTL", str(7 * 24 * 3600))),
+    tab_state_max_tabs=int(os.environ.get("GUI_TAB_STATE_MAX_TABS", "50")),
 )
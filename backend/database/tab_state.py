@@ -0,0 +1,67 @@
+"""Expiry of per-tab state in sessions.
+
+Login data, selected styles, default labels and default relation types
+are stored per tab id in the session. Browsers create a new tab id for
+each tab, so without expiry, sessions of long-lived browsers grow without
+bound. Therefore we remember when each tab was used last, and drop the
+state of tabs unused for config.tab_state_ttl seconds, or beyond the
+config.tab_state_max_tabs most recently used ones.
+"""
+
+import time
+
+from flask import session
+
+from database.settings import config
+
+
+# session keys holding dictionaries with state per tab id
+TAB_STATE_KEYS = ("login_data", "selected_style", "default_labels", "default_type")
+
+# Minimum seconds between updates of the last use of a tab, so that the
+# session isn't changed by each request.
+TOUCH_INTERVAL = 60
+
+
+def touch_tab(tab_id: str):
+    """Record that tab_id is used now, and evict the state of stale tabs."""
+    now = time.time()
+    tabs_used = session.get("tabs_used", {})
+    if now - tabs_used.get(tab_id, 0) < TOUCH_INTERVAL:
+        return
+    tabs_used[tab_id] = now
+    # tabs of older sessions count as used now
+    for key in TAB_STATE_KEYS:
+        for other_tab_id in session.get(key, {}):
+            tabs_used.setdefault(other_tab_id, now)
+    session["tabs_used"] = tabs_used
+    evict_stale_tabs(now, keep={tab_id, session.get("last_tab_id")})
+
+
+def evict_stale_tabs(now: float, keep=()):
+    """Remove state of tabs not used within the TTL or beyond the maximum
+    number of tabs, except those in `keep`."""
+    tabs_used = session.get("tabs_used", {})
+    by_recency = sorted(tabs_used, key=tabs_used.get, reverse=True)
+    stale = {
+        tab_id
+        for position, tab_id in enumerate(by_recency)
+        if tab_id not in keep
+        and (
+            now - tabs_used[tab_id] > config.tab_state_ttl
+            or position >= config.tab_state_max_tabs
+        )
+    }
+    if not stale:
+        return
+    for key in TAB_STATE_KEYS:
+        tab_states = session.get(key)
+        if tab_states and stale.intersection(tab_states):
+            session[key] = {
+                tab_id: state
+                for tab_id, state in tab_states.items()
+                if tab_id not in stale
+            }
+    session["tabs_used"] = {
+        tab_id: used for tab_id, used in tabs_used.items() if tab_id not in stale
+    }
@@ -7,7 +7,7 @@ import sys
 import platform
 
 import waitress
-from flask import Flask, abort, request, current_app, g, send_from_directory, render_template
+from flask import Flask, abort, request, g, send_from_directory, render_template
 from flask_cors import CORS
 from flask_smorest import Api
 from werkzeug._reloader import run_with_reloader
@@ -16,6 +16,11 @@ from werkzeug.middleware.profiler import ProfilerMiddleware
 from flask_session import Session
 
 from blueprints.display.style_support import load_default_style
+from blueprints.display.style_budget import (
+    BUDGET_EXCEEDED_HEADER,
+    flag_exceeded_budget,
+)
+from blueprints.display.style_pool import start_style_pool
 from blueprints.maintenance.info_api_v1 import blp as info_api
 from blueprints.maintenance.database_api import blp as database_api
 from blueprints.maintenance.dev_api import blp as dev_api
@@ -31,7 +36,13 @@ from blueprints.display.style_api_v1 import blp as style_api
 from blueprints.context_menu_api_v1 import blp as context_menu_api
 
 from database.cypher_database import CypherDatabase
-from database.neo4j_connection import neo4j_connect
+from database.neo4j_connection import Neo4jConnection, neo4j_connect
+from database.registry import (
+    EXTENSION_NAME as REGISTRY_EXTENSION,
+    create_registry,
+    get_registry,
+)
+from database.session_store import SqliteSessionInterface
 from database.settings import config
 
 from utils import basedir, get_customized_file_dir
@@ -114,6 +125,7 @@ app.logger.setLevel(config.log_level)
 CORS(
     app,
     supports_credentials=True,
+    expose_headers=[BUDGET_EXCEEDED_HEADER],
     origins=[
         "http://localhost:8080",
         "http://localhost:8081",
@@ -125,7 +137,14 @@ CORS(
         "http://localhost:8008"
     ],
 )
-Session(app)
+if config.session_backend == "sqlite":
+    app.session_interface = SqliteSessionInterface(
+        config.session_db, config.session_cache_size
+    )
+else:
+    Session(app)
+
+app.extensions[REGISTRY_EXTENSION] = create_registry()
 
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_prefix=1, x_for=1, x_host=1)
 
@@ -138,6 +157,8 @@ if config.profile_dir:
 
 api = Api(app)
 
+start_style_pool()
+
 api.register_blueprint(node_api, url_prefix=f"{api_prefix}/api/v1/nodes")
 
 api.register_blueprint(relation_api, url_prefix=f"{api_prefix}/api/v1/relations")
@@ -172,8 +193,8 @@ api.register_blueprint(info_api, url_prefix=f"{api_prefix}/api/v1/info")
 @app.teardown_appcontext
 def close_connection(exception):
     app.logger.debug("closing transaction")
-    if hasattr(g, "conn"):
-        g.conn.close(exception)
+    # also requests without g.conn (e.g. login) may have used a connection
+    Neo4jConnection.close(exception)
 
 
 def route_requires_connection():
@@ -181,6 +202,8 @@ def route_requires_connection():
         "/api/v1/context_actions",
         "/api/v1/databases",
         "/api/v1/dev",
+        "/api/v1/info/drivers",
+        "/api/v1/info/queries",
         "/api/v1/meta",
         "/api/v1/nodes",
         "/api/v1/parallax",
@@ -201,9 +224,10 @@ def load_metamodels():
     if route_requires_connection():
         if "x-tab-id" not in request.headers:
             abort(401)
-        current_app.graph_db = CypherDatabase()
+        g.graph_db = CypherDatabase(get_registry())
         neo4j_connect()
-        current_app.graph_db.load_metamodels()
+        g.graph_db.ensure_schema()
+        g.graph_db.load_metamodels()
 
 
 @app.before_request
@@ -211,11 +235,17 @@ def prepare_style():
     """Load default style settings.
 
     This is executed on each request in order to always have an up-to-date
-    style configuration.
+    style configuration. The style file is only parsed again if it changed.
     """
     load_default_style()
 
 
+@app.after_request
+def flag_style_budget(response):
+    """Tell the client if some elements have incomplete styles."""
+    return flag_exceeded_budget(response)
+
+
 @app.route("/")
 @app.route("/search")
 @app.route(f"{api_prefix}/api/")
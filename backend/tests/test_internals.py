@@ -1,6 +1,18 @@
+import dataclasses
+import sqlite3
+import types
+from functools import wraps
+
+import neo4j
+import neo4j.exceptions
 import pytest
+from flask import Flask, g, session
+from flask.views import MethodView
 
 from database import mapper
+from database.bookmarks import BookmarkManagers
+from database.cypher_database import CypherDatabase
+from database.drivers import DriverRegistry, driver_key
 from database.id_handling import (
     extract_id_metatype,
     get_base_id,
@@ -8,6 +20,17 @@ from database.id_handling import (
     GraphEditorLabel,
 )
 from database.mapper import python_value_to_cypher
+from database.metamodel_cache import MetamodelCache
+from database.parallax_cache import ParallaxCache, parallax_cache
+from database.query_templates import QueryTemplates
+from database.neo4j_connection import (
+    Neo4jConnection,
+    read_only,
+    view_is_read_only,
+)
+from database.session_store import SqliteSessionInterface
+from database.settings import config
+from database import capabilities, drivers, registry, schema, tab_state
 from database.utils import dict_to_array
 
 
@@ -73,5 +96,683 @@ def test_metatype_from_labels():
     assert mapper.get_metatype_from_labels([]) is None
 
 
+def test_metamodel_cache():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {
+            "labels": {"Person"},
+            "properties": set(),
+            "relation_types": set(),
+            "raw_db_ids": {"MetaLabel::Person": "4:x:1"},
+        }
+
+    cache = MetamodelCache()
+    snapshot = cache.get(("host", "db"), 0, loader)
+    assert snapshot.labels == frozenset({"Person"})
+    assert snapshot.raw_db_ids["MetaLabel::Person"] == "4:x:1"
+    # same generation, so no reload
+    assert cache.get(("host", "db"), 0, loader) is snapshot
+    assert len(calls) == 1
+    # a new generation or database triggers a reload
+    cache.get(("host", "db"), 1, loader)
+    cache.get(("host", "other_db"), 1, loader)
+    assert len(calls) == 3
+
+
+def test_sqlite_sessions(tmp_path):
+    db = str(tmp_path / "sessions.sqlite3")
+    app = Flask(__name__)
+    app.session_interface = SqliteSessionInterface(db)
+
+    @app.route("/set/<key>/<value>")
+    def set_value(key, value):
+        session.setdefault(key, {})["value"] = value
+        return ""
+
+    @app.route("/get/<key>")
+    def get_value(key):
+        return session.get(key, {}).get("value", "")
+
+    def versions():
+        with sqlite3.connect(db) as conn:
+            return dict(conn.execute("SELECT key, version FROM session_items"))
+
+    client = app.test_client()
+    client.get("/set/a/1")
+    client.get("/set/b/1")
+    assert versions() == {"a": 1, "b": 1}
+    # only changed items are written
+    client.get("/set/a/2")
+    client.get("/set/b/1")
+    assert versions() == {"a": 2, "b": 1}
+    assert client.get("/get/a").text == "2"
+
+    # changes by other processes are seen
+    other_app = Flask(__name__)
+    other_app.session_interface = SqliteSessionInterface(db)
+    other_app.view_functions = app.view_functions
+    other_app.url_map = app.url_map
+    other_client = other_app.test_client()
+    other_client.set_cookie("session", client.get_cookie("session").value)
+    other_client.get("/set/b/3")
+    assert client.get("/get/b").text == "3"
+
+
+def test_stale_tabs_are_evicted(monkeypatch):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    monkeypatch.setattr(config, "tab_state_ttl", 100)
+    monkeypatch.setattr(config, "tab_state_max_tabs", 3)
+    now = 1000.0
+    monkeypatch.setattr(tab_state.time, "time", lambda: now)
+    with app.test_request_context():
+        session["login_data"] = {tab: {} for tab in "abcde"}
+        session["default_labels"] = {"a": ["Person"], "e": ["Person"]}
+        # tabs of older sessions count as used now, except for the cap
+        tab_state.touch_tab("a")
+        assert set(session["login_data"]) == {"a", "b", "c"}
+        assert session["default_labels"] == {"a": ["Person"]}
+
+        now += 70
+        tab_state.touch_tab("b")
+        # touching again within TOUCH_INTERVAL changes nothing
+        now += 10
+        tab_state.touch_tab("b")
+        assert session["tabs_used"]["b"] == 1070.0
+
+        # a and c weren't used within the TTL, but last_tab_id is kept
+        now += 100
+        session["last_tab_id"] = "c"
+        tab_state.touch_tab("b")
+        assert set(session["login_data"]) == {"b", "c"}
+        assert set(session["tabs_used"]) == {"b", "c"}
+
+
+def test_registry_is_immutable():
+    app = Flask(__name__)
+    app.extensions[registry.EXTENSION_NAME] = registry.create_registry()
+    with app.app_context():
+        shared = registry.get_registry()
+        assert shared.metamodel_cache is registry.metamodel_cache
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            shared.metamodel_cache = None
+
+
+def test_capability_cache(monkeypatch):
+    monkeypatch.setattr(config, "capability_ttl", 60)
+    now = 0.0
+    monkeypatch.setattr(capabilities.time, "monotonic", lambda: now)
+    probes = []
+
+    def probe():
+        probes.append(now)
+        return True
+
+    cache = capabilities.CapabilityCache()
+    key = ("neo4j://localhost", "")
+    assert cache.get(key, "has_nft_index", probe)
+    assert cache.get(key, "has_nft_index", probe)
+    assert probes == [0.0]
+    # other databases and capabilities are probed separately
+    cache.get(("neo4j://other", ""), "has_nft_index", probe)
+    cache.get(key, "has_ft", probe)
+    assert len(probes) == 3
+
+    cache.invalidate(key)
+    cache.get(key, "has_nft_index", probe)
+    cache.get(("neo4j://other", ""), "has_nft_index", probe)
+    assert len(probes) == 4
+
+    now = 61.0
+    cache.get(key, "has_nft_index", probe)
+    assert probes[-1] == 61.0
+
+
+def test_schema_manager(monkeypatch):
+    statements = []
+    error = neo4j.exceptions.Forbidden("no schema privileges")
+    now = 0.0
+    monkeypatch.setattr(schema.time, "monotonic", lambda: now)
+
+    def run_schema(statement):
+        statements.append(statement)
+        if error and "grapheditor_uuid" in statement:
+            raise error
+
+    manager = schema.SchemaManager()
+    key = ("neo4j://localhost", "")
+    with Flask(__name__).app_context():
+        manager.ensure(key, run_schema, "alice")
+    assert len(statements) == len(schema.INDEXES)
+    assert any(
+        "(n:`MetaLabel__tech_`) ON (n.`name__tech_`)" in statement
+        for statement in statements
+    )
+    assert any(
+        "(n:`___tech_`) ON (n.`_uuid__tech_`)" in statement
+        for statement in statements
+    )
+
+    # missing privileges of a user are remembered
+    with Flask(__name__).app_context():
+        manager.ensure(key, run_schema, "alice")
+    assert len(statements) == len(schema.INDEXES)
+    # only the failed index is tried for other users
+    with Flask(__name__).app_context():
+        manager.ensure(key, run_schema, "bob")
+    assert len(statements) == len(schema.INDEXES) + 1
+    assert "grapheditor_uuid" in statements[-1]
+
+    # other failures are tried again after config.capability_ttl
+    error = neo4j.exceptions.TransientError("busy")
+    with Flask(__name__).app_context():
+        manager.ensure(key, run_schema, "carol")
+        manager.ensure(key, run_schema, "carol")
+    assert len(statements) == len(schema.INDEXES) + 2
+    now += config.capability_ttl
+    error = None
+    with Flask(__name__).app_context():
+        manager.ensure(key, run_schema, "carol")
+        manager.ensure(key, run_schema, "alice")
+    assert len(statements) == len(schema.INDEXES) + 3
+
+    manager.invalidate(key)
+    with Flask(__name__).app_context():
+        manager.ensure(key, run_schema, "alice")
+    assert len(statements) == 2 * len(schema.INDEXES) + 3
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+        self.consumed = False
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def consume(self):
+        self.consumed = True
+        return types.SimpleNamespace(
+            result_available_after=3, result_consumed_after=2
+        )
+
+    def closed(self):
+        return self.consumed
+
+
+@pytest.fixture
+def fake_database():
+    """Provide CypherDatabase's on a fake connection, in an app context.
+
+    Call the fixture with a responder(query, params) returning the records
+    of each query. It returns the database and the (query, params) pairs
+    run so far.
+    """
+    app = Flask(__name__)
+    app.extensions[registry.EXTENSION_NAME] = registry.create_registry()
+    runs = []
+
+    def create(responder):
+        class Connection:
+            host = "bolt://localhost:7687"
+            database = None
+            username = "alice"
+
+            def run(self, query, **params):
+                runs.append((query, params))
+                return FakeResult(list(responder(query, params)))
+
+        g.conn = Connection()
+        return CypherDatabase(registry.get_registry()), runs
+
+    with app.app_context():
+        yield create
+
+
+def test_index_backed_lookups(fake_database):
+    # uuid -> labels; u2 was created without the IGA triggers
+    uuid_nodes = {"u1": {"___tech_", "Person"}, "u2": {"Person"}}
+
+    def respond(query, params):
+        if "n._uuid__tech_ IN" in query:
+            return [
+                {
+                    "n": types.SimpleNamespace(
+                        element_id=uuid, items=lambda: {}.items(),
+                        labels=labels,
+                    ),
+                    "result": uuid,
+                }
+                for uuid, labels in uuid_nodes.items()
+                if uuid in params["prop_values"]
+                and ("___tech_" in labels or "(n:___tech_)" not in query)
+            ]
+        if "raw_db_id" in query:
+            return [
+                {"label": "MetaLabel__tech_", "name": "Person",
+                 "raw_db_id": "4:x:1"},
+            ]
+        return []
+
+    db, runs = fake_database(respond)
+    assert db.ids_to_raw_db_ids(
+        ["MetaLabel::Person", "MetaProperty::Person", "id::4:x:2"]
+    ) == {"MetaLabel::Person": "4:x:1", "id::4:x:2": "4:x:2"}
+    query, params = runs[-1]
+    assert "MATCH (n:MetaLabel__tech_)" in query
+    assert params["names_MetaLabel"] == ["Person"]
+    assert params["names_MetaProperty"] == ["Person"]
+    assert params["names_Paraquery"] == []
+
+    num_runs = len(runs)
+    assert list(db.get_nodes_by_uuids(["u1"])) == ["u1"]
+    query, params = runs[-1]
+    assert "MATCH (n:___tech_)" in query
+    assert "WHERE n._uuid__tech_ IN $prop_values" in query
+    assert len(runs) == num_runs + 1
+
+    # nodes without ___tech_ are still found, without the index
+    assert sorted(db.get_nodes_by_uuids(["u1", "u2", "u3"])) == ["u1", "u2"]
+    query, params = runs[-1]
+    assert "MATCH (n)" in query
+    assert params["prop_values"] == ["u2", "u3"]
+
+    db.get_nodes_by_names(
+        ["q"], filters={"labels": ["MetaLabel::Paraquery__tech_"]}
+    )
+    assert "MATCH (n:Paraquery__tech_)" in runs[-1][0]
+    # meta nodes of the metamodel snapshot need no query
+    g.metamodel = MetamodelCache().get(("host", ""), 0, lambda: {
+        "labels": {"Person"},
+        "properties": set(),
+        "relation_types": set(),
+        "raw_db_ids": {"MetaLabel::Person": "4:x:1"},
+    })
+    g.read_only = True
+    num_runs = len(runs)
+    assert db.ids_to_raw_db_ids(["MetaLabel::Person"]) == {
+        "MetaLabel::Person": "4:x:1"
+    }
+    assert len(runs) == num_runs
+    db.ids_to_raw_db_ids(["MetaLabel::Person", "MetaProperty::Person"])
+    assert len(runs) == num_runs + 1
+    assert runs[-1][1]["names_MetaLabel"] == []
+    assert runs[-1][1]["names_MetaProperty"] == ["Person"]
+    # IDs used for writes must not be stale
+    for written in (False, True):
+        g.read_only, g.graph_written = written, written
+        db.ids_to_raw_db_ids(["MetaLabel::Person"])
+        assert runs[-1][1]["names_MetaLabel"] == ["Person"]
+    assert len(runs) == num_runs + 3
+
+    # other labels aren't part of the pattern
+    db.get_nodes_by_names(["q"], filters={"labels": ["MetaLabel::A`)"]})
+    assert "MATCH (n)" in runs[-1][0]
+
+
+def test_read_only_views():
+    app = Flask(__name__)
+
+    def outer(func):
+        # like the decorators of flask_smorest
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    class Items(MethodView):
+        @outer
+        @read_only
+        def get(self):
+            return ""
+
+        def post(self):
+            return ""
+
+    app.add_url_rule("/items", view_func=Items.as_view("items"))
+    with app.test_request_context("/items", method="GET"):
+        assert view_is_read_only()
+    with app.test_request_context("/items", method="POST"):
+        assert not view_is_read_only()
+
+
+def test_bookmark_managers():
+    managers = BookmarkManagers(size=2)
+    first = managers.get(("neo4j://localhost", "tab1"))
+    assert managers.get(("neo4j://localhost", "tab1")) is first
+    second = managers.get(("neo4j://localhost", "tab2"))
+    managers.get(("neo4j://localhost", "tab1"))
+    # the least recently used scope is dropped
+    managers.get(("neo4j://localhost", "tab3"))
+    assert managers.get(("neo4j://localhost", "tab1")) is first
+    assert managers.get(("neo4j://localhost", "tab2")) is not second
+
+
+def test_driver_registry(monkeypatch):
+    monkeypatch.setattr(config, "driver_failure_threshold", 2)
+    registry_ = DriverRegistry(size=2)
+    host = "neo4j://localhost:7687"
+    alice = registry_.get(host, "alice", "secret")
+    assert registry_.get(host, "alice", "secret") is alice
+    # other passwords don't share drivers
+    other = registry_.get(host, "alice", "other")
+    assert other is not alice
+
+    # the least recently used driver is dropped
+    registry_.get(host, "alice", "secret")
+    bob = registry_.get(host, "bob", "secret")
+    assert [stats["host"] for stats in registry_.stats()] == [host, host]
+    assert registry_.get(host, "alice", "secret") is alice
+    assert registry_.get(host, "bob", "secret") is bob
+
+    # drivers are replaced after failures in a row
+    key = driver_key(host, "bob", "secret")
+    registry_.record_failure(key)
+    registry_.record_success(key)
+    registry_.record_failure(key)
+    assert registry_.get(host, "bob", "secret") is bob
+    registry_.record_acquisition(key, 0.5)
+    registry_.record_failure(key)
+    new_bob = registry_.get(host, "bob", "secret")
+    assert new_bob is not bob
+    alice.close()
+    new_bob.close()
+
+
+def test_pool_usage_of_unknown_drivers():
+    assert drivers._pool_usage(object()) == (0, 0)
+    pool = types.SimpleNamespace(connections=[1, 2])
+    assert drivers._pool_usage(types.SimpleNamespace(_pool=pool)) == (0, 0)
+    pool = types.SimpleNamespace(connections={
+        "a": [types.SimpleNamespace(in_use=True), types.SimpleNamespace()]
+    })
+    assert drivers._pool_usage(types.SimpleNamespace(_pool=pool)) == (2, 1)
+
+
+def test_leased_drivers_stay_open(monkeypatch):
+    monkeypatch.setattr(config, "driver_failure_threshold", 1)
+    registry_ = DriverRegistry(size=1)
+    host = "neo4j://localhost:7687"
+    closed = []
+    monkeypatch.setattr(
+        neo4j.GraphDatabase, "driver",
+        lambda *args, **kwargs: types.SimpleNamespace(
+            close=lambda: closed.append(kwargs["auth"][0])
+        ),
+    )
+    alice = registry_.acquire(host, "alice", "secret")
+    # alice is evicted while in use, and only closed when released
+    registry_.acquire(host, "bob", "secret")
+    assert closed == []
+    registry_.release(alice)
+    assert closed == ["alice"]
+
+    # failures replace the driver, but don't close it under other requests
+    bob = registry_.acquire(host, "bob", "secret")
+    registry_.record_failure(driver_key(host, "bob", "secret"))
+    assert registry_.get(host, "bob", "secret") is not bob
+    assert closed == ["alice"]
+    registry_.release(bob)
+    assert closed == ["alice"]
+    registry_.release(bob)
+    assert closed == ["alice", "bob"]
+
+
+def test_service_account_impersonation(monkeypatch):
+    monkeypatch.setattr(config, "neo4j", "neo4j://graph:7687")
+    monkeypatch.setattr(config, "service_user", "service")
+    monkeypatch.setattr(config, "service_password", "secret")
+    app = Flask(__name__)
+    app.extensions[registry.EXTENSION_NAME] = registry.create_registry()
+    with app.app_context():
+        alice = Neo4jConnection(
+            host="neo4j://graph:7687", username="alice", password="a"
+        )
+        bob = Neo4jConnection(
+            host="neo4j://graph:7687", username="bob", password="b"
+        )
+        # other servers never get the service account's credentials
+        carol = Neo4jConnection(
+            host="neo4j://elsewhere:7687", username="carol", password="c"
+        )
+        assert alice.impersonated_user == "alice"
+        assert alice._driver is bob._driver
+        assert carol.impersonated_user is None
+        assert carol._driver_key == driver_key(
+            "neo4j://elsewhere:7687", "carol", "c"
+        )
+        alice._driver.close()
+        carol._driver.close()
+
+
+def test_read_retries_keep_results(monkeypatch):
+    app = Flask(__name__)
+    app.extensions[registry.EXTENSION_NAME] = registry.create_registry()
+    failures = []
+    transactions = []
+
+    class Transaction:
+        def run(self, query, **params):
+            if failures:
+                raise failures.pop()
+            return FakeResult([{"query": query}])
+
+        def close(self):
+            pass
+
+    def tx(self):
+        if not hasattr(g, "neo4j_transaction"):
+            g.neo4j_session = types.SimpleNamespace(close=lambda: None)
+            g.neo4j_transaction = Transaction()
+            g.neo4j_results = []
+            transactions.append(g.neo4j_transaction)
+        return g.neo4j_transaction
+
+    monkeypatch.setattr(Neo4jConnection, "_tx", property(tx))
+    with app.test_request_context():
+        g.read_only = True
+        conn = Neo4jConnection(
+            host="neo4j://graph:7687", username="alice", password="a"
+        )
+        failures.append(neo4j.exceptions.TransientError("try again"))
+        first = conn.run("first")
+        assert len(transactions) == 2
+        # retrying would invalidate the lazy first result
+        failures.append(neo4j.exceptions.TransientError("try again"))
+        with pytest.raises(neo4j.exceptions.TransientError):
+            conn.run("second")
+        assert len(transactions) == 2
+        first.consume()
+        failures.append(neo4j.exceptions.TransientError("try again"))
+        assert list(conn.run("second")) == [{"query": "second"}]
+        assert len(transactions) == 3
+        # e.g. after a leader switch
+        for result in g.neo4j_results:
+            result.consume()
+        failures.append(neo4j.exceptions.SessionExpired("expired"))
+        assert list(conn.run("third")) == [{"query": "third"}]
+        assert len(transactions) == 4
+        # writes can't be retried
+        g.read_only = False
+        failures.append(neo4j.exceptions.SessionExpired("expired"))
+        with pytest.raises(neo4j.exceptions.SessionExpired):
+            conn.run("fourth")
+        conn._driver.close()
+        Neo4jConnection.release_drivers()
+
+
+def test_query_templates(fake_database):
+    templates = QueryTemplates()
+    template = templates.register("count", "MATCH (n) WHERE n.x = $x RETURN n")
+    assert templates.register("count", template.text) == template
+    with pytest.raises(ValueError):
+        templates.register("count", "MATCH (n) RETURN n")
+
+    _, runs = fake_database(lambda query, params: [{"n": 1}, {"n": 2}])
+    assert templates.run(g.conn, template, x=1) == [{"n": 1}, {"n": 2}]
+    templates.run(g.conn, template, x="' OR true //")
+    # values are never part of the query text
+    assert {query for query, _ in runs} == {template.text}
+    (stats,) = templates.stats()
+    assert stats["calls"] == 2
+    assert stats["rows"] == 4
+    assert stats["server_seconds"] == pytest.approx(0.01)
+    templates.reset_stats()
+    assert templates.stats() == []
+
+
+def test_node_relations_single_query(fake_database):
+    def neo_element(element_id, **attributes):
+        return types.SimpleNamespace(
+            element_id=element_id, id=element_id, items=lambda: {}.items(),
+            labels={"Person"}, start_node=None, end_node=None, type="knows",
+            **attributes,
+        )
+
+    sentinel = {"r": None, "neighbor": None, "direction": None}
+    rows = [
+        {"r": neo_element("r2"), "neighbor": neo_element("m"),
+         "direction": "outgoing"},
+        {"r": neo_element("r1"), "neighbor": neo_element("m"),
+         "direction": "incoming"},
+        sentinel,
+    ]
+    db, runs = fake_database(lambda query, params: rows)
+    relations = db.get_node_relations(
+        "id::n", {"direction": "both", "relation_type": "RelationType::knows"}
+    )
+    assert [r["relation"].element_id for r in relations] == ["r1", "r2"]
+    assert runs[-1][1]["relation_type"] == "knows"
+    assert runs[-1][1]["incoming"] and runs[-1][1]["outgoing"]
+
+    # the node exists, but has no relations
+    rows[:] = [sentinel]
+    assert db.get_node_relations("id::n", {"direction": "incoming"}) == []
+    assert not runs[-1][1]["outgoing"]
+    rows[:] = []
+    assert db.get_node_relations("id::n", {"direction": "both"}) is None
+    assert len(runs) == 3
+
+
+def test_parallax_single_query(fake_database):
+    def neo_node(element_id):
+        return types.SimpleNamespace(
+            element_id=element_id, items=lambda: {}.items(), labels={"Person"}
+        )
+
+    def respond(query, params):
+        num_steps = query.count("AS frontier,")
+        return [{
+            "nodes": [neo_node("4:x:1")],
+            "frontiers": [[f"4:x:{i}"] for i in range(1, num_steps + 2)],
+            "incoming": [["knows", 2]],
+            "outgoing": [],
+            "properties": ["name", "age"],
+            "label_counts": [["Person", 3]],
+            "node_count": 3,
+            "has_more": params["limit"] is not None,
+        }]
+
+    parallax_cache.clear()
+    db, runs = fake_database(respond)
+    result = db.parallax(["id::4:x:1"], None, [])
+    assert list(result["nodes"]) == ["id::4:x:1"]
+    assert result["incoming"] == {"knows": 2}
+    assert result["properties"] == ["age", "name"]
+    assert result["labels"] == ["Person"]
+    assert result["label_counts"] == {"Person": 3}
+    assert result["node_count"] == 3
+    assert result["next_cursor"] is None
+
+    db.parallax(
+        ["id::4:x:1"],
+        {"labels": ["Person"]},
+        [{"outgoing": ["knows"], "filters": None}, {"incoming": ["likes"]}],
+    )
+    query, params = runs[-1]
+    assert len(runs) == 2
+    assert "$steps[1].incoming" in query and "$steps[2]" not in query
+    assert params["raw_db_ids"] == ["4:x:1"]
+    assert params["filters"] == {"labels": ["Person"], "properties": {}}
+    assert params["steps"][1] == {
+        "incoming": ["likes"],
+        "outgoing": [],
+        "filters": {"labels": [], "properties": {}},
+    }
+
+    # extending the chain only runs the new step, starting at the
+    # memoized frontier of the first two steps
+    db.parallax(
+        ["id::4:x:1"],
+        {"labels": ["Person"]},
+        [
+            {"outgoing": ["knows"]},
+            {"incoming": ["likes"]},
+            {"outgoing": ["owns"]},
+        ],
+    )
+    query, params = runs[-1]
+    assert len(runs) == 3
+    assert "$steps[0].outgoing" in query and "$steps[1]" not in query
+    assert params["raw_db_ids"] == ["4:x:3"]
+    assert params["filters"] == {"labels": [], "properties": {}}
+    assert params["steps"] == [{
+        "outgoing": ["owns"],
+        "incoming": [],
+        "filters": {"labels": [], "properties": {}},
+    }]
+
+    # users don't share frontiers, since their privileges may differ
+    g.conn.username = "bob"
+    db.parallax(["id::4:x:1"], {"labels": ["Person"]}, [
+        {"outgoing": ["knows"]}, {"incoming": ["likes"]},
+    ])
+    assert len(runs) == 4
+    assert runs[-1][1]["raw_db_ids"] == ["4:x:1"]
+    assert len(runs[-1][1]["steps"]) == 2
+    g.conn.username = "alice"
+
+    # a write invalidates all prefixes
+    db.registry.write_generations.bump(("bolt://localhost:7687", ""))
+    db.parallax(["id::4:x:1"], None, [{"outgoing": ["knows"]}])
+    assert len(runs) == 5
+    assert runs[-1][1]["raw_db_ids"] == ["4:x:1"]
+    assert len(runs[-1][1]["steps"]) == 1
+
+    # pages continue after the last node of the previous page
+    result = db.parallax(
+        ["id::4:x:1"], None, [{"outgoing": ["knows"]}],
+        after="4:x:0", limit=1,
+    )
+    assert runs[-1][1]["after"] == "4:x:0"
+    assert runs[-1][1]["limit"] == 1
+    assert result["next_cursor"] == "4:x:1"
+
+
+def test_parallax_cache_is_bounded(monkeypatch):
+    cache = ParallaxCache()
+    frontier = [f"4:x:{i}" for i in range(100)]
+    cache.put("a", frontier)
+    size = cache._size
+    monkeypatch.setattr(config, "parallax_cache_bytes", 2 * size)
+    cache.put("b", frontier)
+    assert cache.get("a") == tuple(frontier)
+    cache.put("c", frontier)
+    # "b" was least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache._size == 2 * size
+
+    # frontiers bigger than the whole cache aren't stored
+    cache.put("d", frontier * 3)
+    assert cache.get("d") is None
+
+    monkeypatch.setattr(config, "parallax_cache_ttl", -1)
+    assert cache.get("a") is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -1,12 +1,23 @@
+import os
+import pickle
 import re
-from flask import Flask
+from flask import Flask, g, session
 import pytest
 from pyparsing import ParseException
 
-from blueprints.display.style_support import parse_style, apply_style_rules
-from database.base_types import BaseNode
+from blueprints.display import style_budget, style_pool, style_support
+from blueprints.display.exceptions import (
+    StyleBudgetExceeded,
+    StyleNotFoundException,
+)
+from blueprints.display.style_store import StyleStore
+from blueprints.display.style_support import (
+    parse_style, apply_style_rules, apply_style_rules_batch, StylePlan
+)
+from database.base_types import BaseNode, BaseRelation
 
 app = Flask(__name__)
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "..", "static")
 
 # pylint complains that server code and this test are duplicate.
 # Usually it's acceptable (and even encouraged) to duplicate stuff between tests
@@ -103,6 +114,320 @@ def test_basic_star_property():
     assert result["diameter"] == "4px"
 
 
+def test_rules_can_be_pickled():
+    "Rules are stored in sessions, so compiled code must survive pickling."
+    style_text = """
+        node.* {
+          condition: "p.name__dummy_ == 'Bob'";
+          diameter*: "str(2 + 2) + 'px'";
+        }
+    """
+    rule = pickle.loads(pickle.dumps(parse_style(style_text)[0]))
+    result = apply_style_rules(bob_node, [rule])
+    assert result.style["diameter"] == "4px"
+
+
+def test_style_plan_keeps_rule_order():
+    "Only matching rules are visited, in the order of the style file."
+    style_text = """
+        node.Person__dummy_ { color: red; }
+        node.* { color: green; }
+        relationship.* { color: blue; }
+        node.Company__dummy_ { color: yellow; }
+        node.Person__dummy_ { size: 2; }
+    """
+    rules = parse_style(style_text)
+    plan = StylePlan(rules)
+    assert plan.rules_for(bob_node) == (rules[0], rules[1], rules[4])
+    relation = BaseRelation(element_id="1", id="1", properties={}, style={},
+                            type="likes", source=bob_node, target=bob_node)
+    assert plan.rules_for(relation) == (rules[2],)
+    assert apply_style_rules(bob_node, rules).style["color"] == "green"
+
+
+def test_style_memo_key():
+    "Elements agreeing on everything rules read share memoized styles."
+    plan = StylePlan(parse_style("""
+        node.Person__dummy_ { caption*: "p.name__dummy_.upper()"; }
+    """))
+    other_bob = BaseNode(element_id="456", id="other", labels=["Person__dummy_"],
+                         properties={"name__dummy_": "Bob", "age": 3}, style={})
+    alice = BaseNode(element_id="789", id="alice", labels=["Person__dummy_"],
+                     properties={"name__dummy_": "Alice"}, style={})
+    assert plan.memo_key(bob_node) == plan.memo_key(other_bob)
+    assert plan.memo_key(bob_node) != plan.memo_key(alice)
+
+    random_plan = StylePlan(parse_style("""
+        node { caption*: "str(random.randint(1, 10))"; }
+    """))
+    assert random_plan.memo_key(bob_node) is None
+
+
+def test_style_memo_without_ids(monkeypatch):
+    "Only style properties reading element IDs are computed per element."
+    monkeypatch.setitem(style_support.config, "style_profiling", True)
+    with open(os.path.join(STATIC_DIR, "style.grass"), encoding="utf-8") as f:
+        rules = parse_style(f.read() + """
+            node.Person__dummy_ {
+              condition: "o.element_id != '3'";
+              diameter: 10px;
+            }
+        """)
+
+    def make_nodes():
+        return [
+            BaseNode(element_id=str(i), id=f"ns::{i}",
+                     labels=["Person__dummy_", "___tech_"],
+                     properties={"name__dummy_": "Bob"}, style={})
+            for i in range(5)
+        ] + [
+            BaseRelation(element_id=str(i), id=str(i), properties={},
+                         style={}, type="likes", source=bob_node,
+                         target=bob_node)
+            for i in range(2)
+        ]
+
+    plan = StylePlan(rules)
+    nodes = make_nodes()
+    # the default caption shows the ID, colors only depend on labels
+    assert plan.memo_key(nodes[0]) == plan.memo_key(nodes[1])
+    assert plan.memo_key(nodes[-1]) == plan.memo_key(nodes[-2])
+    assert "id" not in dict(plan.memo_key(nodes[0])[2])
+    # unless they use definitions of other properties
+    unsplit = StylePlan(parse_style("""
+        node { color*: "c = 'red'; c"; caption*: "c + o.id"; }
+    """))
+    assert unsplit.memo_key(nodes[0]) != unsplit.memo_key(nodes[1])
+    with app.test_request_context():
+        g.style_plan = plan
+        memoized = [apply_style_rules(n).style for n in nodes]
+    monkeypatch.setitem(style_support.config, "style_memo_size", 0)
+    with app.test_request_context():
+        g.style_plan = StylePlan(rules)
+        computed = [apply_style_rules(n).style for n in make_nodes()]
+    assert memoized == computed
+    assert all(
+        style["caption"].endswith(f"({i})")
+        for i, style in enumerate(memoized[:5])
+    )
+    assert "diameter" not in memoized[3] and "diameter" in memoized[4]
+    profile = sorted(plan.profile(), key=lambda p: p["rule"])
+    node_rule, relationship_rule = profile[0], profile[1]
+    assert (node_rule["calls"], node_rule["memoHits"]) == (5, 4)
+    assert (relationship_rule["calls"], relationship_rule["memoHits"]) == (1, 1)
+    assert profile[-1]["memoHits"] == 0
+
+
+@pytest.mark.parametrize("condition", [
+    "p.name__dummy_ == 'Bob'",
+    "p['name__dummy_'] != 'Bob'",
+    "p.missing == ''",
+    "p['missing'] == ''",
+    "'Person__dummy_' in o.labels and not p.age",
+    "p.age >= 18 or o.id == 'bob'",
+    "1 < p.age <= 40",
+    "p.name__dummy_.lower() in ['bob', 'alice']",
+    "p.age.lower() == 'x'",
+    "p.name__dummy_.startswith('B')",
+    "x == 1",
+])
+def test_fast_conditions(monkeypatch, condition):
+    "Fast path conditions yield the same styles as restricted code."
+    style_text = f"""
+        node.* {{
+          condition: "{condition}";
+          color: red;
+        }}
+    """
+
+    def styles():
+        nodes = [
+            BaseNode(element_id="123", id="bob", labels=["Person__dummy_"],
+                     properties={"name__dummy_": "Bob"}, style={}),
+            BaseNode(element_id="456", id="other", labels=["Person__dummy_"],
+                     properties={"name__dummy_": "Bob", "age": 33}, style={}),
+        ]
+        return [apply_style_rules(n, parse_style(style_text)).style for n in nodes]
+
+    fast = styles()
+    monkeypatch.setattr(style_support, "compile_fast_condition", lambda code: None)
+    assert fast == styles()
+
+
+def test_rebound_names_disable_fast_path():
+    "Conditions see names rebound by earlier star rules."
+    style_text = """
+        node.* {
+          color*: "p = {'name__dummy_': 'Alice'}; 'red'";
+        }
+        node.* {
+          condition: "p['name__dummy_'] == 'Alice'";
+          diameter: 10px;
+        }
+    """
+    result = apply_style_rules(bob_node, parse_style(style_text))
+    assert result.style["diameter"] == "10px"
+
+
+@pytest.mark.parametrize("code", [
+    "x = 0\nwhile True: x = x + 1",
+    "max(i * j for i in range(999) for j in range(999))",
+    "f = lambda n: f(n + 1)\nf(0)",
+])
+def test_style_budget(monkeypatch, code):
+    "Expensive style code is stopped, falling back to static styles."
+    monkeypatch.setitem(style_support.config, "style_budget_operations", 100)
+    rules = parse_style(f"""
+        node.* {{
+          color: red;
+        }}
+        node.* {{
+          diameter*: \"\"\"{code}\"\"\";
+        }}
+    """)
+    with app.test_request_context():
+        result = apply_style_rules(bob_node, rules)
+        assert result.style == {"color": "red", "caption": ""}
+        assert g.style_budget.exceeded
+
+
+def test_style_budget_counts_evaluation_time(monkeypatch):
+    "Time spent outside of style evaluation doesn't use the budget."
+    now = 0.0
+    monkeypatch.setattr(style_budget.time, "monotonic", lambda: now)
+    budget = style_budget.StyleBudget(1, 0)
+    budget.start()
+    now = 0.6
+    budget.stop()
+    # e.g. a slow database query between two styling calls
+    now = 100.0
+    budget.check()
+    budget.start()
+    now = 100.3
+    budget.check()
+    assert budget.remaining()[0] == pytest.approx(0.1)
+    now = 100.5
+    with pytest.raises(StyleBudgetExceeded):
+        budget.check()
+
+
+def test_rule_profile(monkeypatch):
+    "Calls, memo hits and matches are counted per rule."
+    monkeypatch.setitem(style_support.config, "style_profiling", True)
+    plan = StylePlan(parse_style("""
+        node.* { color: red; }
+        node.Person__dummy_ { condition: "p.name__dummy_ == 'Alice'"; }
+        relationship.* { color: blue; }
+    """))
+    nodes = [
+        BaseNode(element_id=str(i), id=name, labels=["Person__dummy_"],
+                 properties={"name__dummy_": name}, style={})
+        for i, name in enumerate(["Bob", "Alice", "Bob"])
+    ]
+    with app.test_request_context():
+        g.style_plan = plan
+        for node in nodes:
+            apply_style_rules(node)
+
+    profile = sorted(plan.profile(), key=lambda p: p["rule"])
+    assert [
+        (p["selector"], p["calls"], p["memoHits"], p["matches"])
+        for p in profile
+    ] == [
+        # the second Bob is styled from the memo
+        ("node.*", 2, 1, 2),
+        ("node.Person__dummy_", 2, 1, 1),
+        ("relationship.*", 0, 0, 0),
+    ]
+    plan.reset_profile()
+    assert all(p["calls"] == p["memoHits"] == 0 for p in plan.profile())
+
+
+def test_style_pool(monkeypatch):
+    "Batches styled in worker processes get the same styles, in order."
+    rules = parse_style("""
+        node.* {
+          condition: "p.age > 2";
+          color*: "'#%02x0000' % (p.age * 10)";
+          caption: "{name__dummy_}";
+        }
+    """)
+    def make_nodes():
+        return [
+            BaseNode(element_id=str(i), id=str(i), labels=["Person__dummy_"],
+                     properties={"name__dummy_": f"n{i}", "age": i}, style={})
+            for i in range(20)
+        ]
+
+    serial = [apply_style_rules(node, rules).style for node in make_nodes()]
+    monkeypatch.setitem(style_support.config, "style_pool_workers", 2)
+    monkeypatch.setitem(style_support.config, "style_pool_threshold", 10)
+    with app.test_request_context():
+        g.style_plan = StylePlan(rules, key=("test_style_pool",))
+        pooled = apply_style_rules_batch(make_nodes())
+    assert [node.style for node in pooled] == serial
+    style_pool.discard_style_pool(style_pool.get_style_pool())
+
+
+def test_style_pool_budget(monkeypatch):
+    "Styling in the pool can't use more of the budget than serial styling."
+    rules = parse_style("""
+        node.* {
+          color*: "x = 0\\nfor i in range(50 + p.age): x = x + i\\n'red'";
+        }
+    """)
+    def make_nodes():
+        return [
+            BaseNode(element_id=str(i), id=str(i), labels=["Person__dummy_"],
+                     properties={"age": i}, style={})
+            for i in range(20)
+        ]
+
+    monkeypatch.setitem(style_support.config, "style_budget_operations", 300)
+    monkeypatch.setitem(style_support.config, "style_pool_threshold", 10)
+    used, styled = {}, {}
+    for workers in (0, 2):
+        monkeypatch.setitem(style_support.config, "style_pool_workers", workers)
+        with app.test_request_context():
+            g.style_plan = StylePlan(rules, key=("test_style_pool_budget",))
+            nodes = apply_style_rules_batch(make_nodes())
+            assert g.style_budget.exceeded
+            used[workers] = g.style_budget.operations
+            styled[workers] = sum("color" in node.style for node in nodes)
+    assert 0 < used[2] <= used[0] <= 300
+    assert styled[2] <= styled[0]
+    style_pool.discard_style_pool(style_pool.get_style_pool())
+
+
+def test_style_store(tmp_path):
+    "Styles are stored once per text, and parsed once."
+    store = StyleStore(str(tmp_path))
+    text = "node.* { color: red; }"
+    digest = store.put(text)
+    assert store.put(text) == digest
+    assert len(list(tmp_path.iterdir())) == 1
+    assert store.get_text(digest) == text
+    assert store.get_rules(digest) is store.get_rules(digest)
+    with pytest.raises(StyleNotFoundException):
+        store.get_text("0" * 64)
+
+
+def test_session_styles_are_migrated(tmp_path, monkeypatch):
+    "Sessions with parsed styles are moved to the style store."
+    monkeypatch.setattr(style_support, "style_store", StyleStore(str(tmp_path)))
+    monkeypatch.setattr(app, "secret_key", "test")
+    text = "node.* { color: red; }"
+    with app.test_request_context():
+        session["style_files"] = {
+            "old.grass": {"rules": parse_style(text), "text": text}
+        }
+        assert style_support.get_style_filenames() == ["old.grass"]
+        rules, stored_text = style_support.get_stored_style("old.grass")
+        assert stored_text == text
+        assert rules[0].props == {"color": "red"}
+        assert isinstance(session["style_files"]["old.grass"], str)
+
+
 def test_invalid_labels():
     "Invalid labels lead to an exception."
 
@@ -276,6 +601,29 @@ def test_no_access_to_disk():
     assert "is not defined" in caption
 
 
+def test_style_file_is_parsed_once(tmp_path, monkeypatch):
+    "An unchanged style file is served from the cache."
+    # pylint: disable=protected-access
+    style_file = tmp_path / "style.grass"
+    style_file.write_text('node { caption: "a"; }', encoding="utf-8")
+    parse_calls = []
+    monkeypatch.setattr(
+        style_support, "parse_style",
+        lambda text: parse_calls.append(text) or parse_style(text)
+    )
+
+    with app.app_context():
+        first = style_support._load_cached_style("default", str(style_file))
+        second = style_support._load_cached_style("default", str(style_file))
+        assert first.rules is second.rules
+        assert len(parse_calls) == 1
+
+        style_file.write_text('node { caption: "bb"; }', encoding="utf-8")
+        third = style_support._load_cached_style("default", str(style_file))
+        assert third.rules[0].props["caption"] == "bb"
+        assert len(parse_calls) == 2
+
+
 # Not working yet
 # def test_infinite_loop_causes_timeout():
 #     style_text = """
@@ -2335,6 +2335,48 @@ def test_parallax_without_filters():
     assert "MetaRelation::prop__tech_" in response.json["outgoingRelationTypes"]
     assert "MetaRelation::source__tech_" in response.json["incomingRelationTypes"]
 
+def test_parallax_counts_only_and_paging():
+    "Parallax without nodes and with pages of nodes."
+    restriction_nid = fetch_node_by_id(client, "MetaLabel::Restriction__tech_")['dbId']
+    request = {
+        "nodeIds": [restriction_nid],
+        "steps": [
+            {
+                "incomingRelationTypes": ["MetaRelation::prop__tech_"],
+                "outgoingRelationTypes": ["MetaRelation::source__tech_"]
+            }
+        ]
+    }
+    response = client.post(
+        BASE_URL + "/api/v1/parallax",
+        headers=HEADERS,
+        json={**request, "countsOnly": True},
+    )
+    assert response.status_code == 200
+    assert response.json["nodes"] == {}
+    assert response.json["nodeCount"] == 2
+    assert response.json["nextCursor"] is None
+    assert sum(response.json["labelCounts"].values()) >= 2
+    assert "MetaRelation::restricts__tech_" in response.json["outgoingRelationTypes"]
+
+    pages = []
+    cursor = None
+    while True:
+        response = client.post(
+            BASE_URL + "/api/v1/parallax",
+            headers=HEADERS,
+            json={**request, "limit": 1, **({"cursor": cursor} if cursor else {})},
+        )
+        assert response.status_code == 200
+        assert len(response.json["nodes"]) == 1
+        pages.append(response.json["nodes"])
+        cursor = response.json["nextCursor"]
+        if cursor is None:
+            break
+    assert len(pages) == 2
+    assert pages[0].keys() != pages[1].keys()
+
+
 def test_parallax_initial_query_filters():
     "Parallax with filters for initial search."
     desc_nid = fetch_node_by_id(client, "MetaProperty::description__tech_")['dbId']
@@ -2570,5 +2612,18 @@ def test_parameter_selection():
     assert suggestions == []
 
 
+
+def test_statistics_require_login():
+    "Driver and query statistics are only available to logged in users."
+    anonymous = app.test_client()
+    for path in ["/api/v1/info/drivers", "/api/v1/info/queries"]:
+        response = anonymous.get(BASE_URL + path, headers=HEADERS)
+        assert response.status_code == 401
+        response = client.get(BASE_URL + path, headers=HEADERS)
+        assert response.status_code == 200
+    response = anonymous.delete(BASE_URL + "/api/v1/info/queries", headers=HEADERS)
+    assert response.status_code == 401
+
+
 if __name__ == "__main__":
     pytest.main([__file__])